@@ -0,0 +1,309 @@
+"""
+Офлайн-классификация больших архивов фотографий без HTTP.
+
+Вход — папка с изображениями (рекурсивно), tar-шард (несжатый .tar) или манифест
+(.txt / .csv: один путь на строку, пути относительно каталога манифеста). Изображения
+читаются и препроцессируются в нескольких процессах DataLoader тем же
+get_inference_transforms, что и у модели, инференс идёт большими батчами.
+
+Результаты дописываются в CSV-файл или в каталог с Parquet-частями. После каждых
+--checkpoint-every батчей рядом сохраняется чекпоинт (<output>.checkpoint.json):
+прерванный запуск с теми же аргументами продолжается с места остановки.
+
+Запуск из каталога services/python-backend:
+    python app/bulk_classify.py --input /data/photos --output results.csv --batch-size 64 --workers 8
+    python app/bulk_classify.py --input shard-000.tar --output results_parquet --format parquet
+"""
+import argparse
+import csv
+import json
+import os
+import sys
+import tarfile
+import time
+from pathlib import Path
+
+import numpy as np
+import torch
+from torch.utils.data import DataLoader, Dataset
+
+from config import Config
+from models.engines import ENGINE_NAMES
+from models.interior_classifier_EfficientNet_B3 import (
+    CLASS_NAMES,
+    find_checkpoint,
+    get_inference_transforms,
+    load_engine
+)
+from services.decoding import IMAGE_EXTENSIONS, decode_image
+from tools.image_folder import list_images
+
+
+RESULT_COLUMNS = ["key", "predicted_class", "top_confidence"] + [f"prob_{name}" for name in CLASS_NAMES] + ["error"]
+
+
+# ---------- Источники изображений ----------
+
+def list_tar_members(tar_path: Path) -> list[tuple[str, int, int]]:
+    """(имя, смещение данных, размер) изображений несжатого tar: воркеры читают их напрямую через seek"""
+    with tarfile.open(tar_path, mode="r:") as archive:
+        return [
+            (info.name, info.offset_data, info.size)
+            for info in archive
+            if info.isfile() and Path(info.name).suffix.lower() in IMAGE_EXTENSIONS
+        ]
+
+
+def read_manifest(manifest_path: Path) -> list[Path]:
+    """Пути из манифеста: первая колонка, строка-заголовок 'path' пропускается"""
+    paths = []
+    with open(manifest_path, newline="", encoding="utf-8") as f:
+        for row in csv.reader(f):
+            if not row or not row[0].strip() or row[0].strip() == "path":
+                continue
+            path = Path(row[0].strip())
+            paths.append(path if path.is_absolute() else manifest_path.parent / path)
+    return paths
+
+
+class BulkImageDataset(Dataset):
+    """
+    Элемент — (позиция, тензор или None, ошибка). Битый файл не останавливает прогон:
+    ошибка попадает в колонку error результата.
+    """
+
+    def __init__(self, input_path: Path, img_size: int = 448, fast_decode: bool = True):
+        self.input_path = input_path
+        self.img_size = img_size
+        self.fast_decode = fast_decode
+        self.tar_members: list[tuple[str, int, int]] | None = None
+        self.paths: list[Path] | None = None
+        if input_path.is_dir():
+            self.paths = list_images(input_path)
+            self.keys = [str(path.relative_to(input_path)) for path in self.paths]
+        elif input_path.suffix.lower() == ".tar":
+            self.tar_members = list_tar_members(input_path)
+            self.keys = [name for name, _, _ in self.tar_members]
+        elif input_path.suffix.lower() in {".txt", ".csv"}:
+            self.paths = read_manifest(input_path)
+            self.keys = [str(path) for path in self.paths]
+        else:
+            raise ValueError(f"Unsupported input {input_path}: expected a directory, .tar shard or .txt/.csv manifest")
+        self._transforms = get_inference_transforms(img_size=img_size)
+        self._tar_file = None  # открывается в каждом воркере DataLoader отдельно
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def _read(self, index: int) -> bytes:
+        if self.tar_members is None:
+            return self.paths[index].read_bytes()
+        if self._tar_file is None:
+            self._tar_file = open(self.input_path, "rb")
+        _, offset, size = self.tar_members[index]
+        self._tar_file.seek(offset)
+        return self._tar_file.read(size)
+
+    def __getitem__(self, index: int) -> tuple[int, torch.Tensor | None, str | None]:
+        try:
+            min_size = (self.img_size, self.img_size) if self.fast_decode else None
+            image = decode_image(self._read(index), min_size=min_size)
+            return index, self._transforms(image), None
+        except Exception as e:
+            return index, None, f"{type(e).__name__}: {e}"
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["_tar_file"] = None
+        return state
+
+
+def collate_results(items: list[tuple[int, torch.Tensor | None, str | None]]):
+    """Батч DataLoader: позиции всех элементов, тензор успешно прочитанных и ошибки"""
+    indices = [index for index, _, _ in items]
+    ok = [(index, tensor) for index, tensor, _ in items if tensor is not None]
+    errors = {index: error for index, _, error in items if error is not None}
+    batch = torch.stack([tensor for _, tensor in ok]) if ok else None
+    return indices, [index for index, _ in ok], batch, errors
+
+
+# ---------- Запись результатов ----------
+
+class CsvResultWriter:
+    """Дописывает строки в CSV; состояние чекпоинта — длина файла в байтах"""
+
+    def __init__(self, path: Path):
+        self.path = path
+
+    def open(self, state: dict | None):
+        if state is None:
+            self._file = open(self.path, "w", newline="", encoding="utf-8")
+            csv.writer(self._file).writerow(RESULT_COLUMNS)
+        else:
+            # Строки, записанные после последнего чекпоинта, будут посчитаны заново
+            self._file = open(self.path, "r+", newline="", encoding="utf-8")
+            self._file.truncate(state["bytes"])
+            self._file.seek(state["bytes"])
+        self._writer = csv.writer(self._file)
+
+    def write(self, rows: list[list]):
+        self._writer.writerows(rows)
+
+    def checkpoint(self) -> dict:
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        return {"bytes": self._file.tell()}
+
+    def close(self):
+        self._file.close()
+
+
+class ParquetResultWriter:
+    """Каталог Parquet-частей: на каждый чекпоинт — новый файл part-NNNNN.parquet"""
+
+    def __init__(self, path: Path):
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError as e:
+            raise RuntimeError("Parquet output requires pyarrow: pip install pyarrow") from e
+        self.path = path
+        self._rows: list[list] = []
+        self._parts = 0
+
+    def open(self, state: dict | None):
+        self.path.mkdir(parents=True, exist_ok=True)
+        self._parts = state["parts"] if state is not None else 0
+        for part in self.path.glob("part-*.parquet"):
+            if int(part.stem.split("-")[1]) >= self._parts:
+                part.unlink()
+
+    def write(self, rows: list[list]):
+        self._rows.extend(rows)
+
+    def checkpoint(self) -> dict:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        if self._rows:
+            schema = pa.schema([
+                (name, pa.string() if name in ("key", "predicted_class", "error") else pa.float64())
+                for name in RESULT_COLUMNS
+            ])
+            columns = list(zip(*self._rows))
+            table = pa.table({name: list(values) for name, values in zip(RESULT_COLUMNS, columns)}, schema=schema)
+            pq.write_table(table, self.path / f"part-{self._parts:05d}.parquet")
+            self._parts += 1
+            self._rows = []
+        return {"parts": self._parts}
+
+    def close(self):
+        pass
+
+
+def build_rows(keys: list[str], indices: list[int], ok_indices: list[int],
+               probabilities: np.ndarray | None, errors: dict[int, str]) -> list[list]:
+    """Строки результата в порядке позиций батча; вероятности округляются так же, как в API"""
+    rows_by_index = {}
+    if probabilities is not None:
+        probabilities = probabilities.astype(np.float64)
+        predicted = probabilities.argmax(axis=1)
+        rounded = probabilities.round(4)
+        top_confidences = rounded[np.arange(len(rounded)), predicted].tolist()
+        for index, label, top_confidence, row in zip(ok_indices, predicted.tolist(), top_confidences, rounded.tolist()):
+            rows_by_index[index] = [keys[index], CLASS_NAMES[label], top_confidence, *row, None]
+    for index, error in errors.items():
+        rows_by_index[index] = [keys[index], None, None, *([None] * len(CLASS_NAMES)), error]
+    return [rows_by_index[index] for index in indices]
+
+
+# ---------- Запуск ----------
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Offline bulk classification with resumable output")
+    parser.add_argument("--input", type=Path, required=True, help="image directory, .tar shard or .txt/.csv manifest")
+    parser.add_argument("--output", type=Path, required=True, help="CSV file or Parquet directory")
+    parser.add_argument("--format", choices=["csv", "parquet"], default="csv")
+    parser.add_argument("--checkpoint", type=Path, default=None, help="ckpt* file (default: first in models/)")
+    parser.add_argument("--engine", choices=ENGINE_NAMES, default=Config.INFERENCE_ENGINE)
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--workers", type=int, default=max((os.cpu_count() or 2) // 2, 1),
+                        help="DataLoader processes for reading and preprocessing")
+    parser.add_argument("--torch-threads", type=int, default=0, help="threads for inference (0 = torch default)")
+    parser.add_argument("--img-size", type=int, default=448)
+    parser.add_argument("--checkpoint-every", type=int, default=20, help="batches between checkpoints")
+    parser.add_argument("--restart", action="store_true", help="ignore an existing checkpoint and start over")
+    return parser.parse_args()
+
+
+def main() -> int:
+    args = parse_args()
+    dataset = BulkImageDataset(args.input, img_size=args.img_size, fast_decode=Config.FAST_DECODE)
+    checkpoint_file = args.output.with_name(args.output.name + ".checkpoint.json")
+
+    state = None
+    if checkpoint_file.exists() and not args.restart:
+        state = json.loads(checkpoint_file.read_text())
+        if state["input"] != str(args.input.resolve()) or state["total"] != len(dataset):
+            print(f"Checkpoint {checkpoint_file} belongs to another input, use --restart to start over")
+            return 1
+        print(f"Resuming from checkpoint: {state['completed']}/{state['total']} images done")
+    completed = state["completed"] if state is not None else 0
+
+    writer = CsvResultWriter(args.output) if args.format == "csv" else ParquetResultWriter(args.output)
+    writer.open(state["writer"] if state is not None else None)
+
+    if args.torch_threads:
+        torch.set_num_threads(args.torch_threads)
+    model = load_engine(args.checkpoint or find_checkpoint(), args.engine, args.torch_threads)
+
+    remaining = torch.utils.data.Subset(dataset, range(completed, len(dataset)))
+    loader = DataLoader(
+        remaining,
+        batch_size=args.batch_size,
+        num_workers=args.workers,
+        collate_fn=collate_results,
+        pin_memory=False,
+        persistent_workers=False,
+        prefetch_factor=4 if args.workers > 0 else None
+    )
+
+    def save_checkpoint():
+        checkpoint = {
+            "input": str(args.input.resolve()),
+            "total": len(dataset),
+            "completed": completed,
+            "writer": writer.checkpoint(),
+        }
+        tmp_file = checkpoint_file.with_suffix(".tmp")
+        tmp_file.write_text(json.dumps(checkpoint))
+        tmp_file.replace(checkpoint_file)
+
+    print(f"Images: {len(dataset)} ({len(remaining)} remaining), batch size {args.batch_size}, workers {args.workers}")
+    start = time.perf_counter()
+    processed = 0
+    try:
+        for batch_number, (indices, ok_indices, batch, errors) in enumerate(loader, start=1):
+            probabilities = None
+            if batch is not None:
+                with torch.no_grad():
+                    probabilities = torch.nn.functional.softmax(model(batch), dim=1).numpy()
+            writer.write(build_rows(dataset.keys, indices, ok_indices, probabilities, errors))
+            # DataLoader отдаёт батчи по порядку, поэтому готовые позиции — сплошной префикс
+            completed = indices[-1] + 1
+            processed += len(indices)
+            if batch_number % args.checkpoint_every == 0:
+                save_checkpoint()
+                elapsed = time.perf_counter() - start
+                print(f"{completed}/{len(dataset)} images, {processed / elapsed:.1f} images/s")
+        save_checkpoint()
+    finally:
+        writer.close()
+
+    elapsed = time.perf_counter() - start
+    print(f"Done: {processed} images in {elapsed:.1f} s ({processed / elapsed if elapsed else 0:.1f} images/s)")
+    print(f"Results: {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
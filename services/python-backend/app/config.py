@@ -0,0 +1,150 @@
+import os
+from dataclasses import dataclass
+
+
+@dataclass
+class Config:
+    """Конфигурация бэкенда"""
+
+    # Максимальный размер батча, который планировщик отправляет в модель
+    MAX_BATCH_SIZE: int = int(os.getenv("MAX_BATCH_SIZE", "16"))
+
+    # Максимальное время ожидания добора батча (в миллисекундах)
+    MAX_WAIT_MS: float = float(os.getenv("MAX_WAIT_MS", "10"))
+
+    # Пул инференса: "thread", "process" (в каждом процессе своя копия модели)
+    # или "shared" (одна копия модели в shared memory на все процессы-воркеры)
+    INFERENCE_EXECUTOR: str = os.getenv("INFERENCE_EXECUTOR", "thread")
+
+    # Количество одновременно выполняемых батчей (слотов инференса)
+    INFERENCE_SLOTS: int = int(os.getenv("INFERENCE_SLOTS", "1"))
+
+    # Потоки torch на один слот (0 — поделить все ядра поровну между слотами)
+    TORCH_THREADS_PER_SLOT: int = int(os.getenv("TORCH_THREADS_PER_SLOT", "0"))
+
+    # Максимальное количество задач, ожидающих свободный слот
+    INFERENCE_QUEUE_SIZE: int = int(os.getenv("INFERENCE_QUEUE_SIZE", "64"))
+
+    # Движок инференса: eager, torchscript, onnx (см. tools.export_model) или int8 (см. tools.quantize_model)
+    INFERENCE_ENGINE: str = os.getenv("INFERENCE_ENGINE", "eager")
+
+    # Каталог с чекпоинтами ckpt* (пусто — app/models)
+    MODELS_DIR: str = os.getenv("MODELS_DIR", "")
+
+    # Каталог данных сервиса (индекс эмбеддингов, задачи /jobs) вне кода; пусто — data/ рядом с app/
+    # (в контейнере — /app/data, том backend-data в docker-compose)
+    DATA_DIR: str = os.getenv("DATA_DIR", "") or os.path.join(
+        os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data"
+    )
+
+    # Версия модели при старте (пусто — последняя версия в MODELS_DIR, см. models.registry)
+    MODEL_VERSION: str = os.getenv("MODEL_VERSION", "")
+
+    # Через сколько секунд после переключения предупреждать в логе, что батчи прежней версии ещё
+    # не завершились (её пул останавливается только после завершения всех отправленных батчей)
+    MODEL_DRAIN_TIMEOUT_S: float = float(os.getenv("MODEL_DRAIN_TIMEOUT_S", "60"))
+
+    # Токен админских эндпоинтов /models (заголовок X-Admin-Token); пусто — эндпоинты отключены (403),
+    # если не разрешён доступ без токена (ALLOW_UNAUTHENTICATED_ADMIN=true, только для локальной отладки)
+    ADMIN_TOKEN: str = os.getenv("ADMIN_TOKEN", "")
+    ALLOW_UNAUTHENTICATED_ADMIN: bool = os.getenv("ALLOW_UNAUTHENTICATED_ADMIN", "false").lower() == "true"
+
+    # Теневые головы: чекпоинты (через запятую, относительно MODELS_DIR) с тем же бэкбоном,
+    # что и основной; их головы считаются на тех же признаках бэкбона (движки eager и int8)
+    SHADOW_HEADS: tuple[str, ...] = tuple(
+        name.strip() for name in os.getenv("SHADOW_HEADS", "").split(",") if name.strip()
+    )
+
+    # Каскад: сначала проход в уменьшенном разрешении CASCADE_IMG_SIZE, результаты с top_confidence
+    # не ниже CASCADE_THRESHOLD принимаются, остальные изображения считаются в полном 448x448
+    CASCADE_ENABLED: bool = os.getenv("CASCADE_ENABLED", "false").lower() == "true"
+    CASCADE_IMG_SIZE: int = int(os.getenv("CASCADE_IMG_SIZE", "256"))
+    CASCADE_THRESHOLD: float = float(os.getenv("CASCADE_THRESHOLD", "0.9"))
+
+    # Кеш результатов по хешу загруженного файла и версии модели
+    RESULT_CACHE_ENABLED: bool = os.getenv("RESULT_CACHE_ENABLED", "true").lower() == "true"
+    RESULT_CACHE_MAX_ENTRIES: int = int(os.getenv("RESULT_CACHE_MAX_ENTRIES", "100000"))
+    RESULT_CACHE_MAX_BYTES: int = int(os.getenv("RESULT_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+
+    # Время жизни записи кеша (в секундах, 0 — без ограничения)
+    RESULT_CACHE_TTL_S: float = float(os.getenv("RESULT_CACHE_TTL_S", "0"))
+
+    # Путь к SQLite-файлу второго уровня кеша (пусто — только память)
+    RESULT_CACHE_SQLITE_PATH: str = os.getenv("RESULT_CACHE_SQLITE_PATH", "")
+
+    # Поиск почти-дубликатов по перцептивному хешу (перекодированные/уменьшенные копии фото)
+    NEAR_DUPLICATE_ENABLED: bool = os.getenv("NEAR_DUPLICATE_ENABLED", "true").lower() == "true"
+
+    # Максимальное расстояние Хэмминга между 64-битными хешами, при котором результат переиспользуется
+    NEAR_DUPLICATE_MAX_DISTANCE: int = int(os.getenv("NEAR_DUPLICATE_MAX_DISTANCE", "4"))
+    NEAR_DUPLICATE_MAX_ENTRIES: int = int(os.getenv("NEAR_DUPLICATE_MAX_ENTRIES", "100000"))
+
+    # Декодировать сразу в уменьшенном размере (не меньше входа модели): DCT-масштабирование JPEG
+    FAST_DECODE: bool = os.getenv("FAST_DECODE", "true").lower() == "true"
+
+    # Потоки для параллельного декодирования и resize изображений
+    DECODE_WORKERS: int = int(os.getenv("DECODE_WORKERS", "4"))
+
+    # Максимальное количество задач декодирования, ожидающих свободный поток
+    DECODE_QUEUE_SIZE: int = int(os.getenv("DECODE_QUEUE_SIZE", "32"))
+
+    # /classify_stream: сколько изображений одного запроса одновременно читается, декодируется и ждёт модель
+    STREAM_WINDOW_SIZE: int = int(os.getenv("STREAM_WINDOW_SIZE", "16"))
+
+    # Контроль нагрузки: лимиты изображений и байт в обработке и изображений в очереди к модели
+    # (0 — без ограничения); сверх них запросы сразу получают 429 с Retry-After
+    ADMISSION_MAX_IN_FLIGHT_IMAGES: int = int(os.getenv("ADMISSION_MAX_IN_FLIGHT_IMAGES", "256"))
+    ADMISSION_MAX_IN_FLIGHT_BYTES: int = int(os.getenv("ADMISSION_MAX_IN_FLIGHT_BYTES", str(512 * 1024 * 1024)))
+    ADMISSION_MAX_QUEUED_IMAGES: int = int(os.getenv("ADMISSION_MAX_QUEUED_IMAGES", "256"))
+
+    # Верхняя граница Retry-After (в секундах)
+    ADMISSION_MAX_RETRY_AFTER_S: int = int(os.getenv("ADMISSION_MAX_RETRY_AFTER_S", "60"))
+
+    # Лимиты загрузки /classify_batch и /classify_stream: тело запроса (больше — 413 до чтения
+    # всего тела) и отдельный файл (больше — ошибка в результате этого файла); 0 — без ограничения
+    MAX_REQUEST_BYTES: int = int(os.getenv("MAX_REQUEST_BYTES", str(256 * 1024 * 1024)))
+    MAX_FILE_BYTES: int = int(os.getenv("MAX_FILE_BYTES", str(20 * 1024 * 1024)))
+
+    # Максимум изображений в одном запросе /classify_batch и /classify_stream (0 — без ограничения)
+    MAX_IMAGES_PER_REQUEST: int = int(os.getenv("MAX_IMAGES_PER_REQUEST", "100"))
+
+    # Время этапов запроса в meta.timings и заголовке Server-Timing (можно включить параметром timings)
+    RESPONSE_TIMINGS: bool = os.getenv("RESPONSE_TIMINGS", "false").lower() == "true"
+
+    # Индекс эмбеддингов для /similar (/embed?store=true, /classify_batch?store_embeddings=true):
+    # каталог memmap-файлов (пусто — DATA_DIR/embeddings) и формат хранения векторов (float32 / float16 / int8)
+    EMBEDDING_INDEX_ENABLED: bool = os.getenv("EMBEDDING_INDEX_ENABLED", "true").lower() == "true"
+    EMBEDDING_INDEX_DIR: str = os.getenv("EMBEDDING_INDEX_DIR", "") or os.path.join(DATA_DIR, "embeddings")
+    EMBEDDING_INDEX_DTYPE: str = os.getenv("EMBEDDING_INDEX_DTYPE", "float16")
+
+    # IVF: число списков (0 — всегда полный перебор; обучение после NLIST * 64 векторов)
+    # и сколько ближайших списков просматривается при поиске
+    EMBEDDING_INDEX_NLIST: int = int(os.getenv("EMBEDDING_INDEX_NLIST", "0"))
+    EMBEDDING_INDEX_NPROBE: int = int(os.getenv("EMBEDDING_INDEX_NPROBE", "8"))
+
+    # Асинхронные задачи (/jobs): каталог со спулом файлов и SQLite-базой состояния задач
+    # (пусто — DATA_DIR/jobs)
+    JOBS_DIR: str = os.getenv("JOBS_DIR", "") or os.path.join(DATA_DIR, "jobs")
+
+    # Сколько задач обрабатывается одновременно и сколько файлов задачи уходит в обработку за раз
+    JOB_WORKERS: int = int(os.getenv("JOB_WORKERS", "1"))
+    JOB_CHUNK_SIZE: int = int(os.getenv("JOB_CHUNK_SIZE", "16"))
+
+    # Лимит тела запроса POST /jobs (больше — 413; 0 — без ограничения): выше MAX_REQUEST_BYTES,
+    # так как задачи принимают архивы; отдельные файлы ограничены MAX_FILE_BYTES
+    JOB_MAX_REQUEST_BYTES: int = int(os.getenv("JOB_MAX_REQUEST_BYTES", str(2 * 1024 * 1024 * 1024)))
+
+    # Лимиты задачи после распаковки архивов: суммарный объём файлов в спуле и число изображений
+    # (больше — 400; 0 — без ограничения). Файл архива больше MAX_FILE_BYTES тоже отклоняет задачу
+    JOB_MAX_SPOOL_BYTES: int = int(os.getenv("JOB_MAX_SPOOL_BYTES", str(4 * 1024 * 1024 * 1024)))
+    JOB_MAX_IMAGES: int = int(os.getenv("JOB_MAX_IMAGES", "10000"))
+
+    # Максимум задач в очереди: новые задачи сверх него получают 429 (0 — без ограничения)
+    JOB_MAX_QUEUED_JOBS: int = int(os.getenv("JOB_MAX_QUEUED_JOBS", "100"))
+
+    # Прогрев модели после загрузки: размеры батчей (через запятую) и число проходов на каждый.
+    # /readyz отвечает 200 только после прогрева; WARMUP_ITERATIONS=0 — без прогрева
+    WARMUP_BATCH_SIZES: tuple[int, ...] = tuple(
+        int(size) for size in os.getenv("WARMUP_BATCH_SIZES", f"1,{MAX_BATCH_SIZE}").split(",") if size.strip()
+    )
+    WARMUP_ITERATIONS: int = int(os.getenv("WARMUP_ITERATIONS", "2"))
@@ -1,20 +1,78 @@
 # services/backend/main.py
+import asyncio
 import os
 import logging
 from contextlib import asynccontextmanager
 
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from routers.classify import router as classify_router
+from config import Config
+from routers.classify import (
+    router as classify_router,
+    BATCHER,
+    DECODE_POOL,
+    EMBEDDING_INDEX,
+    MODEL_REGISTRY,
+    RESULT_CACHE
+)
+from routers.embeddings import router as embeddings_router
+from routers.health import router as health_router, READINESS
+from routers.jobs import router as jobs_router, JOB_MANAGER
+from routers.metrics import router as metrics_router
+from routers.models import router as models_router
+from services.timing import StageTimer
+from services.upload_limits import RequestSizeLimitMiddleware
 
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(f"uvicorn.{__name__}")
 
 
+async def start_services():
+    """
+    Фоновый старт: загрузка модели, запуск пулов и прогрев. Пока он идёт, сервер уже
+    принимает соединения: /healthz отвечает, /readyz и эндпоинты инференса — 503.
+    """
+    # Время каждого этапа старта попадает в лог: от него зависит скорость масштабирования подов
+    timer = StageTimer()
+    try:
+        # Модель загружается пулом инференса её версии и прогревается в нём (этапы model и warmup)
+        READINESS.set_stage("loading_model")
+        await MODEL_REGISTRY.start(timer)
+        logger.info(f"Model loaded successfully (version {MODEL_REGISTRY.version.version})")
+        READINESS.set_stage("starting_workers")
+        with timer.measure("decode_pool"):
+            DECODE_POOL.start()
+        with timer.measure("batcher"):
+            await BATCHER.start()
+        if EMBEDDING_INDEX is not None:
+            with timer.measure("embedding_index"):
+                await asyncio.to_thread(EMBEDDING_INDEX.open)
+        # Незавершённые задачи из прошлого запуска продолжаются после прогрева
+        with timer.measure("jobs"):
+            await JOB_MANAGER.start()
+        READINESS.set_ready(timer)
+        logger.info(f"Startup completed in {sum(timer.as_ms().values()):.1f} ms ({timer.format()})")
+    except Exception as e:
+        READINESS.set_failed(e)
+        logger.exception(f"Startup failed: {str(e)}")
+
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
+    startup = asyncio.create_task(start_services())
     yield
+    if not startup.done():
+        startup.cancel()
+        await asyncio.gather(startup, return_exceptions=True)
+    await JOB_MANAGER.stop()
+    await BATCHER.stop()
+    DECODE_POOL.stop()
+    await MODEL_REGISTRY.stop()
+    if RESULT_CACHE is not None:
+        RESULT_CACHE.close()
+    if EMBEDDING_INDEX is not None:
+        EMBEDDING_INDEX.close()
 
 
 # Настройка логирования
@@ -63,6 +121,17 @@ app = FastAPI(
 )
 
 
+# Лимиты тела запросов загрузки (у /jobs — свой, для архивов); добавлены до CORS, чтобы ответ 413 тоже получал CORS-заголовки
+app.add_middleware(
+    RequestSizeLimitMiddleware,
+    max_body_bytes=Config.MAX_REQUEST_BYTES,
+    paths=("/classify_batch", "/classify_stream", "/embed", "/similar")
+)
+app.add_middleware(
+    RequestSizeLimitMiddleware,
+    max_body_bytes=Config.JOB_MAX_REQUEST_BYTES,
+    paths=("/jobs",)
+)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
@@ -71,7 +140,12 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+app.include_router(health_router)
 app.include_router(classify_router)
+app.include_router(jobs_router)
+app.include_router(embeddings_router)
+app.include_router(metrics_router)
+app.include_router(models_router)
 
 # Запуск сервер
 if __name__ == "__main__":
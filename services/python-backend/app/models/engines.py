@@ -0,0 +1,96 @@
+import inspect
+from pathlib import Path
+from typing import Literal
+
+import numpy as np
+import torch
+from torch import nn
+
+
+EngineName = Literal['eager', 'torchscript', 'onnx', 'int8']
+ENGINE_NAMES: tuple[str, ...] = ('eager', 'torchscript', 'onnx', 'int8')
+
+# Суффиксы файлов, в которые export_model и quantize_model сохраняют чекпоинт ckpt*.pth
+TORCHSCRIPT_SUFFIX = ".torchscript.pt"
+ONNX_SUFFIX = ".onnx"
+INT8_SUFFIX = ".int8.pt"
+EXPORTED_SUFFIXES = (TORCHSCRIPT_SUFFIX, ONNX_SUFFIX, INT8_SUFFIX)
+
+
+def exported_path(checkpoint_path: Path, engine: EngineName) -> Path:
+    suffix = {'torchscript': TORCHSCRIPT_SUFFIX, 'onnx': ONNX_SUFFIX, 'int8': INT8_SUFFIX}[engine]
+    return checkpoint_path.with_name(checkpoint_path.stem + suffix)
+
+
+def build_torchscript(model: nn.Module, img_size: int = 448) -> torch.jit.ScriptModule:
+    """
+    Трассирует модель и замораживает граф: torch.jit.freeze встраивает веса
+    как константы и сворачивает BatchNorm в предшествующие свёртки
+    """
+    model.eval()
+    example = torch.zeros(1, 3, img_size, img_size)
+    with torch.no_grad():
+        traced = torch.jit.trace(model, example)
+    return torch.jit.freeze(traced)
+
+
+def export_onnx(model: nn.Module, output_path: Path, img_size: int = 448, opset_version: int = 17):
+    model.eval()
+    example = torch.zeros(1, 3, img_size, img_size)
+    kwargs = {}
+    if 'dynamo' in inspect.signature(torch.onnx.export).parameters:
+        # В новых версиях torch по умолчанию включён dynamo-экспортёр, которому нужен onnxscript
+        kwargs['dynamo'] = False
+    torch.onnx.export(
+        model,
+        example,
+        str(output_path),
+        input_names=['input'],
+        output_names=['logits'],
+        dynamic_axes={'input': {0: 'batch'}, 'logits': {0: 'batch'}},
+        opset_version=opset_version,
+        do_constant_folding=True,
+        **kwargs
+    )
+
+
+class OnnxRuntimeModel:
+    """
+    Обёртка над onnxruntime.InferenceSession с тем же интерфейсом, что у модели:
+    принимает батч torch.Tensor (N, C, H, W) и возвращает логиты torch.Tensor
+    """
+
+    def __init__(self, onnx_path: Path, num_threads: int = 0):
+        try:
+            import onnxruntime as ort
+        except ImportError as e:
+            raise ImportError("onnxruntime is required for the 'onnx' inference engine") from e
+
+        if not onnx_path.exists():
+            raise FileNotFoundError(f"ONNX model {onnx_path} not found, run tools.export_model first")
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if num_threads:
+            options.intra_op_num_threads = num_threads
+        self.onnx_path = onnx_path
+        self.session = ort.InferenceSession(
+            str(onnx_path), sess_options=options, providers=['CPUExecutionProvider']
+        )
+        self.input_name = self.session.get_inputs()[0].name
+
+    def __call__(self, batch_tensor: torch.Tensor) -> torch.Tensor:
+        inputs = np.ascontiguousarray(batch_tensor.numpy(), dtype=np.float32)
+        (logits,) = self.session.run(None, {self.input_name: inputs})
+        return torch.from_numpy(logits)
+
+    def eval(self):
+        return self
+
+
+def is_shareable(model) -> bool:
+    """Можно ли передать модель в другой процесс через shared memory (только eager fp32 nn.Module)"""
+    if not isinstance(model, nn.Module) or isinstance(model, torch.jit.ScriptModule):
+        return False
+    # Упакованные int8-веса квантованных слоёв не переносятся в shared memory
+    return not any(type(module).__module__.startswith("torch.ao.nn.quantized") for module in model.modules())
@@ -1,3 +1,5 @@
+import logging
+from itertools import chain
 from pathlib import Path
 from typing import Literal
 import torch
@@ -5,6 +7,24 @@ from torch import nn
 from torchvision import transforms
 import timm
 
+from config import Config
+from models.engines import (
+    EngineName,
+    OnnxRuntimeModel,
+    build_torchscript,
+    exported_path
+)
+from models.quantization import quantize_head_dynamic, quantize_linear_dynamic
+from models.registry import scan_models
+from models.weights import read_state_dict
+from services.timing import StageTimer
+
+
+logger = logging.getLogger(f"uvicorn.{__name__}")
+
+
+CLASS_NAMES = ["A0", "A1", "B0", "B1", "C0", "C1", "D0", "D1"]
+
 
 class InteriorClassifier(nn.Module):
     """
@@ -62,17 +82,107 @@ class InteriorClassifier(nn.Module):
         return self.head(features)
 
 
-def load_model(checkpoint_path: Path):
+def load_model(checkpoint_path: Path, timer: StageTimer | None = None):
+    """
+    Быстрый холодный старт: архитектура создаётся на meta-устройстве без предобученных
+    весов ImageNet (без скачивания и инициализации), затем тензоры из чекпоинта
+    подставляются в модель как есть (assign=True), без лишнего копирования.
+    """
     if not checkpoint_path.exists():
         raise FileNotFoundError(f"Model file {checkpoint_path} not found")
-    
-    checkpoint = torch.load(checkpoint_path, map_location=torch.device('cpu'))
-    model = InteriorClassifier(num_classes=8)
-    model.load_state_dict(checkpoint['model_state_dict'])
+    timer = timer or StageTimer()
+
+    with timer.measure("read_weights"):
+        state_dict = read_state_dict(checkpoint_path)
+    with timer.measure("build"):
+        with torch.device('meta'):
+            model = InteriorClassifier(num_classes=len(CLASS_NAMES), pretrained=False)
+    with timer.measure("load_state_dict"):
+        model.load_state_dict(state_dict, assign=True)
+        missing = [name for name, tensor in chain(model.named_parameters(), model.named_buffers()) if tensor.is_meta]
+        if missing:
+            raise RuntimeError(f"Checkpoint {checkpoint_path} has no values for: {', '.join(missing)}")
+        model.float()
     model.eval()
     return model
 
 
+def load_engine(
+    checkpoint_path: Path,
+    engine: EngineName = 'eager',
+    num_threads: int = 0,
+    timer: StageTimer | None = None
+) -> nn.Module | OnnxRuntimeModel:
+    """
+    Загружает модель для инференса указанным движком:
+    eager — обычная модель PyTorch,
+    torchscript — замороженный граф TorchScript (BatchNorm свёрнут в свёртки),
+    onnx — сессия ONNX Runtime на CPU,
+    int8 — квантованная модель (tools.quantize_model); без файла — динамическая
+    квантизация головы.
+    Файлы torchscript/onnx создаются командой tools.export_model рядом с чекпоинтом.
+    """
+    if engine == 'eager':
+        return load_model(checkpoint_path, timer)
+    if engine == 'torchscript':
+        script_path = exported_path(checkpoint_path, 'torchscript')
+        if script_path.exists():
+            return torch.jit.load(str(script_path), map_location=torch.device('cpu'))
+        # Нет экспортированного файла — трассируем чекпоинт при старте
+        print(f"TorchScript file {script_path} not found, tracing {checkpoint_path}")
+        return build_torchscript(load_model(checkpoint_path, timer))
+    if engine == 'onnx':
+        return OnnxRuntimeModel(exported_path(checkpoint_path, 'onnx'), num_threads=num_threads)
+    if engine == 'int8':
+        int8_path = exported_path(checkpoint_path, 'int8')
+        if int8_path.exists():
+            return torch.jit.load(str(int8_path), map_location=torch.device('cpu'))
+        print(f"INT8 model {int8_path} not found, using dynamic quantization of the head only")
+        return quantize_head_dynamic(load_model(checkpoint_path, timer))
+    raise ValueError(f"Unknown inference engine: {engine}")
+
+
+def load_shadow_heads(model: InteriorClassifier, checkpoint_paths: list[Path], quantize: bool = False) -> nn.ModuleDict:
+    """
+    Головы других чекпоинтов для теневого сравнения с основной моделью.
+
+    Чекпоинт подходит, только если веса его бэкбона совпадают с бэкбоном model: тогда
+    бэкбон считается один раз на батч, а головы (доли процента времени) — на его признаках.
+    Чекпоинт с другим бэкбоном пропускается с ошибкой в логе — основная модель работает дальше.
+    quantize — динамическая квантизация голов, как у основной модели в движке int8.
+    """
+    backbone_state = model.backbone.state_dict()
+    heads = nn.ModuleDict()
+    for checkpoint_path in checkpoint_paths:
+        shadow = load_model(checkpoint_path)
+        shadow_state = shadow.backbone.state_dict()
+        same_backbone = shadow_state.keys() == backbone_state.keys() and all(
+            torch.equal(tensor, backbone_state[name]) for name, tensor in shadow_state.items()
+        )
+        if not same_backbone:
+            logger.error(f"Shadow head {checkpoint_path.name} skipped: its backbone weights differ from the primary model")
+            continue
+        head = shadow.head.eval()
+        if quantize:
+            head = quantize_linear_dynamic(head)
+        # Имя головы — имя файла чекпоинта без расширения (точки недопустимы в именах модулей)
+        heads[checkpoint_path.stem.replace(".", "_")] = head
+    return heads
+
+
+def default_models_dir() -> Path:
+    return Path(Config.MODELS_DIR) if Config.MODELS_DIR else Path(__file__).parent
+
+
+def find_checkpoint(models_dir: Path | None = None) -> Path:
+    """Чекпоинт последней версии каталога (см. models.registry.scan_models)"""
+    models_dir = models_dir or default_models_dir()
+    versions = scan_models(models_dir)
+    if not versions:
+        raise FileNotFoundError(f"No checkpoint files found in {models_dir}")
+    return versions[-1].checkpoint_path
+
+
 def get_inference_transforms(img_size=380) -> transforms.Compose:
     transform = transforms.Compose(
         [
@@ -85,17 +195,51 @@ def get_inference_transforms(img_size=380) -> transforms.Compose:
 
 _model_instance = None  # singleton instance
 
-def get_model() -> InteriorClassifier:
+
+def attach_shadow_heads(model: nn.Module | OnnxRuntimeModel):
+    """Теневые головы из Config.SHADOW_HEADS; их вероятности считает services.inference.predict_probabilities"""
+    if not isinstance(model, InteriorClassifier):
+        # В ONNX, TorchScript и статически квантованной модели голова встроена в граф
+        logger.warning(f"Shadow heads are not supported by the '{Config.INFERENCE_ENGINE}' engine, ignoring SHADOW_HEADS")
+        return
+    models_dir = default_models_dir()
+    model.shadow_heads = load_shadow_heads(
+        model,
+        [models_dir / name for name in Config.SHADOW_HEADS],
+        quantize=Config.INFERENCE_ENGINE == 'int8'
+    )
+    logger.info(f"Shadow heads loaded: {', '.join(model.shadow_heads) or 'none'}")
+
+
+def load_serving_model(checkpoint_path: Path) -> nn.Module | OnnxRuntimeModel:
+    """Модель для обслуживания запросов: движок Config.INFERENCE_ENGINE и теневые головы"""
+    timer = StageTimer()
+    print(f"Using checkpoint file: {checkpoint_path} (engine: {Config.INFERENCE_ENGINE})")
+    with timer.measure("total"):
+        model = load_engine(
+            checkpoint_path=checkpoint_path,
+            engine=Config.INFERENCE_ENGINE,
+            num_threads=Config.TORCH_THREADS_PER_SLOT,
+            timer=timer
+        )
+    if Config.SHADOW_HEADS:
+        with timer.measure("shadow_heads"):
+            attach_shadow_heads(model)
+    if Config.CASCADE_ENABLED and isinstance(model, OnnxRuntimeModel):
+        logger.warning("Cascade is not supported by the 'onnx' engine (fixed 448x448 input), ignoring CASCADE_ENABLED")
+    logger.info(f"Model loaded ({timer.format()})")
+    return model
+
+
+def get_model() -> nn.Module | OnnxRuntimeModel:
+    """
+    Модель последней версии каталога, загружаемая один раз на процесс. Сервер загружает
+    версии через services.model_registry.ModelRegistry, get_model — для остальных случаев.
+    """
     global _model_instance
     if _model_instance is None:
         try:
-            models_dir = Path(__file__).parent
-            checkpoint_files = list(models_dir.glob("ckpt*"))
-            if not checkpoint_files:
-                raise FileNotFoundError(f"No checkpoint files found in {models_dir}")
-            checkpoint_path = checkpoint_files[0]
-            print(f"Using checkpoint file: {checkpoint_path}")
-            _model_instance = load_model(checkpoint_path=checkpoint_path)
+            _model_instance = load_serving_model(find_checkpoint())
         except Exception as e:
             print(f"Failed to load model: {str(e)}")
             raise RuntimeError("Failed to initialize model")
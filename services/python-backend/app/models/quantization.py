@@ -0,0 +1,49 @@
+import copy
+from typing import Iterable
+
+import torch
+from torch import nn
+from torch.ao.quantization import get_default_qconfig_mapping, quantize_dynamic
+from torch.ao.quantization.quantize_fx import convert_fx, prepare_fx
+
+
+# Бэкенд квантованных ядер для x86 CPU (fbgemm + onednn)
+QUANTIZATION_BACKEND = "x86"
+
+
+def quantize_linear_dynamic(module: nn.Module) -> nn.Module:
+    """
+    Динамическая квантизация nn.Linear: веса хранятся в int8,
+    активации квантуются на лету. Калибровка не нужна.
+    """
+    return quantize_dynamic(module, {nn.Linear}, dtype=torch.qint8)
+
+
+def quantize_head_dynamic(model: nn.Module) -> nn.Module:
+    """Динамическая квантизация головы модели (см. quantize_linear_dynamic)"""
+    model = copy.deepcopy(model).eval()
+    model.head = quantize_linear_dynamic(model.head)
+    return model
+
+
+def quantize_static(
+    model: nn.Module,
+    calibration_batches: Iterable[torch.Tensor],
+    img_size: int = 448
+) -> nn.Module:
+    """
+    Статическая пост-тренировочная квантизация бэкбона (FX graph mode) с калибровкой
+    диапазонов активаций на calibration_batches плюс динамическая квантизация головы
+    """
+    torch.backends.quantized.engine = QUANTIZATION_BACKEND
+    model = quantize_head_dynamic(model)
+
+    example_inputs = (torch.zeros(1, 3, img_size, img_size),)
+    qconfig_mapping = get_default_qconfig_mapping(QUANTIZATION_BACKEND)
+    prepared = prepare_fx(model.backbone, qconfig_mapping, example_inputs)
+    with torch.no_grad():
+        for batch_tensor in calibration_batches:
+            prepared(batch_tensor)
+    model.backbone = convert_fx(prepared)
+    return model.eval()
+
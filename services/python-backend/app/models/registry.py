@@ -0,0 +1,108 @@
+import json
+import logging
+import re
+from dataclasses import dataclass, field
+from pathlib import Path
+
+from models.engines import EXPORTED_SUFFIXES
+from models.weights import WEIGHTS_SUFFIX, weights_path
+
+
+logger = logging.getLogger(f"uvicorn.{__name__}")
+
+
+# Метаданные версии лежат рядом с чекпоинтом: ckpt_best.pth -> ckpt_best.json
+METADATA_SUFFIX = ".json"
+
+DEFAULT_BACKBONE_NAME = "EfficientNet-B3"
+
+
+@dataclass(frozen=True)
+class ModelVersion:
+    """Версия модели в каталоге чекпоинтов"""
+    version: str
+    checkpoint_path: Path
+    backbone_name: str = DEFAULT_BACKBONE_NAME
+    # Остальные поля метаданных (описание, дата обучения, метрики) — только для отображения
+    metadata: dict = field(default_factory=dict, compare=False, hash=False)
+
+    @property
+    def key(self) -> str:
+        """Ключ кешей результатов: результаты разных версий не смешиваются"""
+        return f"{self.backbone_name}:{self.version}"
+
+    def as_dict(self) -> dict:
+        return {
+            "version": self.version,
+            "backbone_name": self.backbone_name,
+            "checkpoint": self.checkpoint_path.name,
+            "metadata": self.metadata,
+        }
+
+
+def metadata_path(checkpoint_path: Path) -> Path:
+    return checkpoint_path.with_name(checkpoint_path.stem + METADATA_SUFFIX)
+
+
+def read_version_metadata(checkpoint_path: Path) -> dict:
+    """
+    Метаданные версии: файл <чекпоинт>.json ({"version": "1.2.0", ...}) или, если его нет,
+    метаданные заголовка .safetensors (читается только заголовок, не веса)
+    """
+    sidecar = metadata_path(checkpoint_path)
+    if sidecar.exists():
+        return json.loads(sidecar.read_text(encoding="utf-8"))
+    safetensors_path = checkpoint_path if checkpoint_path.suffix == WEIGHTS_SUFFIX else weights_path(checkpoint_path)
+    if safetensors_path.exists():
+        from safetensors import safe_open
+        with safe_open(str(safetensors_path), framework="pt") as f:
+            return dict(f.metadata() or {})
+    return {}
+
+
+def version_sort_key(version: str) -> tuple:
+    # "1.10.0" > "1.9.2", "ckpt_epoch10" > "ckpt_epoch9": числа внутри частей (в том числе
+    # в именах файлов без метаданных) сравниваются как числа, остальное — как строки
+    return tuple(
+        (0, int(token)) if token.isdigit() else (1, token)
+        for part in re.split(r"[.\-+_]", version)
+        for token in re.split(r"(\d+)", part) if token
+    )
+
+
+def scan_models(models_dir: Path) -> list[ModelVersion]:
+    """
+    Версии моделей каталога по возрастанию версии.
+
+    Чекпоинт — файл ckpt*, кроме экспортированных движков и файлов метаданных;
+    ckpt_x.pth и ckpt_x.safetensors — один чекпоинт (берётся исходный .pth, веса
+    load_model всё равно прочитает из .safetensors). Версия берётся из метаданных,
+    без них — имя файла. При совпадении версий остаётся более новый файл.
+    """
+    checkpoints: dict[str, Path] = {}
+    for path in models_dir.glob("ckpt*"):
+        if path.name.endswith(EXPORTED_SUFFIXES) or path.suffix == METADATA_SUFFIX:
+            continue
+        current = checkpoints.get(path.stem)
+        if current is None or current.suffix == WEIGHTS_SUFFIX:
+            checkpoints[path.stem] = path
+
+    versions: dict[str, ModelVersion] = {}
+    for checkpoint_path in checkpoints.values():
+        metadata = read_version_metadata(checkpoint_path)
+        version = ModelVersion(
+            version=str(metadata.get("version") or checkpoint_path.stem),
+            checkpoint_path=checkpoint_path,
+            backbone_name=metadata.get("backbone_name", DEFAULT_BACKBONE_NAME),
+            metadata={name: value for name, value in metadata.items() if name not in ("version", "backbone_name")}
+        )
+        duplicate = versions.get(version.version)
+        if duplicate is not None:
+            logger.warning(
+                f"Version {version.version} is defined by both {duplicate.checkpoint_path.name} "
+                f"and {checkpoint_path.name}, using the newer file"
+            )
+            if duplicate.checkpoint_path.stat().st_mtime >= checkpoint_path.stat().st_mtime:
+                continue
+        versions[version.version] = version
+    return sorted(versions.values(), key=lambda version: version_sort_key(version.version))
@@ -0,0 +1,47 @@
+from pathlib import Path
+
+import torch
+
+
+# Веса без состояния оптимизатора, сохраняются tools.convert_checkpoint рядом с ckpt*.pth
+WEIGHTS_SUFFIX = ".safetensors"
+
+
+def weights_path(checkpoint_path: Path) -> Path:
+    return checkpoint_path.with_name(checkpoint_path.stem + WEIGHTS_SUFFIX)
+
+
+def extract_state_dict(checkpoint: dict) -> dict[str, torch.Tensor]:
+    """Обучающий чекпоинт хранит веса в 'model_state_dict' рядом с состоянием оптимизатора"""
+    return checkpoint.get('model_state_dict', checkpoint)
+
+
+def read_state_dict(checkpoint_path: Path) -> dict[str, torch.Tensor]:
+    """
+    Читает только веса модели.
+
+    Если рядом есть .safetensors (или передан сам .safetensors), тензоры отображаются
+    из файла в память без распаковки pickle. Иначе чекпоинт открывается через mmap:
+    в RAM попадают только реально используемые тензоры, а состояние оптимизатора
+    остаётся на диске.
+    """
+    safetensors_path = checkpoint_path if checkpoint_path.suffix == WEIGHTS_SUFFIX else weights_path(checkpoint_path)
+    if safetensors_path.exists():
+        from safetensors.torch import load_file
+        return load_file(str(safetensors_path), device='cpu')
+
+    try:
+        checkpoint = torch.load(checkpoint_path, map_location=torch.device('cpu'), mmap=True, weights_only=True)
+    except Exception as e:
+        # Старый формат файла (без zip) не отображается в память, а в pickle могут быть
+        # не только тензоры — такие чекпоинты читаются обычным способом
+        print(f"Fast checkpoint loading is not available for {checkpoint_path} ({type(e).__name__}), using torch.load")
+        checkpoint = torch.load(checkpoint_path, map_location=torch.device('cpu'), weights_only=False)
+    return extract_state_dict(checkpoint)
+
+
+def save_weights(state_dict: dict[str, torch.Tensor], output_path: Path, metadata: dict[str, str] | None = None):
+    from safetensors.torch import save_file
+    # safetensors не хранит представления с общей памятью и требует непрерывные тензоры
+    tensors = {name: tensor.detach().contiguous().clone() for name, tensor in state_dict.items()}
+    save_file(tensors, str(output_path), metadata=metadata)
@@ -1,28 +1,162 @@
-from pydantic import BaseModel
+from datetime import datetime
+from typing import ClassVar
 
+from pydantic import BaseModel, model_serializer
+
+
+class OptionalFieldsModel(BaseModel):
+    """
+    Поля OPTIONAL_FIELDS включаются параметрами запроса (timings, shadow, store_embeddings)
+    или настройками и попадают в ответ, только если заданы: ответ по умолчанию остаётся прежним
+    """
+    OPTIONAL_FIELDS: ClassVar[tuple[str, ...]] = ()
+
+    @model_serializer(mode="wrap")
+    def _drop_unset_optional_fields(self, handler):
+        data = handler(self)
+        for name in self.OPTIONAL_FIELDS:
+            if data.get(name, False) is None:
+                del data[name]
+        return data
+
+
+class StageTimings(BaseModel):
+    """Время этапов запроса, мс; preprocess и inference — суммарно по батчам модели с изображениями запроса"""
+    decode_ms: float
+    queue_wait_ms: float
+    preprocess_ms: float
+    inference_ms: float
+    postprocess_ms: float
+
+
+class MetaInfo(OptionalFieldsModel):
+    OPTIONAL_FIELDS = ("cache_hits", "cache_misses", "near_duplicate_hits", "timings", "stored_embeddings")
 
-class MetaInfo(BaseModel):
     total_images: int
     total_processing_time_ms: int
-    model_version: str | None = None
+    model_version: str | None = None  # через запятую, если запрос пришёлся на переключение версий
     backbone_name: str | None = None
+    cache_hits: int | None = None
+    cache_misses: int | None = None
+    near_duplicate_hits: int | None = None
+    timings: StageTimings | None = None
+    stored_embeddings: int | None = None  # только с store_embeddings=true
     # можно добавить дополнительные поля в будущем, например:
     # model_version: str | None = None
     # server_time: str | None = None
 
 
-class ClassificationResult(BaseModel):
+# Предсказание теневой головы (SHADOW_HEADS) для того же изображения, /classify_batch?shadow=true
+class ShadowPrediction(BaseModel):
+    predicted_class: str
+    top_confidence: float
+    class_confidences: dict[str, float]
+
+
+class ClassificationResult(OptionalFieldsModel):
+    OPTIONAL_FIELDS = ("model_version", "shadow_predictions", "embedding_id")
+
     predicted_class: str | None
     top_confidence: float | None
     class_confidences: dict[str, float]
     image_name: str
     error: str | None = None
+    model_version: str | None = None  # версия модели, выдавшая результат (в ответе — при переключении версий)
+    shadow_predictions: dict[str, ShadowPrediction] | None = None
+    embedding_id: str | None = None  # id вектора в индексе /similar, только с store_embeddings=true
 
 
 class ClassificationResponse(BaseModel):
     results: list[ClassificationResult]
     meta: MetaInfo | None = None
 
+
+# Компактный формат ответа (response_format=compact): список классов передаётся один раз
+# в meta, вероятности — массивами в том же порядке; с top_k — только k лучших классов
+class CompactClassificationResult(BaseModel):
+    image_name: str
+    predicted_class: str | None
+    top_confidence: float | None
+    probabilities: list[float] | None = None
+    top_classes: list[str] | None = None
+    top_probabilities: list[float] | None = None
+    error: str | None = None
+    embedding_id: str | None = None
+
+
+class CompactMetaInfo(MetaInfo):
+    class_names: list[str]
+
+
+class CompactClassificationResponse(BaseModel):
+    results: list[CompactClassificationResult]
+    meta: CompactMetaInfo
+
+
+# /embed: признаки бэкбона после пулинга (feature_dim чисел) для каждого изображения
+class EmbeddingResult(OptionalFieldsModel):
+    OPTIONAL_FIELDS = ("id",)
+
+    image_name: str
+    embedding: list[float] | None
+    error: str | None = None
+    id: str | None = None  # id вектора в индексе /similar, только с store=true
+
+
+class EmbeddingMetaInfo(OptionalFieldsModel):
+    OPTIONAL_FIELDS = ("stored_embeddings",)
+
+    total_images: int
+    total_processing_time_ms: int
+    model_version: str | None = None
+    backbone_name: str | None = None
+    embedding_dim: int | None = None
+    stored_embeddings: int | None = None  # только с store=true
+
+
+class EmbeddingResponse(BaseModel):
+    results: list[EmbeddingResult]
+    meta: EmbeddingMetaInfo
+
+
+# /similar: ближайшие векторы индекса по косинусной близости
+class SimilarItem(BaseModel):
+    id: str
+    score: float
+
+
+class SimilarMetaInfo(BaseModel):
+    index_size: int
+    mode: str  # flat / ivf
+    nprobe: int | None = None  # только для ivf
+    embed_ms: float | None = None  # только для запроса по изображению
+    search_ms: float
+    total_processing_time_ms: int
+
+
+class SimilarResponse(BaseModel):
+    query: str  # image_id или имя загруженного файла
+    results: list[SimilarItem]
+    meta: SimilarMetaInfo
+
+
+class JobCreated(BaseModel):
+    job_id: str
+    status: str
+    total_images: int
+
+
+class JobInfo(BaseModel):
+    job_id: str
+    status: str  # queued / running / completed / failed
+    total_images: int
+    processed_images: int
+    error: str | None = None
+    created_at: datetime
+    updated_at: datetime
+    # Готовые результаты в порядке загрузки файлов (с учётом offset/limit запроса)
+    results: list[ClassificationResult] | None = None
+
 # example_response = {
 #   "results": [
 #     {
@@ -1,16 +1,73 @@
+import asyncio
 import logging
-from fastapi import UploadFile, File, HTTPException, Depends
+import time
+from collections import Counter
+from dataclasses import dataclass
+from functools import partial
+from typing import AsyncIterator, Literal, NamedTuple
+from fastapi import UploadFile, File, Form, HTTPException, Depends, Query
 from fastapi import APIRouter
-from datetime import datetime
-from PIL import Image
-import io
-import torch
-from pydantic_models import ClassificationResult, ClassificationResponse, MetaInfo
+from fastapi.responses import StreamingResponse
+from starlette.background import BackgroundTask
+from pathlib import Path
+import numpy as np
+from config import Config
+from pydantic_models import (
+    ClassificationResult,
+    ClassificationResponse,
+    CompactClassificationResponse,
+    CompactClassificationResult,
+    CompactMetaInfo,
+    MetaInfo,
+    ShadowPrediction,
+    StageTimings
+)
 from models.interior_classifier_EfficientNet_B3 import (
-    InteriorClassifier,
-    get_inference_transforms,
-    get_model
+    CLASS_NAMES,
+    default_models_dir,
+    load_serving_model
+)
+from models.registry import ModelVersion, version_sort_key
+from routers.health import require_ready
+from services.admission import AdmissionController, AdmissionRejected, AdmissionTicket
+from services.batcher import BatchedResult, MicroBatcher
+from services.decoding import DecodePool, ImageSource, source_size
+from services.executor import InferenceExecutor
+from services.inference import prepare_image
+from services.metrics import (
+    CASCADE_IMAGES,
+    DECODE_ERRORS,
+    IMAGES,
+    IN_FLIGHT_REQUESTS,
+    INFERENCE_ERRORS,
+    REJECTED_REQUESTS,
+    REQUEST_SECONDS,
+    SHADOW_PREDICTIONS,
+    observe_batch,
+    observe_stages
 )
+from services.model_registry import ModelRegistry
+from services.near_duplicate import NearDuplicateIndex, compute_dhash
+from services.postprocessing import BatchPostprocessor
+from services.result_cache import ResultCache, content_digest, make_cache_key
+from services.timing import StageTimer
+from services.upload_limits import FileTooLargeError
+from services.vector_index import VectorIndex
+from services.warmup import warm_up
+
+try:
+    # orjson сериализует ответы на больших батчах в разы быстрее стандартного json
+    import orjson
+    from fastapi.responses import ORJSONResponse as FastJSONResponse
+
+    def dumps_json(content) -> bytes:
+        return orjson.dumps(content)
+except ImportError:
+    import json
+    from fastapi.responses import JSONResponse as FastJSONResponse
+
+    def dumps_json(content) -> bytes:
+        return json.dumps(content, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
 
 
 logger = logging.getLogger(f"uvicorn.{__file__}")
@@ -18,99 +75,736 @@ router = APIRouter()
 
 
 # Инициализация глобальных переменных
-try:
-    MODEL = get_model()  # инициализируем при старте первый раз
-    CLASS_NAMES = ["A0", "A1", "B0", "B1", "C0", "C1", "D0", "D1"]
-    MODEL_VERSION = "1.0.0"  # Можно получить из checkpoint или задать явно
-    BACKBONE_NAME = "EfficientNet-B3"
-    logger.info("Model loaded successfully")
-except Exception as e:
-    logger.error(f"Failed to load model: {str(e)}")
-    raise RuntimeError("Failed to initialize model")
-
-
-def classify_images_batch(
-        images: list[Image.Image],
-        image_names: list[str],
-        model: InteriorClassifier
-    ) -> list[ClassificationResult]:
-    transforms = get_inference_transforms(img_size=448)
-    tensors = [transforms(img).unsqueeze(0) for img in images]
-    batch_tensor = torch.cat(tensors, dim=0)
-    with torch.no_grad():
-        outputs = model(batch_tensor)
-        probabilities = torch.nn.functional.softmax(outputs, dim=1)
-        results = []
-        for i in range(len(images)):
-            probs = probabilities[i]
-            confidences = {CLASS_NAMES[j]: round(float(probs[j]), 4) for j in range(len(CLASS_NAMES))}
-            top_confidence, predicted = torch.max(probs, 0)
-            results.append(
-                ClassificationResult(
-                    predicted_class=CLASS_NAMES[predicted.item()],
-                    top_confidence=round(float(top_confidence.item()), 4),
-                    class_confidences=confidences,
-                    image_name=image_names[i],
-                    error=None
-                )
+# Модель загружается при старте приложения (lifespan) реестром версий, а не при импорте:
+# процессы пула инференса импортируют этот модуль заново и не должны грузить свою копию
+POSTPROCESSOR = BatchPostprocessor(CLASS_NAMES)
+
+
+def build_error_result(image_name: str, error: Exception) -> ClassificationResult:
+    err_msg = str(error)
+    if "cannot identify image file" in err_msg:
+        user_msg = (
+            "File is not a supported image format. "
+            "Supported formats: jpg, jpeg, png, bmp, gif, tiff, webp, ico."
+        )
+    else:
+        user_msg = err_msg
+    return ClassificationResult(
+        predicted_class=None,
+        top_confidence=None,
+        class_confidences={},
+        image_name=image_name,
+        error=user_msg
+    )
+
+
+def create_executor(version: ModelVersion) -> InferenceExecutor:
+    """Пул для инференса вне event loop, который выполняет модель этой версии"""
+    return InferenceExecutor(
+        mode=Config.INFERENCE_EXECUTOR,
+        num_slots=Config.INFERENCE_SLOTS,
+        threads_per_slot=Config.TORCH_THREADS_PER_SLOT,
+        max_queue_size=Config.INFERENCE_QUEUE_SIZE,
+        model_fn=partial(load_serving_model, version.checkpoint_path)
+    )
+
+
+async def warm_up_executor(executor: InferenceExecutor):
+    await warm_up(executor, list(Config.WARMUP_BATCH_SIZES), Config.WARMUP_ITERATIONS, cascade=Config.CASCADE_ENABLED)
+
+
+# Версии моделей и их пулы инференса (первая версия загружается в lifespan приложения,
+# следующие — в фоне по запросу POST /models/activate)
+MODEL_REGISTRY = ModelRegistry(
+    models_dir=default_models_dir(),
+    executor_factory=create_executor,
+    warmup_fn=warm_up_executor if Config.WARMUP_ITERATIONS > 0 else None,
+    pinned_version=Config.MODEL_VERSION or None,
+    drain_timeout_s=Config.MODEL_DRAIN_TIMEOUT_S
+)
+
+
+class ImageOutput(NamedTuple):
+    """Выход модели для одного изображения батча"""
+    probabilities: np.ndarray  # в порядке CLASS_NAMES
+    embedding: np.ndarray | None  # None — движок не отдаёт признаки бэкбона
+    shadow_probabilities: dict[str, np.ndarray]  # по именам теневых голов
+    model_version: ModelVersion  # версия, которая посчитала батч
+
+
+class ModelInput(NamedTuple):
+    """Элемент микро-батча: вход модели и нужен ли ему только полный проход (эмбеддинги каскад не проходят)"""
+    image: np.ndarray
+    full_resolution: bool = False
+
+
+async def predict_batch(items: list[ModelInput]) -> tuple[list[ImageOutput], dict[str, float]]:
+    """Батч микро-батчера через пул инференса: выходы модели по изображениям и время препроцессинга и прямого прохода"""
+    images = [item.image for item in items]
+    # Без каскада отметки не нужны: не передаём их в процессы пула
+    full_resolution = [item.full_resolution for item in items] if Config.CASCADE_ENABLED else None
+    try:
+        prediction, version = await MODEL_REGISTRY.predict(images, full_resolution)
+    except Exception as e:
+        INFERENCE_ERRORS.labels(type(e).__name__).inc()
+        raise
+    observe_batch(len(images), prediction.preprocess_s, prediction.forward_s)
+    if prediction.early_exit is not None:
+        early_exits = int(prediction.early_exit.sum())
+        CASCADE_IMAGES.labels("low_res").inc(early_exits)
+        CASCADE_IMAGES.labels("full").inc(len(images) - early_exits)
+    embeddings = prediction.embeddings if prediction.embeddings is not None else [None] * len(images)
+    outputs = [
+        ImageOutput(
+            row, embedding, {name: matrix[index] for name, matrix in prediction.shadow_probabilities.items()}, version
+        )
+        for index, (row, embedding) in enumerate(zip(prediction.probabilities, embeddings))
+    ]
+    return outputs, {"preprocess": prediction.preprocess_s, "inference": prediction.forward_s}
+
+
+# Общий планировщик батчей для всех запросов (запускается в lifespan приложения)
+BATCHER = MicroBatcher(
+    batch_fn=predict_batch,
+    max_batch_size=Config.MAX_BATCH_SIZE,
+    max_wait_ms=Config.MAX_WAIT_MS,
+    max_concurrent_batches=Config.INFERENCE_SLOTS
+)
+
+# Контроль нагрузки: лимиты изображений и байт в обработке и очереди микро-батчера
+ADMISSION = AdmissionController(
+    max_in_flight_images=Config.ADMISSION_MAX_IN_FLIGHT_IMAGES,
+    max_in_flight_bytes=Config.ADMISSION_MAX_IN_FLIGHT_BYTES,
+    max_queued_images=Config.ADMISSION_MAX_QUEUED_IMAGES,
+    queue_depth_fn=lambda: BATCHER.queue_depth,
+    max_retry_after_s=Config.ADMISSION_MAX_RETRY_AFTER_S
+)
+
+
+# Кеш результатов по содержимому файла (None — кеш выключен)
+RESULT_CACHE = ResultCache(
+    max_entries=Config.RESULT_CACHE_MAX_ENTRIES,
+    max_bytes=Config.RESULT_CACHE_MAX_BYTES,
+    ttl_s=Config.RESULT_CACHE_TTL_S,
+    sqlite_path=Path(Config.RESULT_CACHE_SQLITE_PATH) if Config.RESULT_CACHE_SQLITE_PATH else None
+) if Config.RESULT_CACHE_ENABLED else None
+
+# Индекс перцептивных хешей для перекодированных/уменьшенных копий тех же фото (None — выключен)
+NEAR_DUPLICATE_INDEX = NearDuplicateIndex(
+    max_distance=Config.NEAR_DUPLICATE_MAX_DISTANCE,
+    max_entries=Config.NEAR_DUPLICATE_MAX_ENTRIES
+) if Config.NEAR_DUPLICATE_ENABLED else None
+
+# Индекс эмбеддингов для поиска похожих интерьеров (None — выключен; открывается в lifespan приложения)
+EMBEDDING_INDEX = VectorIndex(
+    path=Path(Config.EMBEDDING_INDEX_DIR),
+    dtype=Config.EMBEDDING_INDEX_DTYPE,
+    nlist=Config.EMBEDDING_INDEX_NLIST,
+    nprobe=Config.EMBEDDING_INDEX_NPROBE
+) if Config.EMBEDDING_INDEX_ENABLED else None
+
+# Поля ClassificationResult, которые не зависят от имени файла и попадают в кеш
+# (версия модели входит в ключ кеша, поэтому в значении не хранится)
+CACHED_RESULT_FIELDS = {"predicted_class", "top_confidence", "class_confidences"}
+
+
+# Пул потоков для параллельного декодирования изображений (запускается в lifespan приложения)
+DECODE_POOL = DecodePool(workers=Config.DECODE_WORKERS, max_queue_size=Config.DECODE_QUEUE_SIZE)
+
+
+def get_decode_pool() -> DecodePool:
+    return DECODE_POOL
+
+
+def get_executor() -> InferenceExecutor | None:
+    # Пул активной версии модели; None — модель ещё не загружена
+    return MODEL_REGISTRY.executor
+
+
+def get_model_registry() -> ModelRegistry:
+    return MODEL_REGISTRY
+
+
+def get_batcher() -> MicroBatcher:
+    return BATCHER
+
+
+def get_admission() -> AdmissionController:
+    return ADMISSION
+
+
+def get_embedding_index() -> VectorIndex:
+    if EMBEDDING_INDEX is None:
+        raise HTTPException(status_code=400, detail="Embedding index is disabled (EMBEDDING_INDEX_ENABLED=false)")
+    return EMBEDDING_INDEX
+
+
+def upload_size(image_file: UploadFile) -> int:
+    # Если размер не передан парсером multipart, берём его у файла в спуле
+    return image_file.size if image_file.size is not None else source_size(image_file.file)
+
+
+def admit_request(
+    images: list[UploadFile],
+    endpoint: str,
+    admission: AdmissionController,
+    window: int | None = None
+) -> AdmissionTicket:
+    """
+    Проверка лимитов до декодирования и инференса: 413 — слишком много изображений
+    в запросе, 429 с Retry-After — сервис перегружен. Тело запроса к этому моменту уже
+    принято в спул UploadFile (его ограничивает RequestSizeLimitMiddleware), поэтому
+    проверка ограничивает память на декодирование и модель, а не на приём файлов.
+    Если запрос обрабатывается окном
+    (window файлов одновременно), занимаются ресурсы только под окно — самые крупные файлы.
+    """
+    if Config.MAX_IMAGES_PER_REQUEST and len(images) > Config.MAX_IMAGES_PER_REQUEST:
+        REJECTED_REQUESTS.labels(endpoint, "too_many_images").inc()
+        raise HTTPException(
+            status_code=413,
+            detail=f"Too many images in one request: {len(images)} > {Config.MAX_IMAGES_PER_REQUEST}"
+        )
+    sizes = sorted((upload_size(image_file) for image_file in images), reverse=True)[:window]
+    try:
+        return admission.try_acquire(len(sizes), sum(sizes))
+    except AdmissionRejected as e:
+        REJECTED_REQUESTS.labels(endpoint, e.reason).inc()
+        raise HTTPException(status_code=429, detail=e.detail, headers={"Retry-After": str(e.retry_after_s)})
+
+
+def summarize_batch_timings(results: list[BatchedResult]) -> dict[str, float]:
+    """
+    Время запроса внутри батчера: queue_wait — самое долгое ожидание его изображения в очереди,
+    этапы (preprocess, inference) — сумма по батчам, в которые попали изображения запроса
+    """
+    stages = {"queue_wait": max(result.queue_wait_s for result in results)}
+    batches = {result.batch_id: result.batch_stages_s for result in results}
+    for batch_stages in batches.values():
+        for stage, seconds in batch_stages.items():
+            stages[stage] = stages.get(stage, 0.0) + seconds
+    return stages
+
+
+async def predict_micro_batched(
+        images: list[np.ndarray],
+        batcher: MicroBatcher,
+        full_resolution: bool = False
+    ) -> tuple[list[ImageOutput], dict[str, float]]:
+    """
+    Выходы модели для изображений, распределённых батчером по общим батчам, в порядке images.
+    full_resolution — изображения не проходят каскад (CASCADE_ENABLED) и считаются сразу в 448x448
+    """
+    results = await batcher.submit_many([ModelInput(image, full_resolution) for image in images])
+    return [result.output for result in results], summarize_batch_timings(results)
+
+
+def observe_shadow_agreement(probabilities: np.ndarray, outputs: list[ImageOutput]):
+    """Совпадение предсказанного класса теневых голов с основной — в interior_shadow_predictions_total"""
+    predicted = probabilities.argmax(axis=1)
+    for name in outputs[0].shadow_probabilities:
+        shadow_predicted = np.array([output.shadow_probabilities[name].argmax() for output in outputs])
+        agreed = int((shadow_predicted == predicted).sum())
+        SHADOW_PREDICTIONS.labels(name, "agree").inc(agreed)
+        SHADOW_PREDICTIONS.labels(name, "disagree").inc(len(outputs) - agreed)
+
+
+@dataclass
+class PreparedImage:
+    """Изображение запроса после чтения, поиска в кешах и декодирования"""
+    image_name: str
+    image: np.ndarray | None = None  # вход модели, если нужен инференс
+    result: ClassificationResult | None = None  # готовый результат: кеш, почти-дубликат или ошибка
+    source: str = "model"  # cache / near_duplicate / model / error
+    cache_key: str | None = None
+    model_key: str | None = None  # версия модели, под которой искали в кешах
+    image_hash: int | None = None
+    probabilities: np.ndarray | None = None  # строка вероятностей модели в порядке CLASS_NAMES
+    embedding: np.ndarray | None = None  # признаки бэкбона, если движок их отдаёт
+    shadow_probabilities: dict[str, np.ndarray] | None = None  # вероятности теневых голов
+    embedding_id: str | None = None  # id вектора в индексе /similar
+
+
+async def prepare_upload(
+    image_data: ImageSource,
+    image_name: str,
+    decode_pool: DecodePool,
+    use_near_duplicates: bool,
+    use_cache: bool = True
+) -> PreparedImage:
+    """
+    Поиск в кешах и декодирование одного файла. Файловый объект читается в пуле декодирования
+    по частям (хеш) и напрямую декодером; слишком большой файл сразу становится ошибкой.
+    use_cache=False — изображение всегда идёт в модель (например, когда нужен его эмбеддинг).
+    """
+    prepared = PreparedImage(image_name=image_name)
+    # Кеши ищутся по активной версии; результат из кеша выдан именно ею
+    version = MODEL_REGISTRY.version
+    prepared.model_key = version.key
+    try:
+        size = source_size(image_data)
+        if Config.MAX_FILE_BYTES and size > Config.MAX_FILE_BYTES:
+            raise FileTooLargeError(f"File is too large: {size} bytes (limit {Config.MAX_FILE_BYTES})")
+        if RESULT_CACHE is not None and use_cache:
+            prepared.cache_key = await decode_pool.run(make_cache_key, image_data, prepared.model_key)
+            cached = RESULT_CACHE.get_memory(prepared.cache_key)
+            if cached is None and RESULT_CACHE.has_disk_tier:
+                # SQLite-уровень читается вне event loop
+                cached = await decode_pool.run(RESULT_CACHE.get_disk, prepared.cache_key)
+            if cached is not None:
+                # Попадание в кеш: файл не декодируется и не идёт в модель
+                prepared.result = ClassificationResult(**cached, image_name=image_name, model_version=version.version)
+                prepared.source = "cache"
+                return prepared
+        if use_near_duplicates:
+            prepared.image_hash = await decode_pool.run(compute_dhash, image_data)
+            cached = NEAR_DUPLICATE_INDEX.find(prepared.image_hash, prepared.model_key)
+            if cached is not None:
+                prepared.result = ClassificationResult(**cached, image_name=image_name, model_version=version.version)
+                prepared.source = "near_duplicate"
+                if prepared.cache_key is not None:
+                    RESULT_CACHE.put(prepared.cache_key, cached)
+                return prepared
+        prepared.image = await decode_pool.run(prepare_image, image_data)
+    except Exception as e:
+        DECODE_ERRORS.labels(type(e).__name__).inc()
+        prepared.result = build_error_result(image_name, e)
+        prepared.source = "error"
+        logger.error(f"Error processing image {image_name}: {str(e)}")
+    return prepared
+
+
+async def classify_prepared(
+    prepared: list[PreparedImage],
+    batcher: MicroBatcher,
+    full_resolution: bool = False
+) -> dict[str, float]:
+    """
+    Прогоняет через модель изображения без готового результата и сохраняет результаты в кеши.
+    full_resolution=True — без каскада, когда нужны эмбеддинги в полном разрешении.
+    Возвращает время этапов внутри батчера (см. summarize_batch_timings), в секундах.
+    """
+    pending = [item for item in prepared if item.result is None]
+    if not pending:
+        return {}
+    outputs, stages_s = await predict_micro_batched([item.image for item in pending], batcher, full_resolution)
+    probabilities = np.stack([output.probabilities for output in outputs])
+    observe_shadow_agreement(probabilities, outputs)
+    batch_results = POSTPROCESSOR.build_results(probabilities, [item.image_name for item in pending])
+    for item, result, output in zip(pending, batch_results, outputs):
+        item.result = result
+        item.probabilities = output.probabilities
+        item.embedding = output.embedding
+        item.shadow_probabilities = output.shadow_probabilities
+        item.image = None
+        result.model_version = output.model_version.version
+        cached = result.model_dump(include=CACHED_RESULT_FIELDS)
+        # Если версия сменилась после поиска в кеше, ключ кеша относится к прежней версии
+        if item.cache_key is not None and item.model_key == output.model_version.key:
+            RESULT_CACHE.put(item.cache_key, cached)
+        if item.image_hash is not None:
+            NEAR_DUPLICATE_INDEX.add(item.image_hash, output.model_version.key, cached)
+    return stages_s
+
+
+def embedded_items(prepared: list[PreparedImage]) -> list[PreparedImage]:
+    """Изображения, прошедшие через модель; 501, если движок инференса не отдаёт признаки бэкбона"""
+    items = [item for item in prepared if item.source == "model"]
+    if any(item.embedding is None for item in items):
+        raise HTTPException(
+            status_code=501,
+            detail=(
+                f"Inference engine '{Config.INFERENCE_ENGINE}' does not expose backbone features "
+                f"(use eager; int8 only without a static ckpt*.int8.pt export)"
+            )
+        )
+    return items
+
+
+def check_embedding_ids(ids: list[str] | None, images: list[UploadFile]):
+    """400, если переданные id векторов не соответствуют файлам запроса один к одному"""
+    if ids is None:
+        return
+    if len(ids) != len(images):
+        raise HTTPException(status_code=400, detail=f"Expected {len(images)} ids (one per image), got {len(ids)}")
+    if any(not vector_id for vector_id in ids):
+        raise HTTPException(status_code=400, detail="Ids must be non-empty")
+
+
+async def index_embeddings(
+    prepared: list[PreparedImage],
+    images: list[UploadFile],
+    ids: list[str] | None,
+    index: VectorIndex,
+    decode_pool: DecodePool
+) -> int:
+    """
+    Записывает эмбеддинги изображений в индекс; возвращает их число. id вектора — переданный
+    клиентом или хеш содержимого файла: имена файлов с камер (IMG_0001.jpg) повторяются
+    у разных объявлений и перезаписывали бы чужие векторы. id записывается в item.embedding_id
+    только у сохранённых изображений: у ошибок декодирования и инференса его нет.
+    """
+    items = embedded_items(prepared)
+    if not items:
+        return 0
+    # items — элементы prepared, прошедшие через модель, в том же порядке
+    if ids is not None:
+        vector_ids = [vector_id for item, vector_id in zip(prepared, ids) if item.source == "model"]
+    else:
+        files = [image_file.file for item, image_file in zip(prepared, images) if item.source == "model"]
+        vector_ids = list(await asyncio.gather(*(decode_pool.run(content_digest, file) for file in files)))
+    # Запись в memmap-файлы (и обучение IVF) — вне event loop
+    await asyncio.to_thread(index.add, vector_ids, np.stack([item.embedding for item in items]))
+    for item, vector_id in zip(items, vector_ids):
+        item.embedding_id = vector_id
+    return len(items)
+
+
+def format_model_versions(model_versions: set[str]) -> str | None:
+    """
+    meta.model_version: версия, выдавшая результаты запроса; если запрос пришёлся на переключение
+    версий — все версии через запятую. Без результатов модели — активная версия.
+    """
+    if model_versions:
+        return ",".join(sorted(model_versions, key=version_sort_key))
+    return MODEL_REGISTRY.version.version if MODEL_REGISTRY.version is not None else None
+
+
+def build_meta_fields(
+    sources: Counter,
+    total_processing_time_ms: int,
+    use_near_duplicates: bool,
+    model_versions: set[str]
+) -> dict:
+    """Поля MetaInfo по числу результатов каждого источника (cache / near_duplicate / model / error)"""
+    total_images = sum(sources.values())
+    return dict(
+        total_images=total_images,
+        total_processing_time_ms=total_processing_time_ms,
+        model_version=format_model_versions(model_versions),
+        backbone_name=MODEL_REGISTRY.version.backbone_name if MODEL_REGISTRY.version is not None else None,
+        cache_hits=sources["cache"] if RESULT_CACHE is not None else None,
+        cache_misses=total_images - sources["cache"] if RESULT_CACHE is not None else None,
+        near_duplicate_hits=sources["near_duplicate"] if use_near_duplicates else None
+    )
+
+
+def build_stage_timings(timer: StageTimer) -> StageTimings:
+    """meta.timings по этапам запроса; этапы, которых не было (например, все из кеша), — нули"""
+    stages_ms = timer.as_ms()
+    return StageTimings.model_construct(**{
+        f"{stage}_ms": stages_ms.get(stage, 0.0)
+        for stage in ("decode", "queue_wait", "preprocess", "inference", "postprocess")
+    })
+
+
+def format_server_timing(timer: StageTimer, total_s: float) -> str:
+    """Заголовок Server-Timing с теми же этапами, что и meta.timings, плюс serialize и total"""
+    metrics = [f"{stage};dur={ms}" for stage, ms in timer.as_ms().items()]
+    metrics.append(f"total;dur={round(total_s * 1000, 2)}")
+    return ", ".join(metrics)
+
+
+def _probability_matrix(items: list[PreparedImage]) -> np.ndarray:
+    """Вероятности успешно обработанных изображений; для результатов из кешей — из class_confidences"""
+    return np.array([
+        item.probabilities if item.probabilities is not None
+        else [item.result.class_confidences[name] for name in CLASS_NAMES]
+        for item in items
+    ], dtype=np.float64).reshape(len(items), len(CLASS_NAMES))
+
+
+def build_compact_results(prepared: list[PreparedImage], top_k: int | None) -> list[CompactClassificationResult]:
+    ok_items = [item for item in prepared if item.source != "error"]
+    compact = iter(POSTPROCESSOR.build_compact_results(
+        _probability_matrix(ok_items), [item.image_name for item in ok_items], top_k
+    ))
+    return [
+        CompactClassificationResult.model_construct(
+            image_name=item.image_name,
+            predicted_class=None,
+            top_confidence=None,
+            error=item.result.error
+        ) if item.source == "error" else next(compact)
+        for item in prepared
+    ]
+
+
+def build_full_results(prepared: list[PreparedImage], top_k: int | None) -> list[ClassificationResult]:
+    if top_k is None:
+        return [item.result for item in prepared]
+    ok_items = [item for item in prepared if item.source != "error"]
+    truncated = iter(POSTPROCESSOR.build_results(
+        _probability_matrix(ok_items), [item.image_name for item in ok_items], top_k
+    ))
+    return [item.result if item.source == "error" else next(truncated) for item in prepared]
+
+
+def attach_shadow_predictions(prepared: list[PreparedImage], results: list[ClassificationResult], top_k: int | None):
+    """shadow_predictions результатов: вероятности каждой теневой головы в том же виде, что и основной"""
+    shadow_items = [(index, item) for index, item in enumerate(prepared) if item.shadow_probabilities]
+    if not shadow_items:
+        return
+    for name in shadow_items[0][1].shadow_probabilities:
+        shadow_results = POSTPROCESSOR.build_results(
+            np.stack([item.shadow_probabilities[name] for _, item in shadow_items]),
+            [item.image_name for _, item in shadow_items],
+            top_k
+        )
+        for (index, _), shadow_result in zip(shadow_items, shadow_results):
+            if results[index].shadow_predictions is None:
+                results[index].shadow_predictions = {}
+            results[index].shadow_predictions[name] = ShadowPrediction.model_construct(
+                **shadow_result.model_dump(include=CACHED_RESULT_FIELDS)
             )
-    return results
 
 
-@router.post("/classify_batch", response_model=ClassificationResponse)
+@router.post(
+    "/classify_batch",
+    response_model=ClassificationResponse | CompactClassificationResponse,
+    response_class=FastJSONResponse,
+    dependencies=[Depends(require_ready)]
+)
 async def classify_batch(
     images: list[UploadFile] = File(...),
-    model: InteriorClassifier = Depends(get_model)
+    near_duplicates: bool = Query(True, description="Reuse results of visually near-identical images"),
+    response_format: Literal["full", "compact"] = Query(
+        "full", description="full — default schema; compact — class names once in meta, probabilities as arrays"
+    ),
+    top_k: int | None = Query(None, ge=1, description="Return only the k most probable classes per image"),
+    timings: bool | None = Query(
+        None, description="Add per-stage timings to meta and the Server-Timing header (default: RESPONSE_TIMINGS)"
+    ),
+    shadow: bool = Query(
+        False, description="Add predictions of the shadow heads (SHADOW_HEADS) to each result (full format, bypasses caches)"
+    ),
+    store_embeddings: bool = Query(
+        False,
+        description="Store backbone embeddings in the similarity index (bypasses caches); ids are returned per result"
+    ),
+    ids: list[str] | None = Form(
+        None, description="Index ids for store_embeddings, one per image in upload order (default: content digest)"
+    ),
+    batcher: MicroBatcher = Depends(get_batcher),
+    decode_pool: DecodePool = Depends(get_decode_pool),
+    admission: AdmissionController = Depends(get_admission)
 ):
-    start_time = datetime.now()
-    image_objs = []
-    image_names = []
-    error_results = []
-    for image_file in images:
+    start_time = time.perf_counter()
+    timer = StageTimer()
+    include_timings = Config.RESPONSE_TIMINGS if timings is None else timings
+    if shadow and not Config.SHADOW_HEADS:
+        raise HTTPException(status_code=400, detail="No shadow heads are configured (SHADOW_HEADS)")
+    if shadow and response_format != "full":
+        raise HTTPException(status_code=400, detail="Shadow predictions are only returned in the full response format")
+    embedding_index = get_embedding_index() if store_embeddings else None
+    check_embedding_ids(ids, images)
+    # Эмбеддинг и теневые головы есть только у изображений, прошедших через модель, поэтому кеши тогда не используются
+    use_cache = not (store_embeddings or shadow)
+    use_near_duplicates = NEAR_DUPLICATE_INDEX is not None and near_duplicates and use_cache
+
+    ticket = admit_request(images, "classify_batch", admission)
+    with ticket, IN_FLIGHT_REQUESTS.labels("classify_batch").track_inprogress():
+        # Поиск в кешах и декодирование всех изображений запроса идут параллельно в пуле декодирования;
+        # файлы читаются прямо из спула UploadFile, без копии всего файла в bytes
+        with timer.measure("decode"):
+            prepared = list(await asyncio.gather(*(
+                prepare_upload(
+                    image_file.file, image_file.filename, decode_pool, use_near_duplicates,
+                    use_cache=use_cache
+                )
+                for image_file in images
+            )))
+
         try:
-            image_data = await image_file.read()
-            image = Image.open(io.BytesIO(image_data)).convert('RGB')
-            image_objs.append(image)
-            image_names.append(image_file.filename)
+            # Эмбеддинги для индекса считаются только в полном разрешении, как у /embed
+            batch_stages_s = await classify_prepared(prepared, batcher, full_resolution=store_embeddings)
         except Exception as e:
-            err_msg = str(e)
-            if "cannot identify image file" in err_msg:
-                user_msg = (
-                    "File is not a supported image format. "
-                    "Supported formats: jpg, jpeg, png, bmp, gif, tiff, webp, ico."
+            logger.error(f"Error during batch model inference: {str(e)}")
+            raise HTTPException(status_code=500, detail=f"Model inference error: {str(e)}")
+        # Этапы внутри батчера: ожидание в очереди, препроцессинг и прямой проход батчей с изображениями запроса
+        for stage in ("queue_wait", "preprocess", "inference"):
+            timer.add(stage, batch_stages_s.get(stage, 0.0))
+
+        stored = None
+        if embedding_index is not None:
+            with timer.measure("store_embeddings"):
+                stored = await index_embeddings(prepared, images, ids, embedding_index, decode_pool)
+
+        with timer.measure("postprocess"):
+            sources = Counter(item.source for item in prepared)
+            total_processing_time_ms = int((time.perf_counter() - start_time) * 1000)
+            model_versions = {item.result.model_version for item in prepared if item.result.model_version}
+            meta = build_meta_fields(sources, total_processing_time_ms, use_near_duplicates, model_versions)
+            meta["stored_embeddings"] = stored
+            # Результаты в порядке загрузки файлов; модели собираются без повторной валидации
+            if response_format == "compact":
+                response = CompactClassificationResponse.model_construct(
+                    results=build_compact_results(prepared, top_k),
+                    meta=CompactMetaInfo.model_construct(**meta, class_names=list(CLASS_NAMES))
                 )
             else:
-                user_msg = err_msg
-            error_results.append(
-                ClassificationResult(
-                    predicted_class=None,
-                    top_confidence=None,
-                    class_confidences={},
-                    image_name=image_file.filename,
-                    error=user_msg
+                results = build_full_results(prepared, top_k)
+                # Версия каждого результата нужна, только если запрос пришёлся на переключение версий
+                for result, item in zip(results, prepared):
+                    result.model_version = item.result.model_version if len(model_versions) > 1 else None
+                if shadow:
+                    attach_shadow_predictions(prepared, results, top_k)
+                response = ClassificationResponse.model_construct(
+                    results=results,
+                    meta=MetaInfo.model_construct(**meta)
                 )
-            )
-            logger.error(f"Error processing image {image_file.filename}: {err_msg}")
-    
-    batch_results = []
-    if image_objs:
+            if stored is not None:
+                for result, item in zip(response.results, prepared):
+                    result.embedding_id = item.embedding_id
+
+        if include_timings:
+            response.meta.timings = build_stage_timings(timer)
+
+        with timer.measure("serialize"):
+            content = response.model_dump(exclude_none=response_format == "compact")
+            json_response = FastJSONResponse(content=content)
+
+    total_s = time.perf_counter() - start_time
+    if include_timings:
+        json_response.headers["Server-Timing"] = format_server_timing(timer, total_s)
+    observe_stages("classify_batch", timer.stages)
+    REQUEST_SECONDS.labels("classify_batch").observe(total_s)
+    for source, count in sources.items():
+        IMAGES.labels("classify_batch", source).inc(count)
+    logger.info(f"Request processed in {total_processing_time_ms} ms ({timer.format()})")
+    logger.info(f"Processed {len(images)} images")
+    return json_response
+
+
+async def classify_upload(
+    image_file: UploadFile,
+    batcher: MicroBatcher,
+    decode_pool: DecodePool,
+    use_near_duplicates: bool
+) -> PreparedImage:
+    """Полная обработка одного файла: декодирование прямо из спула UploadFile и инференс"""
+    prepared = await prepare_upload(image_file.file, image_file.filename, decode_pool, use_near_duplicates)
+    if prepared.result is None:
         try:
-            batch_results = classify_images_batch(image_objs, image_names, model)
+            # Изображения из разных окон и запросов объединяются в общие батчи микро-батчером
+            await classify_prepared([prepared], batcher)
         except Exception as e:
-            logger.error(f"Error during batch model inference: {str(e)}")
-            raise HTTPException(status_code=500, detail=f"Model inference error: {str(e)}")
-    
-    results = batch_results + error_results
-    total_processing_time_ms = int((datetime.now() - start_time).total_seconds() * 1000)
-    response = ClassificationResponse(
-        results=results,
-        meta=MetaInfo(
-            total_images=len(images),
-            total_processing_time_ms=total_processing_time_ms,
-            model_version=MODEL_VERSION,
-            backbone_name=BACKBONE_NAME
-        )
+            # Ответ уже отправляется — ошибка модели становится ошибкой этого изображения
+            logger.error(f"Error during model inference for {prepared.image_name}: {str(e)}")
+            prepared.result = build_error_result(prepared.image_name, e)
+            prepared.source = "error"
+            prepared.image = None
+    return prepared
+
+
+async def stream_classification(
+    images: list[UploadFile],
+    batcher: MicroBatcher,
+    decode_pool: DecodePool,
+    use_near_duplicates: bool,
+    ticket: AdmissionTicket
+) -> AsyncIterator[bytes]:
+    """
+    NDJSON-строки результатов в порядке готовности: одновременно обрабатывается не больше
+    STREAM_WINDOW_SIZE файлов, каждый результат (включая ошибки) отправляется сразу.
+    Последняя строка — {"meta": MetaInfo}. Ресурсы ticket освобождаются, когда обработка закончена.
+    """
+    start_time = time.perf_counter()
+    sources = Counter()
+    model_versions = set()
+    next_index = 0
+    pending: dict[asyncio.Task, int] = {}
+
+    def schedule():
+        nonlocal next_index
+        while next_index < len(images) and len(pending) < Config.STREAM_WINDOW_SIZE:
+            task = asyncio.create_task(
+                classify_upload(images[next_index], batcher, decode_pool, use_near_duplicates)
+            )
+            pending[task] = next_index
+            next_index += 1
+
+    in_flight = IN_FLIGHT_REQUESTS.labels("classify_stream")
+    in_flight.inc()
+    try:
+        schedule()
+        while pending:
+            done, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                index = pending.pop(task)
+                prepared = task.result()
+                sources[prepared.source] += 1
+                if prepared.result.model_version:
+                    model_versions.add(prepared.result.model_version)
+                IMAGES.labels("classify_stream", prepared.source).inc()
+                # index — позиция файла в запросе: результаты приходят не в порядке загрузки
+                # Версии результатов перечисляются в meta.model_version последней строки
+                yield dumps_json({"index": index, **prepared.result.model_dump(exclude={"model_version"})}) + b"\n"
+            schedule()
+    finally:
+        # Клиент отключился — не тратим модель на оставшиеся изображения
+        for task in pending:
+            task.cancel()
+        in_flight.dec()
+        ticket.release()
+
+    total_processing_time_ms = int((time.perf_counter() - start_time) * 1000)
+    REQUEST_SECONDS.labels("classify_stream").observe(total_processing_time_ms / 1000)
+    meta = MetaInfo.model_construct(
+        **build_meta_fields(sources, total_processing_time_ms, use_near_duplicates, model_versions)
     )
-    logger.info(f"Request processed in {total_processing_time_ms} ms")
-    logger.info(f"Processed {len(images)} images")
-    return response
+    logger.info(f"Streamed {len(images)} images in {total_processing_time_ms} ms")
+    yield dumps_json({"meta": meta.model_dump()}) + b"\n"
+
+
+@router.post("/classify_stream", dependencies=[Depends(require_ready)])
+async def classify_stream(
+    images: list[UploadFile] = File(...),
+    near_duplicates: bool = Query(True, description="Reuse results of visually near-identical images"),
+    batcher: MicroBatcher = Depends(get_batcher),
+    decode_pool: DecodePool = Depends(get_decode_pool),
+    admission: AdmissionController = Depends(get_admission)
+):
+    use_near_duplicates = NEAR_DUPLICATE_INDEX is not None and near_duplicates
+    ticket = admit_request(images, "classify_stream", admission, window=Config.STREAM_WINDOW_SIZE)
+    return StreamingResponse(
+        stream_classification(images, batcher, decode_pool, use_near_duplicates, ticket),
+        media_type="application/x-ndjson",
+        # Если поток так и не начался (клиент отключился сразу), ресурсы освободит фоновая задача
+        background=BackgroundTask(ticket.release)
+    )
+
+
+@router.get("/batcher/stats")
+async def batcher_stats(batcher: MicroBatcher = Depends(get_batcher)):
+    return batcher.stats()
+
+
+@router.get("/executor/stats")
+async def executor_stats(executor: InferenceExecutor | None = Depends(get_executor)):
+    if executor is None:
+        return {"running": False}
+    return executor.stats()
+
+
+@router.get("/cache/stats")
+async def cache_stats():
+    if RESULT_CACHE is None:
+        return {"enabled": False}
+    return {"enabled": True, **RESULT_CACHE.stats()}
+
+
+@router.get("/near_duplicates/stats")
+async def near_duplicates_stats():
+    if NEAR_DUPLICATE_INDEX is None:
+        return {"enabled": False}
+    return {"enabled": True, **NEAR_DUPLICATE_INDEX.stats()}
+
+
+@router.get("/admission/stats")
+async def admission_stats(admission: AdmissionController = Depends(get_admission)):
+    return admission.stats()
+
+
+@router.get("/decode_pool/stats")
+async def decode_pool_stats(decode_pool: DecodePool = Depends(get_decode_pool)):
+    return decode_pool.stats()
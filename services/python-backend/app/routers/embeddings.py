@@ -0,0 +1,185 @@
+import asyncio
+import logging
+import time
+from collections import Counter
+
+from fastapi import APIRouter, Depends, File, Form, HTTPException, Query, UploadFile
+
+from pydantic_models import (
+    EmbeddingMetaInfo,
+    EmbeddingResponse,
+    EmbeddingResult,
+    SimilarItem,
+    SimilarMetaInfo,
+    SimilarResponse
+)
+from routers.classify import (
+    EMBEDDING_INDEX,
+    MODEL_REGISTRY,
+    FastJSONResponse,
+    PreparedImage,
+    admit_request,
+    check_embedding_ids,
+    classify_prepared,
+    embedded_items,
+    format_model_versions,
+    get_admission,
+    get_batcher,
+    get_decode_pool,
+    get_embedding_index,
+    index_embeddings,
+    prepare_upload
+)
+from routers.health import require_ready
+from services.admission import AdmissionController
+from services.batcher import MicroBatcher
+from services.decoding import DecodePool
+from services.metrics import IMAGES, IN_FLIGHT_REQUESTS, REQUEST_SECONDS
+from services.timing import StageTimer
+from services.vector_index import VectorIndex
+
+
+logger = logging.getLogger(f"uvicorn.{__file__}")
+router = APIRouter()
+
+
+async def embed_uploads(
+    images: list[UploadFile],
+    batcher: MicroBatcher,
+    decode_pool: DecodePool
+) -> list[PreparedImage]:
+    """
+    Эмбеддинги загруженных файлов: тот же путь, что у /classify_batch (пул декодирования,
+    микро-батчер), но без кешей результатов — признаки есть только после прохода через модель.
+    Каскад не применяется: признаки в уменьшенном разрешении несравнимы с остальными в индексе
+    """
+    prepared = list(await asyncio.gather(*(
+        prepare_upload(image_file.file, image_file.filename, decode_pool, False, use_cache=False)
+        for image_file in images
+    )))
+    try:
+        await classify_prepared(prepared, batcher, full_resolution=True)
+    except Exception as e:
+        logger.error(f"Error during embedding inference: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Model inference error: {str(e)}")
+    return prepared
+
+
+@router.post(
+    "/embed",
+    response_model=EmbeddingResponse,
+    response_class=FastJSONResponse,
+    dependencies=[Depends(require_ready)]
+)
+async def embed(
+    images: list[UploadFile] = File(...),
+    store: bool = Query(False, description="Also store the embeddings in the similarity index; ids are returned per result"),
+    ids: list[str] | None = Form(
+        None, description="Index ids for store=true, one per image in upload order (default: content digest)"
+    ),
+    batcher: MicroBatcher = Depends(get_batcher),
+    decode_pool: DecodePool = Depends(get_decode_pool),
+    admission: AdmissionController = Depends(get_admission)
+):
+    start_time = time.perf_counter()
+    index = get_embedding_index() if store else None
+    check_embedding_ids(ids, images)
+
+    ticket = admit_request(images, "embed", admission)
+    with ticket, IN_FLIGHT_REQUESTS.labels("embed").track_inprogress():
+        prepared = await embed_uploads(images, batcher, decode_pool)
+        items = embedded_items(prepared)
+        stored = await index_embeddings(prepared, images, ids, index, decode_pool) if index is not None else None
+
+    results = [
+        EmbeddingResult.model_construct(
+            image_name=item.image_name,
+            embedding=item.embedding.tolist() if item.embedding is not None else None,
+            error=item.result.error,
+            id=item.embedding_id
+        )
+        for item in prepared
+    ]
+    total_s = time.perf_counter() - start_time
+    meta = EmbeddingMetaInfo.model_construct(
+        total_images=len(prepared),
+        total_processing_time_ms=int(total_s * 1000),
+        model_version=format_model_versions({item.result.model_version for item in items}),
+        backbone_name=MODEL_REGISTRY.version.backbone_name,
+        embedding_dim=len(items[0].embedding) if items else None,
+        stored_embeddings=stored
+    )
+    REQUEST_SECONDS.labels("embed").observe(total_s)
+    for source, count in Counter(item.source for item in prepared).items():
+        IMAGES.labels("embed", source).inc(count)
+    logger.info(f"Embedded {len(items)} of {len(prepared)} images in {meta.total_processing_time_ms} ms")
+    return FastJSONResponse(content=EmbeddingResponse.model_construct(results=results, meta=meta).model_dump())
+
+
+@router.post(
+    "/similar",
+    response_model=SimilarResponse,
+    response_class=FastJSONResponse,
+    dependencies=[Depends(require_ready)]
+)
+async def similar(
+    image: UploadFile | None = File(None, description="Query image (or pass image_id)"),
+    image_id: str | None = Query(None, description="Id of an indexed image to use as the query"),
+    top_k: int = Query(10, ge=1, le=1000, description="Number of neighbours to return"),
+    nprobe: int | None = Query(
+        None, ge=1, description="IVF lists to scan (default: EMBEDDING_INDEX_NPROBE); ignored in flat mode"
+    ),
+    index: VectorIndex = Depends(get_embedding_index),
+    batcher: MicroBatcher = Depends(get_batcher),
+    decode_pool: DecodePool = Depends(get_decode_pool),
+    admission: AdmissionController = Depends(get_admission)
+):
+    start_time = time.perf_counter()
+    timer = StageTimer()
+    if (image is None) == (image_id is None):
+        raise HTTPException(status_code=400, detail="Pass exactly one of image or image_id")
+
+    if image_id is not None:
+        query = await asyncio.to_thread(index.get, image_id)
+        if query is None:
+            raise HTTPException(status_code=404, detail=f"Image id '{image_id}' is not in the index")
+    else:
+        with timer.measure("embed"):
+            ticket = admit_request([image], "similar", admission)
+            with ticket, IN_FLIGHT_REQUESTS.labels("similar").track_inprogress():
+                prepared = await embed_uploads([image], batcher, decode_pool)
+            if prepared[0].source == "error":
+                raise HTTPException(status_code=422, detail=prepared[0].result.error)
+            query = embedded_items(prepared)[0].embedding
+
+    with timer.measure("search"):
+        try:
+            # Полный перебор по memmap — вне event loop; сам запрос не входит в результаты
+            neighbours = await asyncio.to_thread(index.search, query, top_k, nprobe, image_id)
+        except ValueError as e:
+            # Размерность запроса не совпадает с индексом (другая модель)
+            raise HTTPException(status_code=409, detail=str(e))
+
+    total_s = time.perf_counter() - start_time
+    stages_ms = timer.as_ms()
+    REQUEST_SECONDS.labels("similar").observe(total_s)
+    response = SimilarResponse.model_construct(
+        query=image_id if image_id is not None else image.filename,
+        results=[SimilarItem.model_construct(id=vector_id, score=score) for vector_id, score in neighbours],
+        meta=SimilarMetaInfo.model_construct(
+            index_size=index.count,
+            mode="ivf" if index.trained else "flat",
+            nprobe=(nprobe or index.nprobe) if index.trained else None,
+            embed_ms=stages_ms.get("embed"),
+            search_ms=stages_ms["search"],
+            total_processing_time_ms=int(total_s * 1000)
+        )
+    )
+    return FastJSONResponse(content=response.model_dump())
+
+
+@router.get("/similar/stats")
+async def similar_stats():
+    if EMBEDDING_INDEX is None:
+        return {"enabled": False}
+    return {"enabled": True, **EMBEDDING_INDEX.stats()}
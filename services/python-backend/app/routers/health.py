@@ -0,0 +1,35 @@
+from fastapi import APIRouter, HTTPException
+from fastapi.responses import JSONResponse
+
+from services.warmup import Readiness
+
+
+router = APIRouter()
+
+
+# Состояние фонового старта (загрузка модели, пулы, прогрев) — обновляется в lifespan приложения
+READINESS = Readiness()
+
+
+def require_ready():
+    """Зависимость эндпоинтов инференса: до конца прогрева запросы не принимаются"""
+    if not READINESS.ready:
+        raise HTTPException(
+            status_code=503,
+            detail=f"Service is not ready: {READINESS.error or READINESS.stage}",
+            headers={"Retry-After": "5"}
+        )
+
+
+@router.get("/healthz")
+async def healthz():
+    """Liveness: процесс отвечает; ошибка старта — повод для перезапуска"""
+    if READINESS.error is not None:
+        return JSONResponse(status_code=503, content={"status": "failed", "error": READINESS.error})
+    return {"status": "ok"}
+
+
+@router.get("/readyz")
+async def readyz():
+    """Readiness: модель загружена и прогрета, можно направлять трафик"""
+    return JSONResponse(status_code=200 if READINESS.ready else 503, content=READINESS.stats())
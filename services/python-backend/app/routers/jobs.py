@@ -0,0 +1,101 @@
+import asyncio
+import logging
+from datetime import datetime
+from pathlib import Path
+
+from fastapi import APIRouter, Depends, File, HTTPException, Query, UploadFile
+
+from config import Config
+from pydantic_models import ClassificationResult, JobCreated, JobInfo
+from routers.classify import (
+    BATCHER,
+    DECODE_POOL,
+    NEAR_DUPLICATE_INDEX,
+    classify_prepared,
+    prepare_upload
+)
+from routers.health import require_ready
+from services.jobs import JobManager
+from services.metrics import IMAGES, REJECTED_REQUESTS
+
+
+logger = logging.getLogger(f"uvicorn.{__file__}")
+router = APIRouter()
+
+
+async def classify_job_chunk(items: list[tuple[str, bytes]]) -> list[dict]:
+    """Пачка файлов задачи проходит тот же путь, что и /classify_batch: кеши, пул декодирования, микро-батчер"""
+    prepared = list(await asyncio.gather(*(
+        prepare_upload(image_data, image_name, DECODE_POOL, NEAR_DUPLICATE_INDEX is not None)
+        for image_name, image_data in items
+    )))
+    await classify_prepared(prepared, BATCHER)
+    for item in prepared:
+        IMAGES.labels("jobs", item.source).inc()
+    return [item.result.model_dump() for item in prepared]
+
+
+# Фоновая обработка задач (запускается в lifespan приложения после микро-батчера)
+JOB_MANAGER = JobManager(
+    jobs_dir=Path(Config.JOBS_DIR),
+    process_fn=classify_job_chunk,
+    num_workers=Config.JOB_WORKERS,
+    chunk_size=Config.JOB_CHUNK_SIZE,
+    max_file_bytes=Config.MAX_FILE_BYTES,
+    max_spool_bytes=Config.JOB_MAX_SPOOL_BYTES,
+    max_images=Config.JOB_MAX_IMAGES
+)
+
+
+def get_job_manager() -> JobManager:
+    return JOB_MANAGER
+
+
+@router.post("/jobs", response_model=JobCreated, status_code=202, dependencies=[Depends(require_ready)])
+async def create_job(
+    images: list[UploadFile] = File(..., description="Images or .zip / .tar / .tar.gz archives with images"),
+    job_manager: JobManager = Depends(get_job_manager)
+):
+    # Число изображений задачи ограничено JOB_MAX_IMAGES при распаковке; здесь — очередь задач
+    if Config.JOB_MAX_QUEUED_JOBS and job_manager.queued_jobs >= Config.JOB_MAX_QUEUED_JOBS:
+        REJECTED_REQUESTS.labels("jobs", "job_queue_full").inc()
+        raise HTTPException(
+            status_code=429,
+            detail=f"Too many queued jobs: {job_manager.queued_jobs} (limit {Config.JOB_MAX_QUEUED_JOBS})",
+            headers={"Retry-After": str(Config.ADMISSION_MAX_RETRY_AFTER_S)}
+        )
+    try:
+        job_id, total_images = await job_manager.submit([(image.filename, image.file) for image in images])
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"Error creating job: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Job creation error: {str(e)}")
+    return JobCreated(job_id=job_id, status="queued", total_images=total_images)
+
+
+@router.get("/jobs/stats")
+async def jobs_stats(job_manager: JobManager = Depends(get_job_manager)):
+    return await asyncio.to_thread(job_manager.stats)
+
+
+@router.get("/jobs/{job_id}", response_model=JobInfo)
+async def get_job(
+    job_id: str,
+    include_results: bool = Query(True, description="Return results of already processed images"),
+    offset: int = Query(0, ge=0),
+    limit: int | None = Query(None, ge=1),
+    job_manager: JobManager = Depends(get_job_manager)
+):
+    job = await asyncio.to_thread(job_manager.store.get_job, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job {job_id} not found")
+    results = None
+    if include_results:
+        stored = await asyncio.to_thread(
+            job_manager.store.get_results, job_id, offset, -1 if limit is None else limit
+        )
+        results = [ClassificationResult.model_construct(**result) for result in stored]
+    job["created_at"] = datetime.fromtimestamp(job["created_at"])
+    job["updated_at"] = datetime.fromtimestamp(job["updated_at"])
+    return JobInfo(**job, results=results)
@@ -0,0 +1,29 @@
+from fastapi import APIRouter, Response
+
+from routers.classify import ADMISSION, BATCHER, DECODE_POOL, MODEL_REGISTRY
+from routers.jobs import JOB_MANAGER
+from services.metrics import (
+    METRICS_CONTENT_TYPE,
+    register_admission_gauge,
+    register_pool_gauge,
+    register_queue_gauge,
+    render_metrics
+)
+
+
+router = APIRouter()
+
+
+# Значения считываются при каждом опросе /metrics, запросы за них ничего не платят
+register_queue_gauge("batcher", lambda: BATCHER.queue_depth)
+register_queue_gauge("executor", lambda: MODEL_REGISTRY.queue_depth)
+register_queue_gauge("jobs", lambda: JOB_MANAGER.queued_jobs)
+register_pool_gauge("executor", lambda: MODEL_REGISTRY.in_flight)
+register_pool_gauge("decode_pool", lambda: DECODE_POOL.in_flight)
+register_admission_gauge("images", lambda: ADMISSION.in_flight_images)
+register_admission_gauge("bytes", lambda: ADMISSION.in_flight_bytes)
+
+
+@router.get("/metrics", include_in_schema=False)
+async def metrics():
+    return Response(content=render_metrics(), media_type=METRICS_CONTENT_TYPE)
@@ -0,0 +1,49 @@
+import hmac
+
+from fastapi import APIRouter, Depends, Header, HTTPException, Query
+from fastapi.responses import JSONResponse
+
+from config import Config
+from routers.classify import get_model_registry
+from routers.health import require_ready
+from services.model_registry import ModelRegistry, ModelSwapError
+
+
+router = APIRouter()
+
+
+def require_admin(x_admin_token: str | None = Header(None)):
+    """
+    Админские эндпоинты: нужен заголовок X-Admin-Token, равный ADMIN_TOKEN. Без токена
+    эндпоинты отключены (403), если явно не задано ALLOW_UNAUTHENTICATED_ADMIN=true.
+    """
+    if not Config.ADMIN_TOKEN:
+        if Config.ALLOW_UNAUTHENTICATED_ADMIN:
+            return
+        raise HTTPException(status_code=403, detail="Admin endpoints are disabled: ADMIN_TOKEN is not set")
+    if not hmac.compare_digest(x_admin_token or "", Config.ADMIN_TOKEN):
+        raise HTTPException(status_code=403, detail="Invalid admin token")
+
+
+@router.get("/models", dependencies=[Depends(require_admin)])
+async def list_models(registry: ModelRegistry = Depends(get_model_registry)):
+    """Версии в MODELS_DIR (каталог сканируется заново), активная версия и ход переключения"""
+    await registry.scan()
+    return registry.stats()
+
+
+@router.post("/models/activate", dependencies=[Depends(require_admin), Depends(require_ready)])
+async def activate_model(
+    version: str | None = Query(None, description="Version to switch to (default: the latest in MODELS_DIR)"),
+    registry: ModelRegistry = Depends(get_model_registry)
+):
+    """
+    Запускает переключение: версия загружается и прогревается в фоне, пока текущая
+    обслуживает запросы. Ход переключения — GET /models.
+    """
+    await registry.scan()
+    try:
+        target = registry.activate(version)
+    except ModelSwapError as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
+    return JSONResponse(status_code=202, content={"state": registry.state, "target": target.as_dict()})
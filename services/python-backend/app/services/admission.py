@@ -0,0 +1,126 @@
+import math
+import time
+from collections import Counter, deque
+from typing import Callable
+
+
+class AdmissionRejected(Exception):
+    """Запрос не принят: reason — причина для метрик, retry_after_s — через сколько повторить"""
+
+    def __init__(self, reason: str, detail: str, retry_after_s: int):
+        super().__init__(detail)
+        self.reason = reason
+        self.detail = detail
+        self.retry_after_s = retry_after_s
+
+
+class AdmissionTicket:
+    """Ресурсы, занятые принятым запросом; release() идемпотентен, выход из with освобождает их"""
+
+    def __init__(self, controller: "AdmissionController", images: int, num_bytes: int):
+        self._controller = controller
+        self.images = images
+        self.num_bytes = num_bytes
+        self._released = False
+
+    def release(self):
+        if not self._released:
+            self._released = True
+            self._controller._release(self)
+
+    def __enter__(self) -> "AdmissionTicket":
+        return self
+
+    def __exit__(self, *exc_info):
+        self.release()
+
+
+class AdmissionController:
+    """
+    Контроль входящей нагрузки: запрос принимается, только если после него число
+    изображений и байт в обработке и очередь к модели остаются в пределах лимитов.
+    Иначе он сразу отклоняется (429) с оценкой Retry-After — сколько времени нужно,
+    чтобы при текущей скорости обработки разошлись изображения в работе и в очереди.
+
+    Скорость считается по изображениям, завершённым за последние rate_window_s секунд.
+    Запрос, который один превышает лимит изображений или байт, принимается, когда
+    в обработке ничего нет, — иначе он не прошёл бы никогда. Лимит 0 — без ограничения.
+    """
+
+    def __init__(
+        self,
+        max_in_flight_images: int = 0,
+        max_in_flight_bytes: int = 0,
+        max_queued_images: int = 0,
+        queue_depth_fn: Callable[[], int] | None = None,
+        max_retry_after_s: int = 60,
+        rate_window_s: float = 30.0
+    ):
+        self.max_in_flight_images = max_in_flight_images
+        self.max_in_flight_bytes = max_in_flight_bytes
+        self.max_queued_images = max_queued_images
+        self.queue_depth_fn = queue_depth_fn or (lambda: 0)
+        self.max_retry_after_s = max_retry_after_s
+        self.rate_window_s = rate_window_s
+
+        self.in_flight_images = 0
+        self.in_flight_bytes = 0
+        self._completed: deque[tuple[float, int]] = deque()
+
+        self.admitted = 0
+        self.rejected: Counter[str] = Counter()
+
+    def drain_rate(self) -> float:
+        """Изображений в секунду за последние rate_window_s секунд (0 — нет данных)"""
+        now = time.monotonic()
+        while self._completed and now - self._completed[0][0] > self.rate_window_s:
+            self._completed.popleft()
+        if not self._completed:
+            return 0.0
+        span = max(now - self._completed[0][0], 1.0)
+        return sum(images for _, images in self._completed) / span
+
+    def retry_after_s(self, images: int = 0) -> int:
+        backlog = self.in_flight_images + self.queue_depth_fn() + images
+        rate = self.drain_rate()
+        if rate <= 0:
+            return 1
+        return min(max(1, math.ceil(backlog / rate)), self.max_retry_after_s)
+
+    def _reject(self, reason: str, detail: str, images: int):
+        self.rejected[reason] += 1
+        raise AdmissionRejected(reason, detail, self.retry_after_s(images))
+
+    def try_acquire(self, images: int, num_bytes: int) -> AdmissionTicket:
+        """Занимает ресурсы под запрос или бросает AdmissionRejected"""
+        busy = self.in_flight_images > 0
+        if self.max_queued_images and self.queue_depth_fn() >= self.max_queued_images:
+            self._reject("queue_full", "Inference queue is full", images)
+        if busy and self.max_in_flight_images and self.in_flight_images + images > self.max_in_flight_images:
+            self._reject("in_flight_images", "Too many images in processing", images)
+        if busy and self.max_in_flight_bytes and self.in_flight_bytes + num_bytes > self.max_in_flight_bytes:
+            self._reject("in_flight_bytes", "Too many bytes in processing", images)
+
+        self.in_flight_images += images
+        self.in_flight_bytes += num_bytes
+        self.admitted += 1
+        return AdmissionTicket(self, images, num_bytes)
+
+    def _release(self, ticket: AdmissionTicket):
+        self.in_flight_images -= ticket.images
+        self.in_flight_bytes -= ticket.num_bytes
+        self._completed.append((time.monotonic(), ticket.images))
+
+    def stats(self) -> dict:
+        return {
+            "max_in_flight_images": self.max_in_flight_images,
+            "max_in_flight_bytes": self.max_in_flight_bytes,
+            "max_queued_images": self.max_queued_images,
+            "in_flight_images": self.in_flight_images,
+            "in_flight_bytes": self.in_flight_bytes,
+            "queued_images": self.queue_depth_fn(),
+            "drain_rate_images_per_s": round(self.drain_rate(), 2),
+            "retry_after_s": self.retry_after_s(),
+            "admitted": self.admitted,
+            "rejected": dict(self.rejected),
+        }
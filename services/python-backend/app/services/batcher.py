@@ -0,0 +1,195 @@
+import asyncio
+import logging
+from collections import Counter
+from dataclasses import dataclass
+from itertools import count
+from typing import Any, Awaitable, Callable, Sequence
+
+
+logger = logging.getLogger(f"uvicorn.{__name__}")
+
+
+@dataclass
+class _PendingItem:
+    image: Any
+    future: asyncio.Future
+    enqueued_at: float
+
+
+@dataclass
+class BatchedResult:
+    """Результат элемента и время: ожидание в очереди батчера и этапы батча, в который он попал"""
+    output: Any
+    batch_id: int
+    queue_wait_s: float
+    batch_stages_s: dict[str, float]
+
+
+# batch_fn: элементы батча -> (результат каждого элемента, время этапов батча в секундах)
+BatchFn = Callable[[list[Any]], Awaitable[tuple[Sequence[Any], dict[str, float]]]]
+
+
+class MicroBatcher:
+    """
+    Динамический микро-батчинг для инференса.
+
+    Собирает подготовленные изображения из всех одновременно обрабатываемых запросов
+    в общую очередь и отправляет их в модель одним батчем, как только набрано
+    max_batch_size элементов или с момента первого элемента прошло max_wait_ms.
+    Результат батча раздаётся обратно в future каждого элемента.
+
+    Одновременно выполняется не более max_concurrent_batches батчей (по числу
+    слотов инференса); пока все слоты заняты, очередь копит следующий батч.
+    """
+
+    def __init__(
+        self,
+        batch_fn: BatchFn,
+        max_batch_size: int = 16,
+        max_wait_ms: float = 10.0,
+        max_concurrent_batches: int = 1
+    ):
+        if max_batch_size < 1:
+            raise ValueError("max_batch_size must be >= 1")
+
+        self.batch_fn = batch_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait_ms = max_wait_ms
+        self.max_concurrent_batches = max_concurrent_batches
+
+        self._queue: asyncio.Queue[_PendingItem] | None = None
+        self._worker: asyncio.Task | None = None
+        self._slots: asyncio.Semaphore | None = None
+        self._in_flight: set[asyncio.Task] = set()
+
+        # Статистика для подбора max_batch_size / max_wait_ms
+        self.batch_size_counts: Counter[int] = Counter()
+        self.total_batches = 0
+        self.total_items = 0
+        self._batch_ids = count()
+
+    @property
+    def is_running(self) -> bool:
+        return self._worker is not None and not self._worker.done()
+
+    @property
+    def queue_depth(self) -> int:
+        return self._queue.qsize() if self._queue is not None else 0
+
+    async def start(self):
+        if self.is_running:
+            return
+        self._queue = asyncio.Queue()
+        self._slots = asyncio.Semaphore(self.max_concurrent_batches)
+        self._worker = asyncio.create_task(self._run(), name="micro-batcher")
+        logger.info(
+            f"Micro-batcher started (max_batch_size={self.max_batch_size}, "
+            f"max_wait_ms={self.max_wait_ms})"
+        )
+
+    async def stop(self):
+        if self._worker is None:
+            return
+        self._worker.cancel()
+        try:
+            await self._worker
+        except asyncio.CancelledError:
+            pass
+        self._worker = None
+        for task in list(self._in_flight):
+            task.cancel()
+        await asyncio.gather(*self._in_flight, return_exceptions=True)
+
+        # Не оставляем запросы висеть на future, которые уже никто не выполнит
+        while self._queue is not None and not self._queue.empty():
+            item = self._queue.get_nowait()
+            if not item.future.done():
+                item.future.set_exception(RuntimeError("Micro-batcher is stopped"))
+        logger.info("Micro-batcher stopped")
+
+    async def submit(self, image: Any) -> BatchedResult:
+        """Ставит одно изображение в очередь и ждёт строку результата батча вместе с временем этапов"""
+        if not self.is_running:
+            raise RuntimeError("Micro-batcher is not running")
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._queue.put_nowait(_PendingItem(image=image, future=future, enqueued_at=loop.time()))
+        return await future
+
+    async def submit_many(self, images: list[Any]) -> list[BatchedResult]:
+        return list(await asyncio.gather(*(self.submit(image) for image in images)))
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        max_wait_s = self.max_wait_ms / 1000
+        while True:
+            await self._slots.acquire()
+            batch = [await self._queue.get()]
+            deadline = loop.time() + max_wait_s
+            while len(batch) < self.max_batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            task = asyncio.create_task(self._flush(batch))
+            self._in_flight.add(task)
+            task.add_done_callback(self._in_flight.discard)
+
+    async def _flush(self, batch: list[_PendingItem]):
+        try:
+            await self._process(batch)
+        finally:
+            self._slots.release()
+
+    async def _process(self, batch: list[_PendingItem]):
+        # Запросы, которые уже отменены клиентом, не тратят время модели
+        batch = [item for item in batch if not item.future.done()]
+        if not batch:
+            return
+
+        batch_id = next(self._batch_ids)
+        dispatched_at = asyncio.get_running_loop().time()
+        try:
+            # Сборка батча и нормализация выполняются в пуле инференса, а не в event loop
+            outputs, stages_s = await self.batch_fn([item.image for item in batch])
+        except asyncio.CancelledError:
+            for item in batch:
+                item.future.cancel()
+            raise
+        except Exception as e:
+            logger.error(f"Error during micro-batch inference: {str(e)}")
+            for item in batch:
+                if not item.future.done():
+                    item.future.set_exception(e)
+            return
+
+        for item, output in zip(batch, outputs):
+            if not item.future.done():
+                item.future.set_result(BatchedResult(
+                    output=output,
+                    batch_id=batch_id,
+                    queue_wait_s=dispatched_at - item.enqueued_at,
+                    batch_stages_s=stages_s
+                ))
+
+        self.batch_size_counts[len(batch)] += 1
+        self.total_batches += 1
+        self.total_items += len(batch)
+
+    def stats(self) -> dict:
+        return {
+            "running": self.is_running,
+            "queue_depth": self.queue_depth,
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait_ms,
+            "batches_in_flight": len(self._in_flight),
+            "total_batches": self.total_batches,
+            "total_items": self.total_items,
+            "mean_batch_size": (
+                round(self.total_items / self.total_batches, 2) if self.total_batches else 0.0
+            ),
+            "batch_size_histogram": dict(sorted(self.batch_size_counts.items())),
+        }
@@ -0,0 +1,132 @@
+import asyncio
+import io
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Any, BinaryIO, Callable
+
+from PIL import Image
+
+
+logger = logging.getLogger(f"uvicorn.{__name__}")
+
+
+# Загруженный файл: байты или файловый объект (спул UploadFile, файл на диске)
+ImageSource = bytes | BinaryIO
+
+# Расширения файлов изображений — для отбора файлов в архивах /jobs и папках офлайн-инструментов
+IMAGE_EXTENSIONS = {".jpg", ".jpeg", ".png", ".bmp", ".gif", ".tiff", ".webp", ".ico"}
+
+
+def open_image(source: ImageSource) -> Image.Image:
+    """
+    Открывает изображение без промежуточных копий: файловый объект читается PIL
+    напрямую с начала, байты — через BytesIO, который использует тот же буфер.
+    Файловый объект не закрывается — им владеет вызывающий код.
+    """
+    if isinstance(source, bytes):
+        return Image.open(io.BytesIO(source))
+    source.seek(0)
+    return Image.open(source)
+
+
+def source_size(source: ImageSource) -> int:
+    if isinstance(source, bytes):
+        return len(source)
+    return source.seek(0, io.SEEK_END)
+
+
+def decode_image(image_data: ImageSource, min_size: tuple[int, int] | None = None) -> Image.Image:
+    """
+    Декодирует загруженный файл в RGB.
+
+    Если задан min_size (ширина, высота), картинка сразу декодируется в наименьший
+    размер, не меньший min_size по обеим сторонам: для JPEG — масштабированием DCT
+    в самом декодере (Image.draft, шаги 1/2, 1/4, 1/8), для остальных форматов —
+    быстрым целочисленным уменьшением (Image.reduce) после декодирования.
+    Дальнейший resize до входа модели работает уже с маленькой картинкой.
+    """
+    image = open_image(image_data)
+    if min_size is None:
+        return image.convert('RGB')
+
+    if image.format == 'JPEG':
+        image.draft('RGB', min_size)
+    image = image.convert('RGB')
+
+    factor = min(image.width // min_size[0], image.height // min_size[1])
+    if factor >= 2:
+        image = image.reduce(factor)
+    return image
+
+
+class DecodePool:
+    """
+    Пул потоков для декодирования и resize изображений.
+
+    Pillow отпускает GIL при декодировании и resize, поэтому изображения одного
+    альбома (и параллельных запросов) декодируются одновременно. Число задач в
+    пуле ограничено workers + max_queue_size: полноразмерные декодированные
+    картинки не копятся в памяти сверх этого предела, остальные ждут асинхронно.
+    """
+
+    def __init__(self, workers: int = 4, max_queue_size: int = 32):
+        if workers < 1:
+            raise ValueError("workers must be >= 1")
+
+        self.workers = workers
+        self.max_queue_size = max_queue_size
+        self._pool: ThreadPoolExecutor | None = None
+        self._capacity: asyncio.Semaphore | None = None
+
+        self.in_flight = 0
+        self.completed = 0
+        self.busy_seconds = 0.0
+
+    @property
+    def is_running(self) -> bool:
+        return self._pool is not None
+
+    def start(self):
+        if self._pool is not None:
+            return
+        self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="decode")
+        self._capacity = asyncio.Semaphore(self.workers + self.max_queue_size)
+        logger.info(f"Decode pool started (workers={self.workers}, max_queue_size={self.max_queue_size})")
+
+    def stop(self):
+        if self._pool is None:
+            return
+        self._pool.shutdown(wait=True, cancel_futures=True)
+        self._pool = None
+        logger.info("Decode pool stopped")
+
+    def _timed(self, fn: Callable[..., Any], *args: Any) -> Any:
+        start = time.perf_counter()
+        try:
+            return fn(*args)
+        finally:
+            self.busy_seconds += time.perf_counter() - start
+            self.completed += 1
+
+    async def run(self, fn: Callable[..., Any], *args: Any) -> Any:
+        if self._pool is None:
+            raise RuntimeError("Decode pool is not running")
+        async with self._capacity:
+            self.in_flight += 1
+            try:
+                loop = asyncio.get_running_loop()
+                return await loop.run_in_executor(self._pool, partial(self._timed, fn, *args))
+            finally:
+                self.in_flight -= 1
+
+    def stats(self) -> dict:
+        return {
+            "running": self.is_running,
+            "workers": self.workers,
+            "max_queue_size": self.max_queue_size,
+            "in_flight": self.in_flight,
+            "completed": self.completed,
+            "mean_task_ms": round(self.busy_seconds * 1000 / self.completed, 2) if self.completed else 0.0,
+        }
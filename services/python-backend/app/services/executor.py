@@ -0,0 +1,183 @@
+import asyncio
+import logging
+import multiprocessing
+import os
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from functools import partial
+from typing import Any, Callable, Literal
+
+import numpy as np
+import torch
+
+from models.interior_classifier_EfficientNet_B3 import get_model
+from services.inference import BatchPrediction, predict_probabilities
+from services.worker_pool import SharedModelWorkerPool
+
+
+logger = logging.getLogger(f"uvicorn.{__name__}")
+
+
+# Модель процесса-слота в режиме process: загружается инициализатором слота
+_slot_model = None
+
+
+def _init_slot(threads_per_slot: int, model_fn: Callable[[], Any] | None = None):
+    # torch.set_num_threads действует на вызывающий поток (OpenMP) и на процесс,
+    # поэтому вызывается в каждом слоте: слоты не делят ядра сверх лимита
+    global _slot_model
+    torch.set_num_threads(threads_per_slot)
+    if model_fn is not None:
+        _slot_model = model_fn()
+
+
+def _predict_in_slot(images: list[np.ndarray], full_resolution: list[bool] | None = None) -> BatchPrediction:
+    return predict_probabilities(images, _slot_model, full_resolution)
+
+
+class InferenceExecutor:
+    """
+    Пул для тяжёлых синхронных задач инференса (препроцессинг батча и прямой проход модели).
+
+    Роутеры ожидают результат через await, поэтому event loop продолжает
+    принимать соединения и читать загрузки, пока CPU занят моделью.
+    Количество одновременно выполняемых задач ограничено num_slots, а число
+    задач в очереди — max_queue_size; остальные вызывающие ждут асинхронно.
+
+    Режимы:
+    - thread: потоки в API-процессе, общая модель;
+    - process: процессы, в каждом своя копия модели;
+    - shared: прямой проход выполняют процессы SharedModelWorkerPool с одной
+      копией весов в shared memory, остальные задачи — потоки API-процесса.
+
+    model_fn загружает модель, которую выполняет пул: в режимах thread и shared —
+    при start() в API-процессе, в режиме process — в каждом процессе. Без model_fn
+    используется get_model(). После stop() пул больше не держит ссылок на модель.
+    """
+
+    def __init__(
+        self,
+        mode: Literal['thread', 'process', 'shared'] = 'thread',
+        num_slots: int = 1,
+        threads_per_slot: int = 0,
+        max_queue_size: int = 64,
+        model_fn: Callable[[], Any] | None = None
+    ):
+        if mode not in ('thread', 'process', 'shared'):
+            raise ValueError(f"Unknown executor mode: {mode}")
+        if num_slots < 1:
+            raise ValueError("num_slots must be >= 1")
+
+        self.mode = mode
+        self.num_slots = num_slots
+        # 0 — поделить все ядра поровну между слотами
+        self.threads_per_slot = threads_per_slot or max(1, (os.cpu_count() or 1) // num_slots)
+        self.max_queue_size = max_queue_size
+        self.model_fn = model_fn
+        self.model = None
+
+        self._pool: Executor | None = None
+        self._worker_pool: SharedModelWorkerPool | None = None
+        self._capacity: asyncio.Semaphore | None = None
+        self.in_flight = 0
+
+    @property
+    def is_running(self) -> bool:
+        return self._pool is not None
+
+    @property
+    def queue_depth(self) -> int:
+        # Задачи, отправленные в пул, но ещё не занявшие слот
+        return max(0, self.in_flight - self.num_slots)
+
+    def start(self):
+        if self._pool is not None:
+            return
+        if self.mode == 'process':
+            # Каждый процесс загружает свою копию модели в model_fn
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.num_slots,
+                mp_context=multiprocessing.get_context('spawn'),
+                initializer=_init_slot,
+                initargs=(self.threads_per_slot, self.model_fn)
+            )
+        elif self.mode == 'shared':
+            self.model = (self.model_fn or get_model)()
+            self._worker_pool = SharedModelWorkerPool(
+                model=self.model,
+                model_fn=self.model_fn,
+                num_workers=self.num_slots,
+                threads_per_worker=self.threads_per_slot,
+                max_queue_size=self.max_queue_size
+            )
+            self._worker_pool.start()
+            # Прочие задачи через run() выполняются в потоках API-процесса
+            self._pool = ThreadPoolExecutor(
+                max_workers=self.num_slots,
+                thread_name_prefix="inference"
+            )
+        else:
+            self.model = self.model_fn() if self.model_fn is not None else None
+            self._pool = ThreadPoolExecutor(
+                max_workers=self.num_slots,
+                thread_name_prefix="inference",
+                initializer=_init_slot,
+                initargs=(self.threads_per_slot,)
+            )
+        self._capacity = asyncio.Semaphore(self.num_slots + self.max_queue_size)
+        logger.info(
+            f"Inference executor started (mode={self.mode}, slots={self.num_slots}, "
+            f"threads_per_slot={self.threads_per_slot}, max_queue_size={self.max_queue_size})"
+        )
+
+    def stop(self):
+        if self._pool is None:
+            return
+        self._pool.shutdown(wait=True, cancel_futures=True)
+        self._pool = None
+        if self._worker_pool is not None:
+            self._worker_pool.stop()
+            self._worker_pool = None
+        self.model = None
+        logger.info("Inference executor stopped")
+
+    async def run(self, fn: Callable[..., Any], *args: Any) -> Any:
+        """Выполняет fn(*args) в пуле; в режиме process fn и аргументы должны сериализоваться"""
+        if self._pool is None:
+            raise RuntimeError("Inference executor is not running")
+        async with self._capacity:
+            self.in_flight += 1
+            try:
+                loop = asyncio.get_running_loop()
+                return await loop.run_in_executor(self._pool, partial(fn, *args))
+            finally:
+                self.in_flight -= 1
+
+    async def predict(self, images: list[np.ndarray], full_resolution: list[bool] | None = None) -> BatchPrediction:
+        """
+        Препроцессинг и прямой проход модели над батчем изображений (H, W, 3) uint8: вероятности и время этапов.
+        full_resolution — изображения, которые не проходят каскад (см. services.inference.predict_probabilities)
+        """
+        if self.mode == 'process':
+            return await self.run(_predict_in_slot, images, full_resolution)
+        if self._worker_pool is None:
+            return await self.run(predict_probabilities, images, self.model, full_resolution)
+        async with self._capacity:
+            self.in_flight += 1
+            try:
+                return await self._worker_pool.run(images, full_resolution)
+            finally:
+                self.in_flight -= 1
+
+    def stats(self) -> dict:
+        stats = {
+            "running": self.is_running,
+            "mode": self.mode,
+            "num_slots": self.num_slots,
+            "threads_per_slot": self.threads_per_slot,
+            "max_queue_size": self.max_queue_size,
+            "in_flight": self.in_flight,
+            "queue_depth": self.queue_depth,
+        }
+        if self._worker_pool is not None:
+            stats["worker_pool"] = self._worker_pool.stats()
+        return stats
@@ -0,0 +1,158 @@
+import time
+from dataclasses import dataclass, field
+
+import numpy as np
+import torch
+
+from config import Config
+from models.engines import OnnxRuntimeModel
+from models.interior_classifier_EfficientNet_B3 import InteriorClassifier, get_model
+from services.decoding import ImageSource, decode_image
+from services.preprocessing import BatchPreprocessor
+
+
+# Функции этого модуля выполняются в InferenceExecutor, в том числе в отдельных
+# процессах, поэтому они объявлены на уровне модуля и берут модель через get_model()
+
+IMG_SIZE = 448
+
+# Создаётся один раз при старте (в каждом процессе пула — свой)
+PREPROCESSOR = BatchPreprocessor(img_size=IMG_SIZE, max_batch_size=Config.MAX_BATCH_SIZE)
+
+
+def prepare_image(image_data: ImageSource) -> np.ndarray:
+    """Декодирует загруженный файл и приводит его к входному размеру модели (H, W, 3) uint8"""
+    image = decode_image(image_data, min_size=(IMG_SIZE, IMG_SIZE) if Config.FAST_DECODE else None)
+    return PREPROCESSOR.resize(image)
+
+
+@dataclass
+class BatchPrediction:
+    """Вероятности батча и время его этапов — передаётся и из процессов пула инференса"""
+    probabilities: np.ndarray
+    preprocess_s: float
+    forward_s: float
+    # Признаки бэкбона после пулинга (N, feature_dim); None — движок их не отдаёт (ONNX, TorchScript)
+    embeddings: np.ndarray | None = None
+    # Вероятности теневых голов (SHADOW_HEADS) по именам, посчитанные на тех же признаках бэкбона
+    shadow_probabilities: dict[str, np.ndarray] = field(default_factory=dict)
+    # Каскад: True — результат изображения принят после прохода в CASCADE_IMG_SIZE; None — каскад не выполнялся
+    early_exit: np.ndarray | None = None
+
+
+def supports_cascade(model) -> bool:
+    # ONNX экспортирован с фиксированным входом 448x448; TorchScript и eager принимают любой размер
+    return Config.CASCADE_ENABLED and not isinstance(model, OnnxRuntimeModel)
+
+
+def forward(model, batch_tensor: torch.Tensor) -> tuple[np.ndarray, np.ndarray | None, dict[str, np.ndarray]]:
+    """Вероятности классов, признаки бэкбона (если модель их отдаёт) и вероятности теневых голов"""
+    embeddings = None
+    shadow_probabilities = {}
+    if isinstance(model, InteriorClassifier):
+        features = model.backbone(batch_tensor)
+        outputs = model.head(features)
+        embeddings = features.numpy()
+        for name, head in getattr(model, "shadow_heads", {}).items():
+            shadow_probabilities[name] = torch.nn.functional.softmax(head(features), dim=1).numpy()
+    else:
+        outputs = model(batch_tensor)
+    return torch.nn.functional.softmax(outputs, dim=1).numpy(), embeddings, shadow_probabilities
+
+
+def cascade_forward(
+    model,
+    batch_tensor: torch.Tensor,
+    full_resolution: np.ndarray,
+    img_size: int,
+    threshold: float
+) -> tuple[np.ndarray, np.ndarray | None, dict[str, np.ndarray], np.ndarray]:
+    """
+    Сначала батч проходит через модель в разрешении img_size; результаты с top_confidence
+    не ниже threshold принимаются, остальные изображения (и отмеченные в full_resolution)
+    считаются вторым батчем в полном разрешении. Возвращает то же, что forward, и маску
+    изображений, принятых после первого прохода.
+    """
+    num_images = len(batch_tensor)
+    early_exit = np.zeros(num_images, dtype=bool)
+    low_rows = np.flatnonzero(~full_resolution)
+    low_probabilities, low_embeddings, low_shadow, confident = None, None, {}, None
+    if low_rows.size:
+        low_input = batch_tensor if low_rows.size == num_images else batch_tensor[low_rows]
+        # Интерполяция линейна, поэтому уменьшать можно уже нормализованный батч
+        low_input = torch.nn.functional.interpolate(
+            low_input,
+            size=(img_size, img_size),
+            mode="bilinear",
+            antialias=True,
+            align_corners=False
+        )
+        low_probabilities, low_embeddings, low_shadow = forward(model, low_input)
+        confident = low_probabilities.max(axis=1) >= threshold
+        early_exit[low_rows[confident]] = True
+
+    exit_rows = np.flatnonzero(early_exit)
+    full_rows = np.flatnonzero(~early_exit)
+    full_probabilities, full_embeddings, full_shadow = None, None, {}
+    if full_rows.size:
+        full_input = batch_tensor if full_rows.size == num_images else batch_tensor[full_rows]
+        full_probabilities, full_embeddings, full_shadow = forward(model, full_input)
+
+    def merge(low_part: np.ndarray | None, full_part: np.ndarray | None) -> np.ndarray | None:
+        # Строки обоих проходов — на свои места в батче
+        if (exit_rows.size and low_part is None) or (full_rows.size and full_part is None):
+            return None
+        reference = full_part if full_rows.size else low_part
+        merged = np.empty((num_images, *reference.shape[1:]), dtype=reference.dtype)
+        if exit_rows.size:
+            merged[exit_rows] = low_part[confident]
+        if full_rows.size:
+            merged[full_rows] = full_part
+        return merged
+
+    shadow_names = full_shadow if full_rows.size else low_shadow
+    return (
+        merge(low_probabilities, full_probabilities),
+        merge(low_embeddings, full_embeddings),
+        {name: merge(low_shadow.get(name), full_shadow.get(name)) for name in shadow_names},
+        early_exit
+    )
+
+
+def predict_probabilities(
+    images: list[np.ndarray],
+    model=None,
+    full_resolution: list[bool] | None = None
+) -> BatchPrediction:
+    """
+    Нормализует батч в переиспользуемом буфере и возвращает вероятности классов (N, num_classes).
+    Матрица переводится в NumPy один раз на батч: дальше постобработка идёт без torch.
+    Если у модели есть бэкбон и голова (eager и int8 без ckpt*.int8.pt), признаки бэкбона возвращаются
+    как эмбеддинги — это тот же прямой проход, без лишних вычислений. На них же
+    считаются теневые головы модели, если они загружены.
+
+    При CASCADE_ENABLED батч считается каскадом (см. cascade_forward); full_resolution
+    отмечает изображения, которым нужен только полный проход (например, ради эмбеддингов).
+    """
+    if model is None:
+        model = get_model()
+    start = time.perf_counter()
+    batch_tensor = PREPROCESSOR.to_batch(images)
+    preprocessed = time.perf_counter()
+    early_exit = None
+    with torch.no_grad():
+        if supports_cascade(model):
+            mask = np.asarray(full_resolution if full_resolution is not None else [False] * len(images), dtype=bool)
+            probabilities, embeddings, shadow_probabilities, early_exit = cascade_forward(
+                model, batch_tensor, mask, Config.CASCADE_IMG_SIZE, Config.CASCADE_THRESHOLD
+            )
+        else:
+            probabilities, embeddings, shadow_probabilities = forward(model, batch_tensor)
+    return BatchPrediction(
+        probabilities=probabilities,
+        preprocess_s=preprocessed - start,
+        forward_s=time.perf_counter() - preprocessed,
+        embeddings=embeddings,
+        shadow_probabilities=shadow_probabilities,
+        early_exit=early_exit
+    )
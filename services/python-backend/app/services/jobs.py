@@ -0,0 +1,331 @@
+import asyncio
+import json
+import logging
+import shutil
+import sqlite3
+import tarfile
+import threading
+import time
+import uuid
+import zipfile
+from pathlib import Path, PurePath
+from typing import Awaitable, BinaryIO, Callable
+
+from services.decoding import IMAGE_EXTENSIONS
+
+
+logger = logging.getLogger(f"uvicorn.{__name__}")
+
+
+ARCHIVE_SUFFIXES = (".zip", ".tar", ".tar.gz", ".tgz")
+
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_COMPLETED = "completed"
+JOB_FAILED = "failed"
+
+# Обработка пачки файлов задачи: (имя файла, байты) -> результаты в виде словарей ClassificationResult
+ProcessFn = Callable[[list[tuple[str, bytes]]], Awaitable[list[dict]]]
+
+
+def is_archive(filename: str) -> bool:
+    return filename.lower().endswith(ARCHIVE_SUFFIXES)
+
+
+class JobStore:
+    """
+    Состояние задач в SQLite: таблица jobs (статус и прогресс) и job_items (файлы в спуле
+    и их результаты). Результат записывается сразу после обработки пачки, поэтому после
+    перезапуска задача продолжается с первого необработанного файла.
+    """
+
+    def __init__(self, db_path: Path):
+        self.db_path = db_path
+        self._db: sqlite3.Connection | None = None
+        self._lock = threading.Lock()
+
+    def _get_db(self) -> sqlite3.Connection:
+        if self._db is not None:
+            return self._db
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        db = sqlite3.connect(str(self.db_path), check_same_thread=False, isolation_level=None)
+        db.execute("PRAGMA journal_mode=WAL")
+        db.execute("PRAGMA synchronous=NORMAL")
+        db.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            "id TEXT PRIMARY KEY, status TEXT NOT NULL, total INTEGER NOT NULL, "
+            "processed INTEGER NOT NULL DEFAULT 0, error TEXT, "
+            "created_at REAL NOT NULL, updated_at REAL NOT NULL)"
+        )
+        db.execute(
+            "CREATE TABLE IF NOT EXISTS job_items ("
+            "job_id TEXT NOT NULL, idx INTEGER NOT NULL, image_name TEXT NOT NULL, "
+            "spool_path TEXT NOT NULL, result TEXT, PRIMARY KEY (job_id, idx))"
+        )
+        self._db = db
+        return db
+
+    def create_job(self, job_id: str, items: list[tuple[str, Path]]):
+        now = time.time()
+        with self._lock:
+            db = self._get_db()
+            db.execute("BEGIN")
+            db.execute(
+                "INSERT INTO jobs (id, status, total, created_at, updated_at) VALUES (?, ?, ?, ?, ?)",
+                (job_id, JOB_QUEUED, len(items), now, now)
+            )
+            db.executemany(
+                "INSERT INTO job_items (job_id, idx, image_name, spool_path) VALUES (?, ?, ?, ?)",
+                [(job_id, idx, name, str(path)) for idx, (name, path) in enumerate(items)]
+            )
+            db.execute("COMMIT")
+
+    def get_job(self, job_id: str) -> dict | None:
+        with self._lock:
+            row = self._get_db().execute(
+                "SELECT id, status, total, processed, error, created_at, updated_at FROM jobs WHERE id = ?",
+                (job_id,)
+            ).fetchone()
+        if row is None:
+            return None
+        keys = ("job_id", "status", "total_images", "processed_images", "error", "created_at", "updated_at")
+        return dict(zip(keys, row))
+
+    def get_results(self, job_id: str, offset: int = 0, limit: int = -1) -> list[dict]:
+        """Готовые результаты задачи в порядке загрузки файлов"""
+        with self._lock:
+            rows = self._get_db().execute(
+                "SELECT result FROM job_items WHERE job_id = ? AND result IS NOT NULL "
+                "ORDER BY idx LIMIT ? OFFSET ?",
+                (job_id, limit, offset)
+            ).fetchall()
+        return [json.loads(result) for result, in rows]
+
+    def pending_items(self, job_id: str) -> list[tuple[int, str, Path]]:
+        with self._lock:
+            rows = self._get_db().execute(
+                "SELECT idx, image_name, spool_path FROM job_items "
+                "WHERE job_id = ? AND result IS NULL ORDER BY idx",
+                (job_id,)
+            ).fetchall()
+        return [(idx, name, Path(path)) for idx, name, path in rows]
+
+    def save_results(self, job_id: str, results: list[tuple[int, dict]]):
+        with self._lock:
+            db = self._get_db()
+            db.execute("BEGIN")
+            db.executemany(
+                "UPDATE job_items SET result = ? WHERE job_id = ? AND idx = ?",
+                [(json.dumps(result, separators=(",", ":")), job_id, idx) for idx, result in results]
+            )
+            db.execute(
+                "UPDATE jobs SET processed = processed + ?, updated_at = ? WHERE id = ?",
+                (len(results), time.time(), job_id)
+            )
+            db.execute("COMMIT")
+
+    def set_status(self, job_id: str, status: str, error: str | None = None):
+        with self._lock:
+            self._get_db().execute(
+                "UPDATE jobs SET status = ?, error = ?, updated_at = ? WHERE id = ?",
+                (status, error, time.time(), job_id)
+            )
+
+    def unfinished_jobs(self) -> list[str]:
+        with self._lock:
+            rows = self._get_db().execute(
+                "SELECT id FROM jobs WHERE status IN (?, ?) ORDER BY created_at",
+                (JOB_QUEUED, JOB_RUNNING)
+            ).fetchall()
+        return [job_id for job_id, in rows]
+
+    def count_by_status(self) -> dict[str, int]:
+        with self._lock:
+            rows = self._get_db().execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall()
+        return dict(rows)
+
+    def close(self):
+        if self._db is not None:
+            self._db.close()
+            self._db = None
+
+
+class JobManager:
+    """
+    Фоновая обработка больших пакетов изображений.
+
+    Загруженные файлы (или содержимое архивов) сохраняются в спул на диске, задача
+    записывается в JobStore и ставится в очередь. num_workers фоновых задач asyncio
+    забирают задачи из очереди и прогоняют файлы пачками по chunk_size через
+    process_fn — тот же путь, что у /classify_batch (кеши, декодирование, микро-батчер).
+    При старте незавершённые задачи ставятся в очередь заново.
+
+    Распаковка архивов ограничена: файл архива больше max_file_bytes, суммарный объём
+    спула больше max_spool_bytes или больше max_images изображений в задаче — ValueError
+    (0 — без ограничения).
+    """
+
+    def __init__(
+        self,
+        jobs_dir: Path,
+        process_fn: ProcessFn,
+        num_workers: int = 1,
+        chunk_size: int = 16,
+        max_file_bytes: int = 0,
+        max_spool_bytes: int = 0,
+        max_images: int = 0
+    ):
+        if num_workers < 1:
+            raise ValueError("num_workers must be >= 1")
+        if chunk_size < 1:
+            raise ValueError("chunk_size must be >= 1")
+
+        self.jobs_dir = jobs_dir
+        self.spool_dir = jobs_dir / "spool"
+        self.process_fn = process_fn
+        self.num_workers = num_workers
+        self.chunk_size = chunk_size
+        self.max_file_bytes = max_file_bytes
+        self.max_spool_bytes = max_spool_bytes
+        self.max_images = max_images
+
+        self.store = JobStore(jobs_dir / "jobs.sqlite3")
+        self._queue: asyncio.Queue[str] | None = None
+        self._workers: list[asyncio.Task] = []
+
+        self.processed_images = 0
+
+    @property
+    def is_running(self) -> bool:
+        return bool(self._workers)
+
+    @property
+    def queued_jobs(self) -> int:
+        return self._queue.qsize() if self._queue is not None else 0
+
+    async def start(self):
+        if self.is_running:
+            return
+        self._queue = asyncio.Queue()
+        resumed = await asyncio.to_thread(self.store.unfinished_jobs)
+        for job_id in resumed:
+            self._queue.put_nowait(job_id)
+        self._workers = [asyncio.create_task(self._run()) for _ in range(self.num_workers)]
+        logger.info(
+            f"Job manager started (workers={self.num_workers}, chunk_size={self.chunk_size}, "
+            f"resumed_jobs={len(resumed)})"
+        )
+
+    async def stop(self):
+        # Задачи не помечаются как упавшие: при следующем старте они продолжатся
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+        self.store.close()
+        logger.info("Job manager stopped")
+
+    async def submit(self, uploads: list[tuple[str, BinaryIO]]) -> tuple[str, int]:
+        """Сохраняет файлы (архивы распаковываются) в спул, создаёт задачу и возвращает (id, число изображений)"""
+        if not self.is_running:
+            raise RuntimeError("Job manager is not running")
+        job_id = uuid.uuid4().hex
+        job_dir = self.spool_dir / job_id
+        try:
+            items = await asyncio.to_thread(self._spool, job_dir, uploads)
+            if not items:
+                raise ValueError("No images found in the upload")
+            await asyncio.to_thread(self.store.create_job, job_id, items)
+        except Exception:
+            shutil.rmtree(job_dir, ignore_errors=True)
+            raise
+        self._queue.put_nowait(job_id)
+        logger.info(f"Job {job_id} queued ({len(items)} images)")
+        return job_id, len(items)
+
+    def _spool(self, job_dir: Path, uploads: list[tuple[str, BinaryIO]]) -> list[tuple[str, Path]]:
+        job_dir.mkdir(parents=True, exist_ok=True)
+        items: list[tuple[str, Path]] = []
+        spooled_bytes = 0
+
+        def check_member(name: str, size: int):
+            # Заявленный размер проверяется до распаковки; фактический — при копировании в write
+            if self.max_file_bytes and size > self.max_file_bytes:
+                raise ValueError(f"Archive member {name} is too large: {size} bytes (limit {self.max_file_bytes})")
+
+        def write(name: str, source: BinaryIO, max_bytes: int = 0):
+            nonlocal spooled_bytes
+            if self.max_images and len(items) >= self.max_images:
+                raise ValueError(f"Too many images in the job: more than {self.max_images}")
+            # Имя в спуле — порядковый номер: исходные имена могут совпадать или содержать пути
+            path = job_dir / f"{len(items):06d}{PurePath(name).suffix.lower()}"
+            size = 0
+            with open(path, "wb") as f:
+                while chunk := source.read(1024 * 1024):
+                    size += len(chunk)
+                    if max_bytes and size > max_bytes:
+                        raise ValueError(f"Archive member {name} is too large: more than {max_bytes} bytes")
+                    if self.max_spool_bytes and spooled_bytes + size > self.max_spool_bytes:
+                        raise ValueError(f"Job is too large: more than {self.max_spool_bytes} bytes of images")
+                    f.write(chunk)
+            spooled_bytes += size
+            items.append((name, path))
+
+        for filename, file in uploads:
+            lowered = filename.lower()
+            if lowered.endswith(".zip"):
+                with zipfile.ZipFile(file) as archive:
+                    for info in sorted(archive.infolist(), key=lambda info: info.filename):
+                        if not info.is_dir() and PurePath(info.filename).suffix.lower() in IMAGE_EXTENSIONS:
+                            check_member(info.filename, info.file_size)
+                            with archive.open(info) as member:
+                                write(info.filename, member, self.max_file_bytes)
+            elif is_archive(lowered):
+                with tarfile.open(fileobj=file, mode="r:*") as archive:
+                    for info in sorted(archive.getmembers(), key=lambda info: info.name):
+                        if info.isfile() and PurePath(info.name).suffix.lower() in IMAGE_EXTENSIONS:
+                            check_member(info.name, info.size)
+                            write(info.name, archive.extractfile(info), self.max_file_bytes)
+            else:
+                # Файлы с неподдерживаемым форматом или больше MAX_FILE_BYTES не отбрасываются:
+                # ошибка попадёт в их результат
+                write(filename, file)
+        return items
+
+    async def _run(self):
+        while True:
+            job_id = await self._queue.get()
+            try:
+                await self._process_job(job_id)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Job {job_id} failed: {str(e)}")
+                await asyncio.to_thread(self.store.set_status, job_id, JOB_FAILED, str(e))
+
+    async def _process_job(self, job_id: str):
+        # Обращения к SQLite (и к файлам спула) выполняются в потоках, чтобы не блокировать цикл событий
+        await asyncio.to_thread(self.store.set_status, job_id, JOB_RUNNING)
+        pending = await asyncio.to_thread(self.store.pending_items, job_id)
+        started = time.perf_counter()
+        for start in range(0, len(pending), self.chunk_size):
+            chunk = pending[start:start + self.chunk_size]
+            datas = await asyncio.to_thread(lambda: [path.read_bytes() for _, _, path in chunk])
+            results = await self.process_fn([(name, data) for (_, name, _), data in zip(chunk, datas)])
+            await asyncio.to_thread(
+                self.store.save_results, job_id, [(idx, result) for (idx, _, _), result in zip(chunk, results)]
+            )
+            self.processed_images += len(chunk)
+        await asyncio.to_thread(self.store.set_status, job_id, JOB_COMPLETED)
+        await asyncio.to_thread(shutil.rmtree, self.spool_dir / job_id, True)
+        logger.info(f"Job {job_id} completed ({len(pending)} images in {time.perf_counter() - started:.1f} s)")
+
+    def stats(self) -> dict:
+        return {
+            "running": self.is_running,
+            "workers": self.num_workers,
+            "chunk_size": self.chunk_size,
+            "queued_jobs": self.queued_jobs,
+            "jobs_by_status": self.store.count_by_status(),
+            "processed_images": self.processed_images,
+        }
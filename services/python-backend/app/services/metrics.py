@@ -0,0 +1,113 @@
+from typing import Callable
+
+from prometheus_client import CONTENT_TYPE_LATEST, Counter, Gauge, Histogram, generate_latest
+
+
+# Метрики Prometheus для /metrics. На горячем пути — только observe/inc (доли микросекунды);
+# глубина очередей и загрузка пулов считываются колбэками в момент опроса Prometheus.
+
+METRICS_CONTENT_TYPE = CONTENT_TYPE_LATEST
+
+# Этапы запроса: от миллисекунд (чтение, постобработка) до секунд (инференс на CPU)
+STAGE_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+STAGE_SECONDS = Histogram(
+    "interior_stage_seconds",
+    "Time spent in each processing stage of a request",
+    ["endpoint", "stage"],
+    buckets=STAGE_BUCKETS
+)
+REQUEST_SECONDS = Histogram(
+    "interior_request_seconds",
+    "Total request processing time",
+    ["endpoint"],
+    buckets=STAGE_BUCKETS
+)
+BATCH_STAGE_SECONDS = Histogram(
+    "interior_batch_stage_seconds",
+    "Time of preprocessing and model forward pass per inference batch",
+    ["stage"],
+    buckets=STAGE_BUCKETS
+)
+BATCH_SIZE = Histogram(
+    "interior_batch_size",
+    "Number of images in each batch sent to the model",
+    buckets=(1, 2, 4, 8, 12, 16, 24, 32, 48, 64, 128)
+)
+IMAGES = Counter(
+    "interior_images_total",
+    "Processed images by result source (cache, near_duplicate, model, error)",
+    ["endpoint", "source"]
+)
+DECODE_ERRORS = Counter(
+    "interior_decode_errors_total",
+    "Images that could not be read or decoded, by exception type",
+    ["error_type"]
+)
+INFERENCE_ERRORS = Counter(
+    "interior_inference_errors_total",
+    "Failed inference batches by exception type",
+    ["error_type"]
+)
+SHADOW_PREDICTIONS = Counter(
+    "interior_shadow_predictions_total",
+    "Images classified by shadow heads, by agreement of the predicted class with the primary head",
+    ["head", "agreement"]
+)
+CASCADE_IMAGES = Counter(
+    "interior_cascade_images_total",
+    "Images classified in cascade mode, by the pass that produced the result (low_res or full)",
+    ["stage"]
+)
+REJECTED_REQUESTS = Counter(
+    "interior_rejected_requests_total",
+    "Requests rejected by admission control (429/413) by reason",
+    ["endpoint", "reason"]
+)
+IN_FLIGHT_REQUESTS = Gauge(
+    "interior_in_flight_requests",
+    "Requests currently being processed",
+    ["endpoint"]
+)
+QUEUE_DEPTH = Gauge(
+    "interior_queue_depth",
+    "Items waiting in internal queues",
+    ["queue"]
+)
+ADMISSION_IN_FLIGHT = Gauge(
+    "interior_admission_in_flight",
+    "Images and bytes held by admitted requests",
+    ["resource"]
+)
+WORKERS_BUSY = Gauge(
+    "interior_workers_busy",
+    "Tasks currently running or waiting in worker pools",
+    ["pool"]
+)
+
+
+def observe_stages(endpoint: str, stages_s: dict[str, float]):
+    for stage, seconds in stages_s.items():
+        STAGE_SECONDS.labels(endpoint, stage).observe(seconds)
+
+
+def observe_batch(batch_size: int, preprocess_s: float, forward_s: float):
+    BATCH_SIZE.observe(batch_size)
+    BATCH_STAGE_SECONDS.labels("preprocess").observe(preprocess_s)
+    BATCH_STAGE_SECONDS.labels("forward").observe(forward_s)
+
+
+def register_queue_gauge(queue: str, value_fn: Callable[[], float]):
+    QUEUE_DEPTH.labels(queue).set_function(value_fn)
+
+
+def register_pool_gauge(pool: str, value_fn: Callable[[], float]):
+    WORKERS_BUSY.labels(pool).set_function(value_fn)
+
+
+def register_admission_gauge(resource: str, value_fn: Callable[[], float]):
+    ADMISSION_IN_FLIGHT.labels(resource).set_function(value_fn)
+
+
+def render_metrics() -> bytes:
+    return generate_latest()
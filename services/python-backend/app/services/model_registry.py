@@ -0,0 +1,267 @@
+import asyncio
+import gc
+import logging
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from datetime import datetime
+from pathlib import Path
+from typing import Awaitable, Callable
+
+import numpy as np
+
+from models.registry import ModelVersion, scan_models
+from services.executor import InferenceExecutor
+from services.inference import BatchPrediction
+from services.timing import StageTimer
+
+
+logger = logging.getLogger(f"uvicorn.{__name__}")
+
+
+class ModelSwapError(Exception):
+    """Переключение версии невозможно: status_code — код ответа админского эндпоинта"""
+
+    def __init__(self, status_code: int, detail: str):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+
+
+@dataclass
+class LoadedModel:
+    """Загруженная версия и пул, который её выполняет"""
+    version: ModelVersion
+    executor: InferenceExecutor
+    loaded_at: float = field(default_factory=time.time)
+    in_flight: int = 0  # батчи, отправленные в пул этой версии и ещё не завершённые
+
+
+class ModelRegistry:
+    """
+    Версии моделей каталога models_dir и переключение между ними без остановки сервиса.
+
+    Каждая загруженная версия выполняется своим пулом инференса (executor_factory).
+    Новая версия загружается и прогревается в фоне, пока старая обслуживает запросы;
+    затем активная версия подменяется одним присваиванием — следующие батчи идут в
+    новую. Старый пул останавливается (и веса освобождаются), когда завершатся уже
+    отправленные в него батчи; если они не завершились за drain_timeout_s, это
+    записывается в лог, а пул продолжает ждать их.
+
+    Одновременно выполняется только одно переключение. Ошибка загрузки или прогрева
+    не затрагивает активную версию.
+    """
+
+    def __init__(
+        self,
+        models_dir: Path,
+        executor_factory: Callable[[ModelVersion], InferenceExecutor],
+        warmup_fn: Callable[[InferenceExecutor], Awaitable] | None = None,
+        pinned_version: str | None = None,
+        drain_timeout_s: float = 60.0
+    ):
+        self.models_dir = models_dir
+        self.executor_factory = executor_factory
+        self.warmup_fn = warmup_fn
+        self.pinned_version = pinned_version
+        self.drain_timeout_s = drain_timeout_s
+
+        self.versions: list[ModelVersion] = []
+        self.active: LoadedModel | None = None
+        self._draining: list[LoadedModel] = []
+        self._swap_task: asyncio.Task | None = None
+        self.state = "idle"  # idle / loading / warming_up / draining
+        self.target: ModelVersion | None = None
+        self.error: str | None = None
+        self.history: deque[dict] = deque(maxlen=20)
+
+    @property
+    def executor(self) -> InferenceExecutor | None:
+        return self.active.executor if self.active is not None else None
+
+    @property
+    def version(self) -> ModelVersion | None:
+        return self.active.version if self.active is not None else None
+
+    @property
+    def queue_depth(self) -> int:
+        return sum(loaded.executor.queue_depth for loaded in self._loaded())
+
+    @property
+    def in_flight(self) -> int:
+        return sum(loaded.executor.in_flight for loaded in self._loaded())
+
+    def _loaded(self) -> list[LoadedModel]:
+        return ([self.active] if self.active is not None else []) + self._draining
+
+    async def scan(self) -> list[ModelVersion]:
+        self.versions = await asyncio.to_thread(scan_models, self.models_dir)
+        return self.versions
+
+    def find(self, version: str | None = None) -> ModelVersion:
+        """Версия по имени; без имени — закреплённая (pinned_version) или последняя"""
+        version = version or self.pinned_version
+        if not self.versions:
+            raise ModelSwapError(404, f"No checkpoint files found in {self.models_dir}")
+        if version is None:
+            return self.versions[-1]
+        for model_version in self.versions:
+            if model_version.version == version:
+                return model_version
+        raise ModelSwapError(404, f"Model version {version} not found in {self.models_dir}")
+
+    async def _load(self, version: ModelVersion, timer: StageTimer) -> LoadedModel:
+        """Запускает пул с моделью версии и прогревает его; при ошибке пул останавливается"""
+        executor = self.executor_factory(version)
+        try:
+            self.state = "loading"
+            with timer.measure("model"):
+                await asyncio.to_thread(executor.start)
+            if self.warmup_fn is not None:
+                self.state = "warming_up"
+                with timer.measure("warmup"):
+                    await self.warmup_fn(executor)
+        except BaseException:
+            await asyncio.to_thread(executor.stop)
+            raise
+        return LoadedModel(version=version, executor=executor)
+
+    async def start(self, timer: StageTimer | None = None):
+        """Загрузка версии при старте приложения (закреплённой или последней)"""
+        timer = timer or StageTimer()
+        await self.scan()
+        version = self.find()
+        self.target = version
+        try:
+            self.active = await self._load(version, timer)
+        finally:
+            self.state = "idle"
+            self.target = None
+        self.history.append(self._history_entry(None, version, "started", timer))
+        logger.info(f"Model version {version.version} is active ({version.checkpoint_path.name})")
+
+    def activate(self, version: str | None = None) -> ModelVersion:
+        """
+        Запускает фоновое переключение на версию (по умолчанию — последнюю в каталоге)
+        и сразу возвращает её. Каталог должен быть заранее просканирован (scan).
+        """
+        if self._swap_task is not None and not self._swap_task.done():
+            raise ModelSwapError(409, f"Another model switch is in progress (state: {self.state})")
+        # Без явной версии — последняя в каталоге, даже если при старте была закреплена другая
+        target = self.versions[-1] if version is None and self.versions else self.find(version)
+        if self.active is not None and target == self.active.version:
+            raise ModelSwapError(409, f"Model version {target.version} is already active")
+        self.target = target
+        self.error = None
+        self.state = "loading"
+        self._swap_task = asyncio.create_task(self._swap(target))
+        return target
+
+    async def _swap(self, version: ModelVersion):
+        timer = StageTimer()
+        previous = self.active
+        try:
+            loaded = await self._load(version, timer)
+        except asyncio.CancelledError:
+            self.state = "idle"
+            raise
+        except Exception as e:
+            self.error = f"{type(e).__name__}: {e}"
+            self.state = "idle"
+            self.target = None
+            self.history.append(self._history_entry(previous, version, "failed", timer))
+            logger.exception(f"Failed to load model version {version.version}, keeping the active version")
+            return
+
+        # Переключение: батчи, которые ещё не ушли в пул, пойдут в новую версию
+        self.active = loaded
+        self.target = None
+        logger.info(f"Model version {version.version} is active ({version.checkpoint_path.name})")
+        if previous is not None:
+            self.state = "draining"
+            self._draining.append(previous)
+            with timer.measure("drain"):
+                await self._drain(previous)
+        self.state = "idle"
+        self.history.append(self._history_entry(previous, version, "activated", timer))
+
+    async def _drain(self, loaded: LoadedModel):
+        # Пул не останавливается с батчами в работе: их запросы получили бы ошибку вместо ответа
+        deadline = time.monotonic() + self.drain_timeout_s
+        warned = False
+        while loaded.in_flight > 0:
+            if not warned and time.monotonic() >= deadline:
+                logger.warning(
+                    f"Model version {loaded.version.version} still has {loaded.in_flight} batches "
+                    f"after {self.drain_timeout_s} s, waiting for them to finish"
+                )
+                warned = True
+            await asyncio.sleep(0.05)
+        # После stop() пул не держит ссылок на модель: веса освобождаются здесь
+        await asyncio.to_thread(loaded.executor.stop)
+        self._draining.remove(loaded)
+        gc.collect()
+
+    async def predict(
+        self,
+        images: list[np.ndarray],
+        full_resolution: list[bool] | None = None
+    ) -> tuple[BatchPrediction, ModelVersion]:
+        """Батч через пул активной версии: вероятности и версия, которая их посчитала"""
+        loaded = self.active
+        if loaded is None:
+            raise RuntimeError("No model version is loaded")
+        # Счётчик увеличивается до первого await: переключение не остановит пул с этим батчем
+        loaded.in_flight += 1
+        try:
+            return await loaded.executor.predict(images, full_resolution), loaded.version
+        finally:
+            loaded.in_flight -= 1
+
+    async def stop(self):
+        if self._swap_task is not None and not self._swap_task.done():
+            self._swap_task.cancel()
+            await asyncio.gather(self._swap_task, return_exceptions=True)
+        for loaded in self._loaded():
+            await asyncio.to_thread(loaded.executor.stop)
+        self.active = None
+        self._draining = []
+
+    def _history_entry(
+        self,
+        previous: LoadedModel | None,
+        version: ModelVersion,
+        status: str,
+        timer: StageTimer
+    ) -> dict:
+        return {
+            "time": datetime.now().isoformat(timespec="seconds"),
+            "from_version": previous.version.version if previous is not None else None,
+            "to_version": version.version,
+            "status": status,
+            "error": self.error if status == "failed" else None,
+            "stages_ms": timer.as_ms(),
+        }
+
+    def stats(self) -> dict:
+        active = self.version
+        return {
+            "active": {
+                **active.as_dict(),
+                "loaded_at": datetime.fromtimestamp(self.active.loaded_at).isoformat(timespec="seconds"),
+                "in_flight_batches": self.active.in_flight,
+            } if active is not None else None,
+            "state": self.state,
+            "target": self.target.version if self.target is not None else None,
+            "error": self.error,
+            "pinned_version": self.pinned_version,
+            "draining": [
+                {"version": loaded.version.version, "in_flight_batches": loaded.in_flight}
+                for loaded in self._draining
+            ],
+            "versions": [
+                {**version.as_dict(), "active": version == active}
+                for version in self.versions
+            ],
+            "history": list(self.history),
+        }
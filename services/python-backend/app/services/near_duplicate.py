@@ -0,0 +1,110 @@
+import threading
+from collections import OrderedDict
+
+from PIL import Image
+
+from services.decoding import ImageSource, open_image
+
+
+HASH_BITS = 64
+
+
+def compute_dhash(image_data: ImageSource, hash_size: int = 8) -> int:
+    """
+    Разностный перцептивный хеш (dHash): изображение сжимается до (hash_size + 1) x hash_size
+    в оттенках серого, каждый бит — сравнение соседних пикселей по горизонтали.
+    Для JPEG декодер сразу уменьшает картинку (draft), поэтому хеш дешевле полного декодирования.
+    Перекодирование и изменение размера фотографии меняют лишь несколько бит.
+    """
+    with open_image(image_data) as image:
+        image.draft('L', (hash_size * 8, hash_size * 8))
+        small = image.convert('L').resize((hash_size + 1, hash_size), Image.Resampling.BILINEAR)
+        pixels = small.tobytes()
+    value = 0
+    for row in range(hash_size):
+        offset = row * (hash_size + 1)
+        for col in range(hash_size):
+            value = (value << 1) | (pixels[offset + col] > pixels[offset + col + 1])
+    return value
+
+
+class NearDuplicateIndex:
+    """
+    Индекс перцептивных хешей с поиском по расстоянию Хэмминга (multi-index hashing).
+
+    64-битный хеш делится на max_distance + 1 непересекающихся кусков: по принципу
+    Дирихле хеш на расстоянии <= max_distance совпадает с запросом хотя бы в одном
+    куске, поэтому кандидаты берутся из точных совпадений кусков и проверяются
+    полным расстоянием. Записи вытесняются по LRU при превышении max_entries.
+    """
+
+    def __init__(self, max_distance: int = 4, max_entries: int = 100000):
+        if not 0 <= max_distance < HASH_BITS:
+            raise ValueError(f"max_distance must be in [0, {HASH_BITS})")
+
+        self.max_distance = max_distance
+        self.max_entries = max_entries
+
+        num_chunks = max_distance + 1
+        bounds = [round(i * HASH_BITS / num_chunks) for i in range(num_chunks + 1)]
+        self._chunks = [(start, end - start) for start, end in zip(bounds, bounds[1:])]
+        self._tables: list[dict[int, set[int]]] = [{} for _ in self._chunks]
+        # hash -> (ключ модели, результат); одинаковые хеши хранятся один раз
+        self._entries: OrderedDict[int, tuple[str, dict]] = OrderedDict()
+        self._lock = threading.Lock()
+
+        self.lookups = 0
+        self.hits = 0
+
+    def _chunk_values(self, image_hash: int) -> list[int]:
+        return [(image_hash >> start) & ((1 << width) - 1) for start, width in self._chunks]
+
+    def find(self, image_hash: int, model_key: str) -> dict | None:
+        """Ближайший сохранённый результат той же модели в пределах max_distance"""
+        with self._lock:
+            self.lookups += 1
+            best_result, best_distance = None, self.max_distance + 1
+            for table, chunk in zip(self._tables, self._chunk_values(image_hash)):
+                for candidate in table.get(chunk, ()):
+                    distance = (candidate ^ image_hash).bit_count()
+                    if distance >= best_distance:
+                        continue
+                    candidate_model_key, result = self._entries[candidate]
+                    if candidate_model_key == model_key:
+                        best_result, best_distance = (candidate, result), distance
+            if best_result is None:
+                return None
+            candidate, result = best_result
+            self._entries.move_to_end(candidate)
+            self.hits += 1
+            return result
+
+    def add(self, image_hash: int, model_key: str, result: dict):
+        with self._lock:
+            if image_hash in self._entries:
+                self._entries[image_hash] = (model_key, result)
+                self._entries.move_to_end(image_hash)
+                return
+            self._entries[image_hash] = (model_key, result)
+            for table, chunk in zip(self._tables, self._chunk_values(image_hash)):
+                table.setdefault(chunk, set()).add(image_hash)
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+
+    def _remove(self, image_hash: int):
+        del self._entries[image_hash]
+        for table, chunk in zip(self._tables, self._chunk_values(image_hash)):
+            bucket = table[chunk]
+            bucket.discard(image_hash)
+            if not bucket:
+                del table[chunk]
+
+    def stats(self) -> dict:
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "max_distance": self.max_distance,
+            "lookups": self.lookups,
+            "hits": self.hits,
+            "hit_rate": round(self.hits / self.lookups, 4) if self.lookups else 0.0,
+        }
@@ -0,0 +1,103 @@
+import numpy as np
+
+from pydantic_models import ClassificationResult, CompactClassificationResult
+
+
+CONFIDENCE_DECIMALS = 4
+
+
+class BatchPostprocessor:
+    """
+    Векторная постобработка матрицы вероятностей (N, num_classes).
+
+    argmax, выбор top-k и округление выполняются одной операцией над всей матрицей,
+    в Python-списки она переводится один раз через tolist(). Результаты создаются
+    через model_construct — без валидации pydantic, поля уже имеют нужные типы.
+    """
+
+    def __init__(self, class_names: list[str], decimals: int = CONFIDENCE_DECIMALS):
+        self.class_names = list(class_names)
+        self.decimals = decimals
+        self._class_array = np.array(self.class_names, dtype=object)
+
+    def _summarize(self, probabilities: np.ndarray) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        # float64 до округления: тогда числа в JSON совпадают с round(float(p), 4)
+        probabilities = np.asarray(probabilities, dtype=np.float64)
+        predicted = probabilities.argmax(axis=1)
+        rounded = probabilities.round(self.decimals)
+        top_confidences = rounded[np.arange(len(rounded)), predicted]
+        return rounded, predicted, top_confidences
+
+    def _top_k_indices(self, probabilities: np.ndarray, top_k: int) -> np.ndarray:
+        """Индексы top_k классов каждой строки по убыванию вероятности"""
+        top_k = min(top_k, probabilities.shape[1])
+        indices = np.argpartition(-probabilities, top_k - 1, axis=1)[:, :top_k]
+        order = np.take_along_axis(probabilities, indices, axis=1).argsort(axis=1)[:, ::-1]
+        return np.take_along_axis(indices, order, axis=1)
+
+    def build_results(
+        self,
+        probabilities: np.ndarray,
+        image_names: list[str],
+        top_k: int | None = None
+    ) -> list[ClassificationResult]:
+        """Результаты в исходной схеме; top_k оставляет в class_confidences только k лучших классов"""
+        if len(image_names) == 0:
+            return []
+        rounded, predicted, top_confidences = self._summarize(probabilities)
+        predicted_classes = self._class_array[predicted].tolist()
+        top_confidences = top_confidences.tolist()
+        if top_k is None:
+            confidences = [dict(zip(self.class_names, row)) for row in rounded.tolist()]
+        else:
+            indices = self._top_k_indices(rounded, top_k)
+            classes = self._class_array[indices].tolist()
+            values = np.take_along_axis(rounded, indices, axis=1).tolist()
+            confidences = [dict(zip(names, row)) for names, row in zip(classes, values)]
+        return [
+            ClassificationResult.model_construct(
+                predicted_class=predicted_class,
+                top_confidence=top_confidence,
+                class_confidences=class_confidences,
+                image_name=image_name,
+                error=None
+            )
+            for predicted_class, top_confidence, class_confidences, image_name
+            in zip(predicted_classes, top_confidences, confidences, image_names)
+        ]
+
+    def build_compact_results(
+        self,
+        probabilities: np.ndarray,
+        image_names: list[str],
+        top_k: int | None = None
+    ) -> list[CompactClassificationResult]:
+        """
+        Компактные результаты: вероятности — массив в порядке meta.class_names,
+        а при top_k — только k лучших классов и их вероятности.
+        """
+        if len(image_names) == 0:
+            return []
+        rounded, predicted, top_confidences = self._summarize(probabilities)
+        predicted_classes = self._class_array[predicted].tolist()
+        top_confidences = top_confidences.tolist()
+        if top_k is None:
+            rows = rounded.tolist()
+            top_classes = [None] * len(rows)
+        else:
+            indices = self._top_k_indices(rounded, top_k)
+            rows = np.take_along_axis(rounded, indices, axis=1).tolist()
+            top_classes = self._class_array[indices].tolist()
+        return [
+            CompactClassificationResult.model_construct(
+                image_name=image_name,
+                predicted_class=predicted_class,
+                top_confidence=top_confidence,
+                probabilities=row if top_k is None else None,
+                top_classes=classes,
+                top_probabilities=row if top_k is not None else None,
+                error=None
+            )
+            for image_name, predicted_class, top_confidence, row, classes
+            in zip(image_names, predicted_classes, top_confidences, rows, top_classes)
+        ]
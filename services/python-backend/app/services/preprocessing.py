@@ -0,0 +1,67 @@
+import threading
+
+import numpy as np
+import torch
+from PIL import Image
+
+
+IMAGENET_MEAN = (0.485, 0.456, 0.406)
+IMAGENET_STD = (0.229, 0.224, 0.225)
+
+
+class BatchPreprocessor:
+    """
+    Препроцессинг батча без лишних копий.
+
+    Каждое изображение приводится к img_size x img_size в uint8 (resize в PIL),
+    затем весь батч записывается в заранее выделенный буфер (channels-last) и
+    одной векторной операцией переводится во float с нормализацией mean/std —
+    результат совпадает с Resize + ToTensor + Normalize из get_inference_transforms.
+
+    Буферы свои у каждого потока (слота инференса) и переиспользуются между вызовами:
+    тензор из to_batch действителен до следующего вызова to_batch в том же потоке.
+    """
+
+    def __init__(
+        self,
+        img_size: int = 448,
+        max_batch_size: int = 16,
+        mean: tuple[float, ...] = IMAGENET_MEAN,
+        std: tuple[float, ...] = IMAGENET_STD
+    ):
+        self.img_size = img_size
+        self.max_batch_size = max_batch_size
+        # (x / 255 - mean) / std == (x - 255 * mean) * (1 / (255 * std))
+        self._shift = torch.tensor([255 * m for m in mean]).view(1, 3, 1, 1)
+        self._scale = torch.tensor([1 / (255 * s) for s in std]).view(1, 3, 1, 1)
+        self._local = threading.local()
+
+    def resize(self, image: Image.Image) -> np.ndarray:
+        """RGB-изображение -> массив uint8 (img_size, img_size, 3)"""
+        if image.size != (self.img_size, self.img_size):
+            image = image.resize((self.img_size, self.img_size), Image.Resampling.BILINEAR)
+        return np.asarray(image, dtype=np.uint8)
+
+    def _buffers(self, batch_size: int) -> tuple[np.ndarray, torch.Tensor]:
+        capacity = getattr(self._local, "capacity", 0)
+        if batch_size > capacity:
+            capacity = max(batch_size, self.max_batch_size)
+            size = self.img_size
+            self._local.pixels = np.empty((capacity, size, size, 3), dtype=np.uint8)
+            self._local.inputs = torch.empty(
+                (capacity, 3, size, size), dtype=torch.float32, memory_format=torch.channels_last
+            )
+            self._local.capacity = capacity
+        return self._local.pixels, self._local.inputs
+
+    def to_batch(self, images: list[np.ndarray]) -> torch.Tensor:
+        """Список массивов uint8 (H, W, 3) -> нормализованный батч float32 (N, 3, H, W) в channels-last"""
+        pixels, inputs = self._buffers(len(images))
+        pixels = pixels[:len(images)]
+        for i, image in enumerate(images):
+            pixels[i] = image
+        batch = inputs[:len(images)]
+        # NHWC uint8 -> NCHW-представление того же порядка памяти: копия с приведением типа без перестановки
+        batch.copy_(torch.from_numpy(pixels).permute(0, 3, 1, 2))
+        batch.sub_(self._shift).mul_(self._scale)
+        return batch
@@ -0,0 +1,179 @@
+import hashlib
+import json
+import logging
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from services.decoding import ImageSource
+
+
+logger = logging.getLogger(f"uvicorn.{__name__}")
+
+
+def content_digest(image_data: ImageSource) -> str:
+    """Хеш исходных байтов загрузки; файловый объект хешируется по частям, без чтения целиком в память"""
+    if isinstance(image_data, bytes):
+        return hashlib.blake2b(image_data, digest_size=20).hexdigest()
+    image_data.seek(0)
+    return hashlib.file_digest(image_data, lambda: hashlib.blake2b(digest_size=20)).hexdigest()
+
+
+def make_cache_key(image_data: ImageSource, model_key: str) -> str:
+    """Ключ кеша: хеш исходных байтов загрузки плюс модель (бэкбон и версия), выдавшая результат"""
+    return f"{model_key}:{content_digest(image_data)}"
+
+
+class ResultCache:
+    """
+    Кеш результатов классификации с адресацией по содержимому.
+
+    Первый уровень — LRU в памяти, ограниченный числом записей и суммарным
+    размером; второй (опциональный) — SQLite-файл, переживающий перезапуск.
+    Обращения к SQLite блокирующие: чтение (get_disk) выполняется в пуле потоков
+    вызывающего кода, запись — в собственном потоке записи.
+    Значения — сериализованные в JSON поля ClassificationResult без имени файла.
+    Записи старше ttl_s считаются отсутствующими (0 — без ограничения).
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 10000,
+        max_bytes: int = 64 * 1024 * 1024,
+        ttl_s: float = 0,
+        sqlite_path: Path | None = None
+    ):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl_s = ttl_s
+        self.sqlite_path = sqlite_path
+
+        self._memory: OrderedDict[str, tuple[str, float]] = OrderedDict()
+        self._memory_bytes = 0
+        self._lock = threading.Lock()
+        # Файл открывается при первом обращении, а не при импорте роутера в процессах пула
+        self._db: sqlite3.Connection | None = None
+        self._db_lock = threading.Lock()
+        # Один поток записи в SQLite: put не ждёт диск, записи идут по порядку
+        self._writer = ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix="result-cache-writer"
+        ) if sqlite_path is not None else None
+
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    def _get_db(self) -> sqlite3.Connection:
+        if self._db is not None:
+            return self._db
+        self.sqlite_path.parent.mkdir(parents=True, exist_ok=True)
+        db = sqlite3.connect(str(self.sqlite_path), check_same_thread=False, isolation_level=None)
+        db.execute("PRAGMA journal_mode=WAL")
+        db.execute("PRAGMA synchronous=NORMAL")
+        db.execute(
+            "CREATE TABLE IF NOT EXISTS results ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, created_at REAL NOT NULL)"
+        )
+        logger.info(f"Result cache disk tier: {self.sqlite_path}")
+        self._db = db
+        return db
+
+    def _is_expired(self, created_at: float) -> bool:
+        return self.ttl_s > 0 and time.time() - created_at > self.ttl_s
+
+    @property
+    def has_disk_tier(self) -> bool:
+        return self.sqlite_path is not None
+
+    def get_memory(self, key: str) -> dict | None:
+        """Поиск в памяти — быстрый, его можно вызывать прямо из обработчика запроса"""
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                value, created_at = entry
+                if not self._is_expired(created_at):
+                    self._memory.move_to_end(key)
+                    self.hits += 1
+                    return json.loads(value)
+                self._evict(key)
+            if not self.has_disk_tier:
+                self.misses += 1
+            return None
+
+    def get_disk(self, key: str) -> dict | None:
+        """Поиск в SQLite после промаха в памяти; блокирующий — вызывается в пуле потоков"""
+        with self._db_lock:
+            db = self._get_db()
+            row = db.execute("SELECT value, created_at FROM results WHERE key = ?", (key,)).fetchone()
+            if row is not None and self._is_expired(row[1]):
+                db.execute("DELETE FROM results WHERE key = ?", (key,))
+                row = None
+        with self._lock:
+            if row is None:
+                self.misses += 1
+                return None
+            value, created_at = row
+            self._put_memory(key, value, created_at)
+            self.hits += 1
+            self.disk_hits += 1
+        return json.loads(value)
+
+    def put(self, key: str, result: dict):
+        """Запись в память сразу; в SQLite — в отдельном потоке записи, не дожидаясь её"""
+        value = json.dumps(result, separators=(",", ":"))
+        created_at = time.time()
+        with self._lock:
+            self._put_memory(key, value, created_at)
+        if self._writer is not None:
+            self._writer.submit(self._put_disk, key, value, created_at)
+
+    def _put_disk(self, key: str, value: str, created_at: float):
+        try:
+            with self._db_lock:
+                self._get_db().execute(
+                    "INSERT OR REPLACE INTO results (key, value, created_at) VALUES (?, ?, ?)",
+                    (key, value, created_at)
+                )
+        except Exception as e:
+            logger.error(f"Result cache disk write failed: {str(e)}")
+
+    def _put_memory(self, key: str, value: str, created_at: float):
+        if key in self._memory:
+            self._evict(key)
+        self._memory[key] = (value, created_at)
+        self._memory_bytes += len(key) + len(value)
+        while self._memory and (
+            len(self._memory) > self.max_entries or self._memory_bytes > self.max_bytes
+        ):
+            self._evict(next(iter(self._memory)))
+
+    def _evict(self, key: str):
+        value, _ = self._memory.pop(key)
+        self._memory_bytes -= len(key) + len(value)
+
+    def close(self):
+        # Сначала дописываются отложенные записи
+        if self._writer is not None:
+            self._writer.shutdown(wait=True)
+            self._writer = None
+        if self._db is not None:
+            self._db.close()
+            self._db = None
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._memory),
+            "memory_bytes": self._memory_bytes,
+            "max_entries": self.max_entries,
+            "max_bytes": self.max_bytes,
+            "ttl_s": self.ttl_s,
+            "disk_tier": str(self.sqlite_path) if self.sqlite_path else None,
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
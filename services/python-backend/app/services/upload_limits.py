@@ -0,0 +1,89 @@
+import logging
+
+from fastapi.responses import JSONResponse
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from services.metrics import REJECTED_REQUESTS
+
+
+logger = logging.getLogger(f"uvicorn.{__name__}")
+
+
+class FileTooLargeError(ValueError):
+    """Файл запроса больше MAX_FILE_BYTES — он не читается и не декодируется"""
+
+
+class _BodyTooLarge(Exception):
+    pass
+
+
+class RequestSizeLimitMiddleware:
+    """
+    Ограничение размера тела запроса для эндпоинтов загрузки (ASGI-middleware).
+
+    Если Content-Length больше max_body_bytes, ответ 413 отправляется сразу, тело не
+    читается. Иначе (и для chunked-запросов без Content-Length) байты считаются по
+    мере поступления: как только лимит превышен, чтение прекращается и вместо ответа
+    приложения (ошибки разбора тела) отправляется 413. Файлы multipart до этого момента
+    лежат в спуле UploadFile, поэтому память не растёт на весь размер запроса.
+    """
+
+    def __init__(self, app: ASGIApp, max_body_bytes: int, paths: tuple[str, ...]):
+        self.app = app
+        self.max_body_bytes = max_body_bytes
+        self.paths = paths
+
+    def _reject(self, scope: Scope) -> JSONResponse:
+        REJECTED_REQUESTS.labels(scope["path"].strip("/"), "request_too_large").inc()
+        return JSONResponse(
+            status_code=413,
+            content={"detail": f"Request body is larger than {self.max_body_bytes} bytes"}
+        )
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http" or not self.max_body_bytes or scope["path"] not in self.paths:
+            await self.app(scope, receive, send)
+            return
+
+        headers = dict(scope["headers"])
+        content_length = headers.get(b"content-length")
+        if content_length is not None and content_length.isdigit() and int(content_length) > self.max_body_bytes:
+            await self._reject(scope)(scope, receive, send)
+            return
+
+        received = 0
+        exceeded = False
+        response_started = False
+
+        async def limited_receive() -> Message:
+            nonlocal received, exceeded
+            if exceeded:
+                return {"type": "http.disconnect"}
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_body_bytes:
+                    exceeded = True
+                    raise _BodyTooLarge()
+            return message
+
+        async def guarded_send(message: Message):
+            nonlocal response_started
+            # После превышения лимита ответ приложения (обычно 400 от разбора тела) подменяется на 413
+            if exceeded:
+                return
+            if message["type"] == "http.response.start":
+                response_started = True
+            await send(message)
+
+        try:
+            await self.app(scope, limited_receive, guarded_send)
+        except Exception:
+            # _BodyTooLarge или ошибка, в которую его обернул разбор тела
+            if not exceeded:
+                raise
+        if exceeded:
+            if response_started:
+                logger.warning(f"Request body limit exceeded after the response started: {scope['path']}")
+                return
+            await self._reject(scope)(scope, receive, send)
@@ -0,0 +1,370 @@
+import json
+import logging
+import threading
+import time
+from collections import deque
+from pathlib import Path
+
+import numpy as np
+
+
+logger = logging.getLogger(f"uvicorn.{__name__}")
+
+
+VECTOR_DTYPES = ("float32", "float16", "int8")
+
+
+class VectorIndex:
+    """
+    Индекс эмбеддингов для поиска похожих интерьеров по косинусной близости.
+
+    Векторы нормируются и хранятся сжатыми (float16 или int8 с масштабом на вектор)
+    в файлах каталога path, отображённых в память (np.memmap): индекс на миллионы
+    векторов не загружается в RAM целиком и переживает перезапуск. Файлы растут
+    удвоением ёмкости. id уникален: повторное добавление перезаписывает вектор.
+
+    Пока nlist == 0 или векторов меньше, чем нужно для обучения, поиск — полный
+    перебор блоками по chunk_rows векторов. При nlist > 0, как только накоплено
+    train_size векторов, строятся nlist центроидов (сферический k-means по выборке),
+    и дальше поиск идёт только по nprobe ближайшим к запросу спискам (IVF).
+    """
+
+    def __init__(
+        self,
+        path: Path,
+        dtype: str = "float16",
+        nlist: int = 0,
+        nprobe: int = 8,
+        train_size: int = 0,
+        chunk_rows: int = 65536,
+        seed: int = 0
+    ):
+        if dtype not in VECTOR_DTYPES:
+            raise ValueError(f"dtype must be one of {VECTOR_DTYPES}")
+        self.path = path
+        self.dtype = dtype
+        self.nlist = nlist
+        self.nprobe = nprobe
+        # Для обучения нужно заметно больше векторов, чем центроидов
+        self.train_size = train_size or nlist * 64
+        self.chunk_rows = chunk_rows
+        self.seed = seed
+
+        self.dim: int | None = None
+        self.count = 0
+        self._capacity = 0
+        self._ids: list[str] = []
+        self._rows: dict[str, int] = {}
+        self._vectors: np.memmap | None = None
+        self._scales: np.memmap | None = None  # только для int8
+        self._assign: np.memmap | None = None  # номер IVF-списка каждого вектора
+        self._centroids: np.ndarray | None = None
+        self._lists: list[list[int]] = []
+        self._ids_file = None
+        self._lock = threading.Lock()
+
+        self.searches = 0
+        self._search_ms: deque[float] = deque(maxlen=1000)
+
+    @property
+    def trained(self) -> bool:
+        return self._centroids is not None
+
+    # ------------------------------------------------------------------ хранение
+
+    def open(self):
+        """Открывает сохранённый индекс (если есть) — векторы остаются на диске"""
+        with self._lock:
+            self.path.mkdir(parents=True, exist_ok=True)
+            meta_file = self.path / "meta.json"
+            if meta_file.exists():
+                meta = json.loads(meta_file.read_text())
+                if meta["dtype"] != self.dtype:
+                    raise ValueError(f"Index {self.path} stores {meta['dtype']} vectors, configured {self.dtype}")
+                self.dim = meta["dim"]
+                self.count = meta["count"]
+                self._map_files(meta["capacity"])
+                with open(self.path / "ids.jsonl", encoding="utf-8") as f:
+                    # Строки после count — от прерванной записи, они будут перезаписаны
+                    self._ids = [json.loads(line) for line, _ in zip(f, range(self.count))]
+                self._rows = {vector_id: row for row, vector_id in enumerate(self._ids)}
+                self._open_centroids(meta.get("nlist"))
+            self._ids_file = open(self.path / "ids.jsonl", "r+" if self.count else "w", encoding="utf-8")
+            if self.count:
+                # Оставляем ровно count строк: хвост от прерванной записи отбрасывается
+                for _ in range(self.count):
+                    self._ids_file.readline()
+                self._ids_file.truncate()
+            if self.nlist and not self.trained and self.count >= self.train_size:
+                # Центроиды сброшены (nlist изменился) или ещё не строились — обучаем по сохранённым векторам
+                self._train()
+                self._save_meta()
+        logger.info(
+            f"Vector index opened ({self.count} vectors, dtype={self.dtype}, "
+            f"mode={'ivf' if self.trained else 'flat'}, path={self.path})"
+        )
+
+    def _open_centroids(self, saved_nlist: int | None):
+        """
+        Центроиды годятся, только если индекс сохранён с тем же nlist: иначе списки assign.bin
+        не соответствуют центроидам (а при nlist == 0 новые векторы в списки не попадали).
+        Неподходящие центроиды удаляются, open() обучит новые.
+        """
+        centroids_file = self.path / "centroids.npy"
+        if not centroids_file.exists():
+            return
+        centroids = np.load(centroids_file)
+        # Индексы, сохранённые до появления nlist в meta.json, были обучены с nlist == числу центроидов
+        if saved_nlist is None:
+            saved_nlist = len(centroids)
+        if self.nlist and saved_nlist == self.nlist == len(centroids):
+            self._centroids = centroids
+            self._rebuild_lists()
+            return
+        logger.warning(
+            f"Index {self.path} was saved with nlist={saved_nlist}, configured nlist={self.nlist}: "
+            f"dropping its centroids"
+        )
+        centroids_file.unlink()
+
+    def close(self):
+        with self._lock:
+            self._flush()
+            if self._ids_file is not None:
+                self._ids_file.close()
+                self._ids_file = None
+            self._vectors = self._scales = self._assign = None
+
+    def _row_dtype(self) -> np.dtype:
+        return np.dtype(self.dtype)
+
+    def _map(self, name: str, dtype: np.dtype, shape: tuple[int, ...]) -> np.memmap:
+        file = self.path / name
+        size = int(np.prod(shape)) * dtype.itemsize
+        with open(file, "ab") as f:
+            if f.tell() < size:
+                f.truncate(size)
+        return np.memmap(file, dtype=dtype, mode="r+", shape=shape)
+
+    def _map_files(self, capacity: int):
+        self._flush()
+        self._vectors = self._map("vectors.bin", self._row_dtype(), (capacity, self.dim))
+        if self.dtype == "int8":
+            self._scales = self._map("scales.bin", np.dtype(np.float32), (capacity,))
+        if self.nlist:
+            self._assign = self._map("assign.bin", np.dtype(np.int32), (capacity,))
+        self._capacity = capacity
+
+    def _ensure_capacity(self, rows: int):
+        if rows > self._capacity:
+            self._map_files(max(rows, self._capacity * 2, 1024))
+
+    def _flush(self):
+        for array in (self._vectors, self._scales, self._assign):
+            if array is not None:
+                array.flush()
+
+    def _save_meta(self):
+        self._flush()
+        self._ids_file.flush()
+        meta = {
+            "dim": self.dim,
+            "dtype": self.dtype,
+            "nlist": self.nlist,
+            "count": self.count,
+            "capacity": self._capacity
+        }
+        tmp_file = self.path / "meta.json.tmp"
+        tmp_file.write_text(json.dumps(meta))
+        tmp_file.replace(self.path / "meta.json")
+
+    # --------------------------------------------------------------- кодирование
+
+    @staticmethod
+    def _normalize(vectors: np.ndarray) -> np.ndarray:
+        vectors = np.asarray(vectors, dtype=np.float32)
+        norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+        return vectors / np.maximum(norms, 1e-12)
+
+    def _encode(self, vectors: np.ndarray) -> tuple[np.ndarray, np.ndarray | None]:
+        if self.dtype != "int8":
+            return vectors.astype(self.dtype), None
+        scales = np.maximum(np.abs(vectors).max(axis=1), 1e-12) / 127
+        return np.round(vectors / scales[:, None]).astype(np.int8), scales.astype(np.float32)
+
+    def _decode(self, rows) -> np.ndarray:
+        vectors = self._vectors[rows].astype(np.float32)
+        if self._scales is not None:
+            vectors *= self._scales[rows][..., None]
+        return vectors
+
+    def _scores(self, rows, query: np.ndarray) -> np.ndarray:
+        scores = self._vectors[rows].astype(np.float32) @ query
+        if self._scales is not None:
+            scores *= self._scales[rows]
+        return scores
+
+    # ------------------------------------------------------------------- запись
+
+    def add(self, ids: list[str], vectors: np.ndarray) -> int:
+        """Добавляет (или перезаписывает по id) векторы; возвращает их число"""
+        if not ids:
+            return 0
+        # Повторы id внутри вызова: остаётся последний вектор
+        positions = {vector_id: i for i, vector_id in enumerate(ids)}
+        ids = list(positions)
+        vectors = self._normalize(np.asarray(vectors)[list(positions.values())])
+        with self._lock:
+            if self.dim is None:
+                self.dim = vectors.shape[1]
+            elif vectors.shape[1] != self.dim:
+                raise ValueError(f"Expected vectors of dimension {self.dim}, got {vectors.shape[1]}")
+            rows = []
+            new_ids = []
+            replaced = set()
+            for vector_id in ids:
+                row = self._rows.get(vector_id)
+                if row is None:
+                    row = self.count + len(new_ids)
+                    new_ids.append(vector_id)
+                    self._rows[vector_id] = row
+                else:
+                    replaced.add(row)
+                rows.append(row)
+            self._ensure_capacity(self.count + len(new_ids))
+
+            rows = np.asarray(rows)
+            encoded, scales = self._encode(vectors)
+            self._vectors[rows] = encoded
+            if scales is not None:
+                self._scales[rows] = scales
+            for vector_id in new_ids:
+                self._ids_file.write(json.dumps(vector_id, ensure_ascii=False) + "\n")
+            self._ids.extend(new_ids)
+            self.count += len(new_ids)
+
+            if self.trained:
+                self._assign_rows(rows, vectors, replaced)
+            elif self.nlist and self.count >= self.train_size:
+                self._train()
+            self._save_meta()
+        return len(ids)
+
+    # --------------------------------------------------------------------- IVF
+
+    def _assign_rows(self, rows: np.ndarray, vectors: np.ndarray, replaced: set[int]):
+        lists = np.argmax(vectors @ self._centroids.T, axis=1).astype(np.int32)
+        for row, list_id in zip(rows.tolist(), lists.tolist()):
+            if row in replaced:
+                # Перезаписанный вектор уходит из прежнего списка
+                self._lists[self._assign[row]].remove(row)
+            self._lists[list_id].append(row)
+        self._assign[rows] = lists
+
+    def _train(self):
+        """Сферический k-means по выборке векторов, затем распределение всех векторов по спискам"""
+        start = time.perf_counter()
+        rng = np.random.default_rng(self.seed)
+        sample_rows = np.sort(rng.choice(self.count, size=min(self.count, self.nlist * 64), replace=False))
+        sample = self._normalize(self._decode(sample_rows))
+        centroids = sample[rng.choice(len(sample), size=self.nlist, replace=False)]
+        for _ in range(10):
+            labels = np.argmax(sample @ centroids.T, axis=1)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, labels, sample)
+            # Пустые списки получают случайные векторы выборки
+            empty = np.bincount(labels, minlength=self.nlist) == 0
+            sums[empty] = sample[rng.integers(len(sample), size=int(empty.sum()))]
+            centroids = self._normalize(sums)
+        self._centroids = centroids.astype(np.float32)
+        np.save(self.path / "centroids.npy", self._centroids)
+
+        for begin in range(0, self.count, self.chunk_rows):
+            end = min(begin + self.chunk_rows, self.count)
+            vectors = self._normalize(self._decode(slice(begin, end)))
+            self._assign[begin:end] = np.argmax(vectors @ self._centroids.T, axis=1)
+        self._rebuild_lists()
+        logger.info(
+            f"Vector index trained: {self.nlist} lists over {self.count} vectors "
+            f"in {time.perf_counter() - start:.1f} s"
+        )
+
+    def _rebuild_lists(self):
+        self._lists = [[] for _ in range(self.nlist)]
+        for row, list_id in enumerate(self._assign[:self.count].tolist()):
+            self._lists[list_id].append(row)
+
+    # -------------------------------------------------------------------- поиск
+
+    def get(self, vector_id: str) -> np.ndarray | None:
+        with self._lock:
+            row = self._rows.get(vector_id)
+            return None if row is None else self._decode(row)
+
+    def search(
+        self,
+        query: np.ndarray,
+        top_k: int = 10,
+        nprobe: int | None = None,
+        exclude_id: str | None = None
+    ) -> list[tuple[str, float]]:
+        """top_k ближайших векторов: пары (id, косинусная близость) по убыванию близости"""
+        start = time.perf_counter()
+        query = self._normalize(query)
+        exclude_row = None
+        with self._lock:
+            if self.count == 0:
+                return []
+            if query.shape[0] != self.dim:
+                raise ValueError(f"Expected a query of dimension {self.dim}, got {query.shape[0]}")
+            if exclude_id is not None:
+                exclude_row = self._rows.get(exclude_id)
+            # Один лишний кандидат на случай, если исключаемый вектор окажется среди лучших
+            k = top_k + (exclude_row is not None)
+
+            if self.trained:
+                probes = np.argsort(self._centroids @ query)[::-1][:nprobe or self.nprobe]
+                rows = np.sort(np.concatenate([np.asarray(self._lists[list_id], dtype=np.int64) for list_id in probes]))
+                candidates = [(rows, self._scores(rows, query))] if len(rows) else []
+            else:
+                candidates = []
+                for begin in range(0, self.count, self.chunk_rows):
+                    end = min(begin + self.chunk_rows, self.count)
+                    scores = self._scores(slice(begin, end), query)
+                    best = np.argpartition(-scores, min(k, len(scores)) - 1)[:k]
+                    candidates.append((best + begin, scores[best]))
+
+            if not candidates:
+                return []
+            rows = np.concatenate([rows for rows, _ in candidates])
+            scores = np.concatenate([scores for _, scores in candidates])
+            if len(scores) > k:
+                best = np.argpartition(-scores, k - 1)[:k]
+                rows, scores = rows[best], scores[best]
+            order = np.argsort(-scores, kind="stable")
+            results = [
+                (self._ids[row], round(float(score), 6))
+                for row, score in zip(rows[order].tolist(), scores[order].tolist())
+                if row != exclude_row
+            ][:top_k]
+
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        self.searches += 1
+        self._search_ms.append(elapsed_ms)
+        return results
+
+    def stats(self) -> dict:
+        latencies = np.asarray(self._search_ms) if self._search_ms else None
+        return {
+            "count": self.count,
+            "dim": self.dim,
+            "dtype": self.dtype,
+            "mode": "ivf" if self.trained else "flat",
+            "nlist": self.nlist,
+            "nprobe": self.nprobe,
+            "vector_bytes": self.count * (self.dim or 0) * self._row_dtype().itemsize,
+            "searches": self.searches,
+            "search_ms_mean": round(float(latencies.mean()), 3) if latencies is not None else None,
+            "search_ms_p50": round(float(np.percentile(latencies, 50)), 3) if latencies is not None else None,
+            "search_ms_p95": round(float(np.percentile(latencies, 95)), 3) if latencies is not None else None,
+        }
@@ -0,0 +1,81 @@
+import asyncio
+import logging
+import time
+
+import numpy as np
+
+from services.executor import InferenceExecutor
+from services.timing import StageTimer
+
+
+logger = logging.getLogger(f"uvicorn.{__name__}")
+
+
+class Readiness:
+    """
+    Состояние старта приложения для /healthz и /readyz.
+
+    Приложение начинает принимать соединения сразу, а модель загружается, пул
+    инференса запускается и прогревается в фоне; ready становится True только
+    после прогрева. Ошибка старта сохраняется в error — тогда и liveness-проверка
+    сообщает о сбое, чтобы оркестратор перезапустил под.
+    """
+
+    def __init__(self):
+        self.ready = False
+        self.stage = "starting"
+        self.error: str | None = None
+        self.started_at = time.time()
+        self.startup_ms: dict[str, float] | None = None
+
+    def set_stage(self, stage: str):
+        self.stage = stage
+
+    def set_ready(self, timer: StageTimer):
+        self.startup_ms = timer.as_ms()
+        self.stage = "ready"
+        self.ready = True
+
+    def set_failed(self, error: Exception):
+        self.error = f"{type(error).__name__}: {error}"
+        self.stage = "failed"
+        self.ready = False
+
+    def stats(self) -> dict:
+        return {
+            "ready": self.ready,
+            "stage": self.stage,
+            "error": self.error,
+            "uptime_s": round(time.time() - self.started_at, 1),
+            "startup_ms": self.startup_ms,
+        }
+
+
+async def warm_up(
+    executor: InferenceExecutor,
+    batch_sizes: list[int],
+    iterations: int = 2,
+    img_size: int = 448,
+    cascade: bool = False
+) -> dict[int, float]:
+    """
+    Прямые проходы модели на батчах рабочих размеров через тот же путь, что и запросы:
+    выделяются буферы препроцессинга, аллокатор и библиотеки выбирают ядра под эти формы.
+    Каждая итерация отправляет по батчу на каждый слот пула, чтобы прогрелись все.
+    cascade — каскадный инференс включён: батч дополнительно проходит только в полном
+    разрешении, потому что случайные изображения могут целиком выйти после первого прохода.
+    Возвращает время последней итерации по размерам батча, мс.
+    """
+    rng = np.random.default_rng(0)
+    latency_ms = {}
+    for batch_size in batch_sizes:
+        images = [rng.integers(0, 256, (img_size, img_size, 3), dtype=np.uint8) for _ in range(batch_size)]
+        for _ in range(iterations):
+            start = time.perf_counter()
+            await asyncio.gather(*(executor.predict(images) for _ in range(executor.num_slots)))
+            if cascade:
+                full_resolution = [True] * batch_size
+                await asyncio.gather(*(executor.predict(images, full_resolution) for _ in range(executor.num_slots)))
+            latency_ms[batch_size] = round((time.perf_counter() - start) * 1000, 1)
+        logger.info(f"Warm-up batch_size={batch_size}: {latency_ms.get(batch_size, 0.0)} ms")
+    return latency_ms
@@ -0,0 +1,188 @@
+import asyncio
+import itertools
+import logging
+import queue
+import threading
+from concurrent.futures import Future
+from typing import Any, Callable
+
+import numpy as np
+import torch
+import torch.multiprocessing as mp
+from torch import nn
+
+from models.engines import is_shareable
+from services.inference import BatchPrediction, predict_probabilities
+
+
+logger = logging.getLogger(f"uvicorn.{__name__}")
+
+
+def _worker_main(
+    model: nn.Module | None,
+    tasks: mp.Queue,
+    results: mp.Queue,
+    threads_per_worker: int,
+    model_fn: Callable[[], Any] | None = None
+):
+    # Веса модели приходят как тензоры в shared memory: процесс не копирует их,
+    # а отображает те же страницы, что и API-процесс
+    torch.set_num_threads(threads_per_worker)
+    if model is None:
+        # TorchScript и ONNX Runtime не передаются между процессами — загружаем движок здесь
+        from models.interior_classifier_EfficientNet_B3 import get_model
+        model = model_fn() if model_fn is not None else get_model()
+    while True:
+        task = tasks.get()
+        if task is None:
+            break
+        task_id, images, full_resolution = task
+        try:
+            # Нормализация батча тоже выполняется в воркере, в его собственном буфере
+            prediction = predict_probabilities(images, model, full_resolution)
+            results.put((task_id, prediction, None))
+        except Exception as e:
+            results.put((task_id, None, f"{type(e).__name__}: {e}"))
+
+
+class SharedModelWorkerPool:
+    """
+    Пул процессов инференса с одной копией весов модели в shared memory.
+
+    API-процесс загружает чекпоинт один раз, переносит тензоры модели в shared
+    memory (share_memory) и передаёт модель воркерам при старте (для eager-модели;
+    движки TorchScript и ONNX Runtime каждый воркер загружает сам через model_fn). Батчи уходят
+    воркерам через очередь torch.multiprocessing как uint8-изображения входного
+    размера, а вероятности возвращаются в future вызывающей стороны.
+    """
+
+    def __init__(
+        self,
+        model,
+        num_workers: int = 2,
+        threads_per_worker: int = 1,
+        max_queue_size: int = 64,
+        model_fn: Callable[[], Any] | None = None
+    ):
+        if num_workers < 1:
+            raise ValueError("num_workers must be >= 1")
+
+        self.model = model
+        self.model_fn = model_fn
+        self.num_workers = num_workers
+        self.threads_per_worker = threads_per_worker
+        self.max_queue_size = max_queue_size
+
+        self._ctx = mp.get_context('spawn')
+        self._tasks: mp.Queue | None = None
+        self._results: mp.Queue | None = None
+        self._workers: list[mp.Process] = []
+        self._pending: dict[int, Future] = {}
+        self._pending_lock = threading.Lock()
+        self._task_ids = itertools.count()
+        self._listener: threading.Thread | None = None
+        self._stopping = threading.Event()
+
+    @property
+    def is_running(self) -> bool:
+        return self._listener is not None
+
+    def start(self):
+        if self.is_running:
+            return
+        if is_shareable(self.model):
+            self.model.share_memory()
+        self._tasks = self._ctx.Queue(maxsize=self.max_queue_size)
+        self._results = self._ctx.Queue()
+        self._stopping.clear()
+        self._workers = [self._spawn_worker() for _ in range(self.num_workers)]
+        self._listener = threading.Thread(
+            target=self._listen, name="worker-pool-results", daemon=True
+        )
+        self._listener.start()
+        logger.info(
+            f"Shared-memory worker pool started (workers={self.num_workers}, "
+            f"threads_per_worker={self.threads_per_worker})"
+        )
+
+    def _spawn_worker(self) -> mp.Process:
+        shared_model = self.model if is_shareable(self.model) else None
+        process = self._ctx.Process(
+            target=_worker_main,
+            args=(shared_model, self._tasks, self._results, self.threads_per_worker, self.model_fn),
+            daemon=True
+        )
+        process.start()
+        return process
+
+    def stop(self):
+        if not self.is_running:
+            return
+        self._stopping.set()
+        for _ in self._workers:
+            self._tasks.put(None)
+        for process in self._workers:
+            process.join(timeout=10)
+            if process.is_alive():
+                process.terminate()
+        self._listener.join()
+        self._listener = None
+        self._workers = []
+        self._fail_pending(RuntimeError("Worker pool is stopped"))
+        logger.info("Shared-memory worker pool stopped")
+
+    def submit(self, images: list[np.ndarray], full_resolution: list[bool] | None = None) -> Future:
+        """Отправляет батч изображений (H, W, 3) uint8 воркерам; блокирует, если очередь заполнена"""
+        if not self.is_running:
+            raise RuntimeError("Worker pool is not running")
+        task_id = next(self._task_ids)
+        future = Future()
+        with self._pending_lock:
+            self._pending[task_id] = future
+        self._tasks.put((task_id, images, full_resolution))
+        return future
+
+    async def run(self, images: list[np.ndarray], full_resolution: list[bool] | None = None) -> BatchPrediction:
+        # put() в заполненную очередь блокирует, поэтому отправка идёт из потока
+        future = await asyncio.to_thread(self.submit, images, full_resolution)
+        return await asyncio.wrap_future(future)
+
+    def _listen(self):
+        while not self._stopping.is_set():
+            try:
+                task_id, prediction, error = self._results.get(timeout=1.0)
+            except queue.Empty:
+                self._check_workers()
+                continue
+            with self._pending_lock:
+                future = self._pending.pop(task_id, None)
+            if future is None or future.done():
+                continue
+            if error is not None:
+                future.set_exception(RuntimeError(error))
+            else:
+                future.set_result(prediction)
+
+    def _check_workers(self):
+        for i, process in enumerate(self._workers):
+            if process.is_alive() or self._stopping.is_set():
+                continue
+            logger.error(f"Inference worker {process.pid} died with exit code {process.exitcode}, restarting")
+            # Неизвестно, какой батч выполнял упавший воркер: не оставляем запросы висеть
+            self._fail_pending(RuntimeError("Inference worker process died"))
+            self._workers[i] = self._spawn_worker()
+
+    def _fail_pending(self, error: Exception):
+        with self._pending_lock:
+            pending, self._pending = self._pending, {}
+        for future in pending.values():
+            if not future.done():
+                future.set_exception(error)
+
+    def stats(self) -> dict:
+        return {
+            "num_workers": self.num_workers,
+            "alive_workers": sum(process.is_alive() for process in self._workers),
+            "threads_per_worker": self.threads_per_worker,
+            "pending_batches": len(self._pending),
+        }
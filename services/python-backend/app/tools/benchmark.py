@@ -0,0 +1,552 @@
+"""
+Воспроизводимые бенчмарки классификации с отчётом в JSON.
+
+micro   — этапы конвейера по отдельности для разных размеров батча: декодирование
+          с resize, препроцессинг батча, прямой проход и постобработка
+load    — нагрузка на запущенное приложение: параллельные запросы к /classify_batch,
+          пропускная способность и перцентили задержки; без --url сервер запускается
+          отдельным процессом (uvicorn main:app) с выключенными кешами
+compare — сравнение двух отчётов: ухудшение метрики больше порога — регрессия (код выхода 1)
+
+Без чекпоинта в models/ (или MODELS_DIR) используется модель InteriorClassifier со
+случайными весами — скорость та же, сеть не нужна. Без --image-dir изображения
+генерируются (детерминированно по --seed).
+
+Запуск из каталога app/:
+    python -m tools.benchmark micro --batch-sizes 1,8,32,64 --output bench/micro.json
+    python -m tools.benchmark load --concurrency 8 --requests 200 --output bench/load.json
+    python -m tools.benchmark compare bench/main.json bench/micro.json --threshold 0.1
+"""
+import argparse
+import asyncio
+import io
+import json
+import os
+import platform
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Iterator
+
+import httpx
+import numpy as np
+import torch
+from PIL import Image
+
+from config import Config
+from models.interior_classifier_EfficientNet_B3 import (
+    CLASS_NAMES,
+    InteriorClassifier,
+    find_checkpoint,
+    load_model
+)
+from models.weights import WEIGHTS_SUFFIX, save_weights
+from services.inference import IMG_SIZE, prepare_image
+from services.postprocessing import BatchPostprocessor
+from services.preprocessing import BatchPreprocessor
+from tools.image_folder import list_images
+
+
+APP_DIR = Path(__file__).resolve().parent.parent
+
+DEFAULT_BATCH_SIZES = "1,2,4,8,16,32,64"
+
+# compare: метрики *_ms и *_mb — чем меньше, тем лучше, *_per_s — чем больше, тем лучше
+LOWER_IS_BETTER_SUFFIXES = ("_ms", "_mb")
+HIGHER_IS_BETTER_SUFFIX = "_per_s"
+
+
+def percentiles_ms(samples_s: list[float]) -> dict[str, float]:
+    values = np.asarray(samples_s, dtype=np.float64) * 1000
+    return {
+        "mean_ms": round(float(values.mean()), 3),
+        "p50_ms": round(float(np.percentile(values, 50)), 3),
+        "p95_ms": round(float(np.percentile(values, 95)), 3),
+        "p99_ms": round(float(np.percentile(values, 99)), 3),
+    }
+
+
+def environment_info() -> dict:
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=APP_DIR, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "git_commit": commit,
+        "python": platform.python_version(),
+        "torch": torch.__version__,
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "torch_threads": torch.get_num_threads(),
+        "fast_decode": Config.FAST_DECODE,
+    }
+
+
+def synthetic_images(count: int, width: int, height: int, seed: int) -> list[tuple[str, bytes]]:
+    """
+    JPEG-файлы, похожие на фото по сжимаемости: плавный случайный фон (увеличенный
+    шум низкого разрешения) с мелким шумом поверх — чистый шум декодировался бы дольше реальных фото
+    """
+    rng = np.random.default_rng(seed)
+    images = []
+    for i in range(count):
+        coarse = Image.fromarray(rng.integers(0, 256, (12, 16, 3), dtype=np.uint8))
+        pixels = np.asarray(coarse.resize((width, height), Image.Resampling.BICUBIC), dtype=np.int16)
+        pixels = pixels + rng.integers(-8, 9, pixels.shape, dtype=np.int16)
+        buffer = io.BytesIO()
+        Image.fromarray(np.clip(pixels, 0, 255).astype(np.uint8)).save(buffer, format="JPEG", quality=90)
+        images.append((f"synthetic_{i:04d}.jpg", buffer.getvalue()))
+    return images
+
+
+def load_images(args: argparse.Namespace) -> tuple[list[tuple[str, bytes]], str]:
+    if args.image_dir is not None:
+        paths = list_images(args.image_dir)[:args.num_images]
+        if not paths:
+            raise FileNotFoundError(f"No images found in {args.image_dir}")
+        return [(path.name, path.read_bytes()) for path in paths], str(args.image_dir)
+    width, height = (int(side) for side in args.synthetic_size.lower().split("x"))
+    return synthetic_images(args.num_images, width, height, args.seed), f"synthetic {width}x{height}"
+
+
+def build_random_model(seed: int) -> InteriorClassifier:
+    """Архитектура сервиса со случайными весами: без чекпоинта и без загрузки весов ImageNet"""
+    torch.manual_seed(seed)
+    return InteriorClassifier(num_classes=len(CLASS_NAMES), pretrained=False).eval()
+
+
+def resolve_model(args: argparse.Namespace) -> tuple[torch.nn.Module, str]:
+    if not args.random_model:
+        try:
+            checkpoint_path = args.checkpoint or find_checkpoint()
+            return load_model(checkpoint_path), str(checkpoint_path)
+        except FileNotFoundError:
+            print("No checkpoint found")
+    print("Using a randomly initialized model")
+    return build_random_model(args.seed), "random"
+
+
+# ---------------------------------------------------------------------------- micro
+
+
+def run_micro(args: argparse.Namespace) -> dict:
+    if args.torch_threads:
+        torch.set_num_threads(args.torch_threads)
+    batch_sizes = [int(size) for size in args.batch_sizes.split(",") if size.strip()]
+    images, image_source = load_images(args)
+    model, model_source = resolve_model(args)
+    preprocessor = BatchPreprocessor(img_size=IMG_SIZE, max_batch_size=max(batch_sizes))
+    postprocessor = BatchPostprocessor(CLASS_NAMES)
+    print(f"Model: {model_source}, images: {len(images)} ({image_source}), batch sizes: {batch_sizes}")
+
+    results = {}
+    for batch_size in batch_sizes:
+        # Батч набирается по кругу из доступных изображений
+        batch = [images[i % len(images)] for i in range(batch_size)]
+        stages_s: dict[str, list[float]] = {"decode": [], "preprocess": [], "forward": [], "postprocess": []}
+        for iteration in range(args.warmup + args.repeats):
+            timings = []
+            start = time.perf_counter()
+            arrays = [prepare_image(data) for _, data in batch]
+            timings.append(time.perf_counter())
+            batch_tensor = preprocessor.to_batch(arrays)
+            timings.append(time.perf_counter())
+            with torch.no_grad():
+                probabilities = torch.nn.functional.softmax(model(batch_tensor), dim=1).numpy()
+            timings.append(time.perf_counter())
+            postprocessor.build_results(probabilities, [name for name, _ in batch])
+            timings.append(time.perf_counter())
+            if iteration < args.warmup:
+                continue
+            for stage, begin, end in zip(stages_s, [start] + timings[:-1], timings):
+                stages_s[stage].append(end - begin)
+
+        totals_s = [sum(values) for values in zip(*stages_s.values())]
+        report = {stage: percentiles_ms(values) for stage, values in stages_s.items()}
+        report["total"] = percentiles_ms(totals_s)
+        report["images_per_s"] = round(batch_size / float(np.median(totals_s)), 2)
+        report["forward_images_per_s"] = round(batch_size / float(np.median(stages_s["forward"])), 2)
+        results[str(batch_size)] = report
+        print(
+            f"batch {batch_size:3d}: " + ", ".join(f"{stage}={report[stage]['p50_ms']:.1f}ms" for stage in stages_s)
+            + f", {report['images_per_s']:.1f} images/s"
+        )
+
+    summary = {}
+    for batch_size, report in results.items():
+        for stage in ("decode", "preprocess", "forward", "postprocess", "total"):
+            summary[f"batch{batch_size}.{stage}.p50_ms"] = report[stage]["p50_ms"]
+        summary[f"batch{batch_size}.images_per_s"] = report["images_per_s"]
+    return {
+        "kind": "micro",
+        "environment": environment_info(),
+        "params": {
+            "model": model_source,
+            "images": image_source,
+            "batch_sizes": batch_sizes,
+            "repeats": args.repeats,
+            "warmup": args.warmup,
+            "img_size": IMG_SIZE,
+        },
+        "results": results,
+        "summary": summary,
+    }
+
+
+# ----------------------------------------------------------------------------- load
+
+
+def process_memory_mb(pid: int) -> dict[str, float] | None:
+    """Текущий (VmRSS) и пиковый (VmHWM) RSS процесса из /proc; None — не Linux или нет доступа"""
+    try:
+        lines = Path(f"/proc/{pid}/status").read_text().splitlines()
+    except OSError:
+        return None
+    fields = dict(line.split(":", 1) for line in lines if ":" in line)
+    return {
+        "rss_mb": round(int(fields["VmRSS"].split()[0]) / 1024, 1),
+        "peak_rss_mb": round(int(fields["VmHWM"].split()[0]) / 1024, 1),
+    }
+
+
+def reset_peak_rss(pid: int) -> bool:
+    """Сбрасывает VmHWM до текущего RSS (Linux), чтобы пик относился только к замеру"""
+    try:
+        Path(f"/proc/{pid}/clear_refs").write_text("5")
+        return True
+    except OSError:
+        return False
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+@contextmanager
+def local_server(args: argparse.Namespace) -> Iterator[tuple[str, int]]:
+    """
+    Запускает приложение в отдельном процессе и ждёт /readyz. Кеши результатов и
+    почти-дубликатов выключены, чтобы повторяющиеся изображения доходили до модели.
+    Если чекпоинта нет, во временный MODELS_DIR записываются случайные веса.
+    """
+    port = _free_port()
+    env = dict(os.environ, RESULT_CACHE_ENABLED="false", NEAR_DUPLICATE_ENABLED="false")
+    with tempfile.TemporaryDirectory(prefix="benchmark_") as tmp_dir:
+        checkpoint_path = None
+        if not args.random_model:
+            try:
+                checkpoint_path = args.checkpoint or find_checkpoint()
+                env["MODELS_DIR"] = str(checkpoint_path.resolve().parent)
+            except FileNotFoundError:
+                print("No checkpoint found")
+        if checkpoint_path is None:
+            print("Serving a randomly initialized model")
+            save_weights(build_random_model(args.seed).state_dict(), Path(tmp_dir) / f"ckpt_random{WEIGHTS_SUFFIX}")
+            env["MODELS_DIR"] = tmp_dir
+
+        log_file = open(Path(tmp_dir) / "server.log", "wb")
+        server = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(port)],
+            cwd=APP_DIR, env=env, stdout=log_file, stderr=subprocess.STDOUT
+        )
+        url = f"http://127.0.0.1:{port}"
+        try:
+            deadline = time.monotonic() + args.startup_timeout
+            while True:
+                if server.poll() is not None:
+                    raise RuntimeError(f"Server exited with code {server.returncode}, see its log:\n"
+                                       + (Path(tmp_dir) / "server.log").read_text(errors="replace")[-4000:])
+                try:
+                    if httpx.get(f"{url}/readyz", timeout=1.0).status_code == 200:
+                        break
+                except httpx.TransportError:
+                    pass
+                if time.monotonic() > deadline:
+                    raise TimeoutError(f"Server is not ready after {args.startup_timeout} s")
+                time.sleep(0.2)
+            yield url, server.pid
+        finally:
+            server.terminate()
+            try:
+                server.wait(timeout=30)
+            except subprocess.TimeoutExpired:
+                server.kill()
+            log_file.close()
+
+
+def parse_server_timing(header: str | None) -> dict[str, float]:
+    """'read;dur=1.3, decode;dur=20.1' -> {'read': 1.3, 'decode': 20.1}"""
+    stages = {}
+    for metric in (header or "").split(","):
+        name, _, params = metric.strip().partition(";")
+        for param in params.split(";"):
+            key, _, value = param.strip().partition("=")
+            if key == "dur" and name:
+                stages[name] = float(value)
+    return stages
+
+
+async def generate_load(
+    url: str,
+    images: list[tuple[str, bytes]],
+    args: argparse.Namespace,
+    server_pid: int | None = None
+) -> dict:
+    """
+    concurrency клиентов отправляют запросы по images_per_request изображений, пока не
+    будет отправлено нужное число. Сначала прогрев (args.warmup запросов), затем замер.
+    Если известен pid сервера, на время замера отслеживается пиковый RSS его процесса.
+    """
+    latencies_s: list[float] = []
+    statuses: Counter[int] = Counter()
+    server_stages_ms: dict[str, list[float]] = {}
+
+    async def send(client: httpx.AsyncClient, request_number: int) -> tuple[int, float, httpx.Response | None]:
+        first = request_number * args.images_per_request
+        files = [
+            ("images", (name, data, "image/jpeg"))
+            for name, data in (images[(first + i) % len(images)] for i in range(args.images_per_request))
+        ]
+        start = time.perf_counter()
+        try:
+            response = await client.post(args.endpoint, files=files, params={"timings": "true"})
+        except httpx.HTTPError:
+            return 0, time.perf_counter() - start, None
+        return response.status_code, time.perf_counter() - start, response
+
+    async def run_phase(client: httpx.AsyncClient, first: int, count: int, record: bool):
+        request_numbers = iter(range(first, first + count))
+
+        async def worker():
+            for request_number in request_numbers:
+                status, elapsed, response = await send(client, request_number)
+                if not record:
+                    continue
+                statuses[status] += 1
+                if status == 200:
+                    latencies_s.append(elapsed)
+                    for stage, ms in parse_server_timing(response.headers.get("server-timing")).items():
+                        server_stages_ms.setdefault(stage, []).append(ms)
+
+        await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+
+    async with httpx.AsyncClient(base_url=url, timeout=args.request_timeout) as client:
+        await run_phase(client, 0, args.warmup, record=False)
+        memory_before = None
+        if server_pid is not None and reset_peak_rss(server_pid):
+            memory_before = process_memory_mb(server_pid)
+        started = time.perf_counter()
+        await run_phase(client, args.warmup, args.requests, record=True)
+        elapsed = time.perf_counter() - started
+        memory_after = process_memory_mb(server_pid) if memory_before is not None else None
+
+    server_memory = None
+    if memory_before is not None and memory_after is not None:
+        # Рост пика над RSS до замера — память, которую занимают одновременно обрабатываемые запросы
+        peak_growth_mb = max(0.0, memory_after["peak_rss_mb"] - memory_before["rss_mb"])
+        server_memory = {
+            "baseline_rss_mb": memory_before["rss_mb"],
+            "peak_rss_mb": memory_after["peak_rss_mb"],
+            "peak_growth_mb": round(peak_growth_mb, 1),
+            "peak_growth_per_concurrent_request_mb": round(peak_growth_mb / args.concurrency, 1),
+        }
+
+    if not latencies_s:
+        raise RuntimeError(f"No successful requests, status codes: {dict(statuses)}")
+    return {
+        "latency": percentiles_ms(latencies_s),
+        "requests_per_s": round(len(latencies_s) / elapsed, 2),
+        "images_per_s": round(len(latencies_s) * args.images_per_request / elapsed, 2),
+        "status_codes": {str(status): count for status, count in sorted(statuses.items())},
+        # Среднее время этапов на сервере по заголовку Server-Timing
+        "server_stages_mean_ms": {
+            stage: round(float(np.mean(values)), 3) for stage, values in server_stages_ms.items()
+        },
+        "server_memory": server_memory,
+    }
+
+
+def run_load(args: argparse.Namespace) -> dict:
+    images, image_source = load_images(args)
+    print(
+        f"Images: {len(images)} ({image_source}), concurrency {args.concurrency}, "
+        f"{args.requests} requests x {args.images_per_request} images"
+    )
+    if args.url is not None:
+        url, model_source = args.url, "remote"
+        results = asyncio.run(generate_load(url, images, args, args.server_pid))
+    else:
+        with local_server(args) as (url, server_pid):
+            model_source = "local"
+            results = asyncio.run(generate_load(url, images, args, server_pid))
+
+    latency = results["latency"]
+    print(
+        f"{results['requests_per_s']:.2f} requests/s, {results['images_per_s']:.1f} images/s, "
+        f"latency p50={latency['p50_ms']:.1f}ms p95={latency['p95_ms']:.1f}ms p99={latency['p99_ms']:.1f}ms, "
+        f"status codes {results['status_codes']}"
+    )
+    summary = {f"latency.{name}": value for name, value in latency.items()}
+    summary["requests_per_s"] = results["requests_per_s"]
+    summary["images_per_s"] = results["images_per_s"]
+    if results["server_memory"] is not None:
+        memory = results["server_memory"]
+        print(
+            f"server RSS {memory['baseline_rss_mb']:.0f} MB, peak {memory['peak_rss_mb']:.0f} MB "
+            f"(+{memory['peak_growth_per_concurrent_request_mb']:.1f} MB per concurrent request)"
+        )
+        summary["server.peak_growth_mb"] = memory["peak_growth_mb"]
+        summary["server.peak_growth_per_concurrent_request_mb"] = memory["peak_growth_per_concurrent_request_mb"]
+    return {
+        "kind": "load",
+        "environment": environment_info(),
+        "params": {
+            "server": model_source,
+            "endpoint": args.endpoint,
+            "images": image_source,
+            "concurrency": args.concurrency,
+            "requests": args.requests,
+            "warmup": args.warmup,
+            "images_per_request": args.images_per_request,
+        },
+        "results": results,
+        "summary": summary,
+    }
+
+
+# -------------------------------------------------------------------------- compare
+
+
+def compare_reports(baseline: dict, candidate: dict, threshold: float, min_delta_ms: float) -> list[dict]:
+    """
+    Относительное изменение общих метрик summary. Для *_ms и *_mb рост — ухудшение,
+    для *_per_s — падение; ухудшение больше threshold отмечается как регрессия.
+    Рост *_ms меньше min_delta_ms не считается: у быстрых этапов это шум.
+    """
+    rows = []
+    for name, base_value in baseline["summary"].items():
+        if name not in candidate["summary"]:
+            continue
+        new_value = candidate["summary"][name]
+        change = (new_value - base_value) / base_value if base_value else 0.0
+        if name.endswith("_ms"):
+            worse_by = change if new_value - base_value >= min_delta_ms else 0.0
+        elif name.endswith(LOWER_IS_BETTER_SUFFIXES):
+            worse_by = change
+        elif name.endswith(HIGHER_IS_BETTER_SUFFIX):
+            worse_by = -change
+        else:
+            continue
+        rows.append({
+            "metric": name,
+            "baseline": base_value,
+            "candidate": new_value,
+            "change": round(change, 4),
+            "regression": worse_by > threshold,
+        })
+    return rows
+
+
+def run_compare(args: argparse.Namespace) -> int:
+    baseline = json.loads(args.baseline.read_text())
+    candidate = json.loads(args.candidate.read_text())
+    if baseline["kind"] != candidate["kind"]:
+        print(f"Cannot compare a {baseline['kind']} report with a {candidate['kind']} report")
+        return 2
+    if baseline["params"] != candidate["params"]:
+        print("Warning: benchmark parameters differ between runs")
+
+    rows = compare_reports(baseline, candidate, args.threshold, args.min_delta_ms)
+    width = max((len(row["metric"]) for row in rows), default=6)
+    print(f"{'metric':{width}s} {'baseline':>11s} {'candidate':>11s} {'change':>8s}")
+    for row in rows:
+        flag = "  REGRESSION" if row["regression"] else ""
+        print(f"{row['metric']:{width}s} {row['baseline']:11.2f} {row['candidate']:11.2f} {row['change']:+8.1%}{flag}")
+
+    regressions = [row for row in rows if row["regression"]]
+    if args.output is not None:
+        write_report({"kind": "compare", "threshold": args.threshold, "rows": rows}, args.output)
+    print(f"{len(regressions)} regression(s) over {args.threshold:.0%} out of {len(rows)} metrics")
+    return 1 if regressions else 0
+
+
+# ----------------------------------------------------------------------------- main
+
+
+def write_report(report: dict, output: Path | None):
+    text = json.dumps(report, indent=2, ensure_ascii=False)
+    if output is None:
+        print(text)
+        return
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(text + "\n")
+    print(f"Report saved to {output}")
+
+
+def add_common_args(parser: argparse.ArgumentParser):
+    parser.add_argument("--image-dir", type=Path, default=None, help="sample images (default: synthetic JPEGs)")
+    parser.add_argument("--num-images", type=int, default=64, help="number of distinct images")
+    parser.add_argument("--synthetic-size", default="1600x1200", help="WxH of synthetic images")
+    parser.add_argument(
+        "--checkpoint", type=Path, default=None,
+        help="ckpt* file (default: first in models/); load serves the first ckpt* from its directory"
+    )
+    parser.add_argument("--random-model", action="store_true", help="use random weights even if a checkpoint exists")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", type=Path, default=None, help="JSON report file (default: stdout)")
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Classification benchmarks with JSON reports")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    micro = commands.add_parser("micro", help="per-stage timings for each batch size")
+    add_common_args(micro)
+    micro.add_argument("--batch-sizes", default=DEFAULT_BATCH_SIZES, help="comma-separated batch sizes")
+    micro.add_argument("--repeats", type=int, default=5, help="measured iterations per batch size")
+    micro.add_argument("--warmup", type=int, default=1, help="unmeasured iterations per batch size")
+    micro.add_argument("--torch-threads", type=int, default=0, help="torch threads (0 = torch default)")
+
+    load = commands.add_parser("load", help="concurrent requests against the API")
+    add_common_args(load)
+    load.add_argument("--url", default=None, help="running server (default: start main:app locally)")
+    load.add_argument("--server-pid", type=int, default=None, help="pid of the --url server to track its peak RSS")
+    load.add_argument("--endpoint", default="/classify_batch")
+    load.add_argument("--concurrency", type=int, default=4, help="parallel clients")
+    load.add_argument("--requests", type=int, default=100, help="measured requests")
+    load.add_argument("--warmup", type=int, default=8, help="unmeasured requests before the measurement")
+    load.add_argument("--images-per-request", type=int, default=4)
+    load.add_argument("--request-timeout", type=float, default=120.0)
+    load.add_argument("--startup-timeout", type=float, default=300.0, help="seconds to wait for /readyz")
+
+    compare = commands.add_parser("compare", help="compare two reports and flag regressions")
+    compare.add_argument("baseline", type=Path)
+    compare.add_argument("candidate", type=Path)
+    compare.add_argument("--threshold", type=float, default=0.1, help="relative slowdown counted as regression")
+    compare.add_argument("--min-delta-ms", type=float, default=1.0, help="ignore slowdowns smaller than this")
+    compare.add_argument("--output", type=Path, default=None, help="JSON comparison file")
+    return parser.parse_args()
+
+
+def main() -> int:
+    args = parse_args()
+    if args.command == "compare":
+        return run_compare(args)
+    report = run_micro(args) if args.command == "micro" else run_load(args)
+    write_report(report, args.output)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,158 @@
+"""
+Оценка каскадного инференса на размеченной папке: доля изображений, принятых после прохода
+в уменьшенном разрешении, согласие с предсказаниями в полном разрешении 448x448, точность
+и пропускная способность по сравнению с полным разрешением.
+
+Папка с данными: <data-dir>/<класс>/*.jpg, классы — CLASS_NAMES (A0 ... D1).
+Для каждой пары (разрешение, порог) батч считается тем же каскадом, что и в сервисе
+(services.inference.cascade_forward); время измеряется только для прямых проходов.
+
+Запуск из каталога app/:
+    python -m tools.cascade_eval --data-dir /data/labeled --low-res-sizes 224 256 288 --thresholds 0.8 0.9 0.95
+"""
+import argparse
+import sys
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+
+import numpy as np
+import torch
+
+from config import Config
+from models.engines import ENGINE_NAMES
+from models.interior_classifier_EfficientNet_B3 import CLASS_NAMES, find_checkpoint, load_engine
+from services.inference import IMG_SIZE, PREPROCESSOR, cascade_forward, forward, prepare_image
+from tools.image_folder import list_labeled_images
+
+
+@dataclass
+class CascadeRun:
+    """Предсказания и время одной конфигурации каскада на всей папке"""
+    img_size: int
+    threshold: float
+    predictions: list[np.ndarray] = field(default_factory=list)
+    early_exit: list[np.ndarray] = field(default_factory=list)
+    seconds: float = 0.0
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Cascade inference report: early exits, agreement and throughput")
+    parser.add_argument("--data-dir", type=Path, required=True, help="labeled folder: <data-dir>/<class>/*.jpg")
+    parser.add_argument("--checkpoint", type=Path, default=None, help="ckpt* file (default: latest in models/)")
+    parser.add_argument(
+        "--engine", default=Config.INFERENCE_ENGINE, choices=[name for name in ENGINE_NAMES if name != 'onnx'],
+        help="inference engine (onnx has a fixed 448x448 input and cannot run the cascade)"
+    )
+    parser.add_argument(
+        "--low-res-sizes", type=int, nargs="+", default=[Config.CASCADE_IMG_SIZE], help="first-pass resolutions"
+    )
+    parser.add_argument(
+        "--thresholds", type=float, nargs="+", default=[0.8, 0.9, 0.95],
+        help="top_confidence thresholds for accepting the first pass"
+    )
+    parser.add_argument("--batch-size", type=int, default=Config.MAX_BATCH_SIZE)
+    parser.add_argument("--limit", type=int, default=0, help="max number of images (0 = all)")
+    parser.add_argument("--per-class", action="store_true", help="also print early exits and agreement per class")
+    return parser.parse_args()
+
+
+def iter_image_batches(paths: list[Path], batch_size: int):
+    """Батчи входов модели, декодированные как в сервисе (prepare_image); битые файлы пропускаются"""
+    indices, images = [], []
+    for i, path in enumerate(paths):
+        try:
+            images.append(prepare_image(path.read_bytes()))
+            indices.append(i)
+        except Exception as e:
+            print(f"Skipping {path}: {e}")
+            continue
+        if len(images) == batch_size:
+            yield indices, images
+            indices, images = [], []
+    if images:
+        yield indices, images
+
+
+def main() -> int:
+    args = parse_args()
+    checkpoint_path = args.checkpoint or find_checkpoint()
+    model = load_engine(checkpoint_path, args.engine)
+
+    samples = list_labeled_images(args.data_dir, CLASS_NAMES)
+    if args.limit:
+        samples = samples[:args.limit]
+    if not samples:
+        print(f"No labeled images found in {args.data_dir} (expected subfolders {', '.join(CLASS_NAMES)})")
+        return 1
+    paths = [path for path, _ in samples]
+
+    runs = [CascadeRun(img_size, threshold) for img_size in args.low_res_sizes for threshold in args.thresholds]
+    # Прогрев каждого разрешения, чтобы первый батч не искажал время
+    with torch.no_grad():
+        for img_size in {IMG_SIZE, *args.low_res_sizes}:
+            forward(model, torch.zeros(args.batch_size, 3, img_size, img_size))
+
+    labels, full_predictions = [], []
+    full_time = 0.0
+    for indices, images in iter_image_batches(paths, args.batch_size):
+        batch_tensor = PREPROCESSOR.to_batch(images)
+        no_full_resolution = np.zeros(len(images), dtype=bool)
+        with torch.no_grad():
+            start = time.perf_counter()
+            probabilities, _, _ = forward(model, batch_tensor)
+            full_time += time.perf_counter() - start
+            full_predictions.append(probabilities.argmax(axis=1))
+            for run in runs:
+                start = time.perf_counter()
+                probabilities, _, _, early_exit = cascade_forward(
+                    model, batch_tensor, no_full_resolution, run.img_size, run.threshold
+                )
+                run.seconds += time.perf_counter() - start
+                run.predictions.append(probabilities.argmax(axis=1))
+                run.early_exit.append(early_exit)
+        labels.extend(samples[i][1] for i in indices)
+
+    labels = np.array(labels)
+    full_predictions = np.concatenate(full_predictions)
+    total = len(labels)
+    full_accuracy = (full_predictions == labels).mean()
+    print(f"\nImages: {total}, batch size: {args.batch_size}, engine: {args.engine}, full resolution: {IMG_SIZE}")
+    print(
+        f"{'size':>5s} {'threshold':>9s} {'early exit':>10s} {'agreement':>9s} {'exit agr.':>9s} "
+        f"{'accuracy':>8s} {'images/s':>9s} {'speedup':>8s}"
+    )
+    print(
+        f"{IMG_SIZE:5d} {'-':>9s} {'-':>10s} {'-':>9s} {'-':>9s} "
+        f"{full_accuracy:8.3f} {total / full_time:9.1f} {1.0:7.2f}x"
+    )
+    for run in runs:
+        predictions = np.concatenate(run.predictions)
+        early_exit = np.concatenate(run.early_exit)
+        agreement = predictions == full_predictions
+        # Изображения без раннего выхода считаются в полном разрешении и совпадают по построению
+        exit_agreement = f"{agreement[early_exit].mean():9.3f}" if early_exit.any() else f"{'-':>9s}"
+        print(
+            f"{run.img_size:5d} {run.threshold:9.2f} {early_exit.mean():10.3f} {agreement.mean():9.3f} "
+            f"{exit_agreement} {(predictions == labels).mean():8.3f} {total / run.seconds:9.1f} "
+            f"{full_time / run.seconds:7.2f}x"
+        )
+
+    if args.per_class:
+        for run in runs:
+            predictions = np.concatenate(run.predictions)
+            early_exit = np.concatenate(run.early_exit)
+            print(f"\nsize {run.img_size}, threshold {run.threshold:.2f}")
+            print(f"{'class':6s} {'n':>6s} {'early exit':>10s} {'agreement':>9s}")
+            for class_idx, class_name in enumerate(CLASS_NAMES):
+                rows = labels == class_idx
+                if not rows.any():
+                    print(f"{class_name:6s} {0:6d} {'-':>10s} {'-':>9s}")
+                    continue
+                agreement = (predictions[rows] == full_predictions[rows]).mean()
+                print(f"{class_name:6s} {int(rows.sum()):6d} {early_exit[rows].mean():10.3f} {agreement:9.3f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
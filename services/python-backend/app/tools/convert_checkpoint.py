@@ -0,0 +1,61 @@
+"""
+Конвертация обучающего чекпоинта ckpt*.pth в ckpt*.safetensors: только веса модели,
+без состояния оптимизатора и pickle. Сервер находит файл рядом с чекпоинтом
+автоматически и загружает его отображением в память.
+
+Запуск из каталога app/:
+    python -m tools.convert_checkpoint --checkpoint models/ckpt_best.pth
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import torch
+
+from models.interior_classifier_EfficientNet_B3 import find_checkpoint, load_model
+from models.weights import WEIGHTS_SUFFIX, extract_state_dict, save_weights, weights_path
+from services.timing import StageTimer
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Convert a training checkpoint to weights-only safetensors")
+    parser.add_argument("--checkpoint", type=Path, default=None, help="ckpt* file (default: first in models/)")
+    parser.add_argument("--output", type=Path, default=None, help="output file (default: <checkpoint>.safetensors)")
+    return parser.parse_args()
+
+
+def main() -> int:
+    args = parse_args()
+    checkpoint_path = args.checkpoint or find_checkpoint()
+    if checkpoint_path.suffix == WEIGHTS_SUFFIX:
+        print(f"{checkpoint_path} is already a safetensors file")
+        return 1
+    output_path = args.output or weights_path(checkpoint_path)
+
+    start = time.perf_counter()
+    checkpoint = torch.load(checkpoint_path, map_location=torch.device('cpu'), weights_only=False)
+    full_load_s = time.perf_counter() - start
+    state_dict = extract_state_dict(checkpoint)
+    save_weights(state_dict, output_path, metadata={"source": checkpoint_path.name})
+    print(
+        f"Saved {len(state_dict)} tensors to {output_path} "
+        f"({output_path.stat().st_size / 2**20:.1f} MB, checkpoint {checkpoint_path.stat().st_size / 2**20:.1f} MB)"
+    )
+
+    # Проверяем, что модель из нового файла совпадает с исходными весами
+    timer = StageTimer()
+    model = load_model(output_path, timer)
+    loaded = model.state_dict()
+    mismatched = [name for name, tensor in state_dict.items() if not torch.equal(tensor.float(), loaded[name].float())]
+    if mismatched:
+        print(f"Mismatched tensors: {', '.join(mismatched[:10])}")
+        return 1
+    print("Verified: all tensors match")
+    print(f"Full checkpoint torch.load: {full_load_s * 1000:.1f} ms")
+    print(f"Model from safetensors: {sum(timer.as_ms().values()):.1f} ms ({timer.format()})")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,94 @@
+"""
+Микро-бенчмарк декодирования: полное декодирование против декодирования в уменьшенном
+размере (DCT-масштабирование JPEG / Image.reduce) с последующим resize до входа модели.
+
+Каждый режим выполняется в отдельном процессе, чтобы пиковый RSS не смешивался.
+
+Запуск из каталога app/:
+    python -m tools.decode_benchmark --image-dir /data/photos --limit 200
+"""
+import argparse
+import multiprocessing
+import resource
+import statistics
+import sys
+import time
+from pathlib import Path
+
+from models.interior_classifier_EfficientNet_B3 import get_inference_transforms
+from services.decoding import decode_image
+from tools.image_folder import list_images
+
+
+def _max_rss_mb() -> float:
+    # ru_maxrss в Linux — в килобайтах
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def run_mode(paths: list[Path], fast: bool, img_size: int) -> dict:
+    transforms = get_inference_transforms(img_size=img_size)
+    datas = [path.read_bytes() for path in paths]
+    baseline_rss_mb = _max_rss_mb()
+
+    decode_ms, total_ms = [], []
+    for image_data in datas:
+        start = time.perf_counter()
+        try:
+            image = decode_image(image_data, min_size=(img_size, img_size) if fast else None)
+        except Exception:
+            continue
+        decoded = time.perf_counter()
+        transforms(image)
+        finished = time.perf_counter()
+        decode_ms.append((decoded - start) * 1000)
+        total_ms.append((finished - start) * 1000)
+
+    return {
+        "mode": "fast" if fast else "full",
+        "images": len(decode_ms),
+        "decode_ms_mean": statistics.mean(decode_ms),
+        "decode_ms_p95": sorted(decode_ms)[int(0.95 * (len(decode_ms) - 1))],
+        "decode_resize_ms_mean": statistics.mean(total_ms),
+        "baseline_rss_mb": baseline_rss_mb,
+        "peak_rss_mb": _max_rss_mb(),
+    }
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Benchmark full vs reduced-resolution image decoding")
+    parser.add_argument("--image-dir", type=Path, required=True)
+    parser.add_argument("--limit", type=int, default=0, help="max number of images (0 = all)")
+    parser.add_argument("--img-size", type=int, default=448)
+    return parser.parse_args()
+
+
+def main() -> int:
+    args = parse_args()
+    paths = list_images(args.image_dir)
+    if args.limit:
+        paths = paths[:args.limit]
+    if not paths:
+        print(f"No images found in {args.image_dir}")
+        return 1
+
+    context = multiprocessing.get_context('spawn')
+    reports = []
+    for fast in (False, True):
+        with context.Pool(1) as pool:
+            reports.append(pool.apply(run_mode, (paths, fast, args.img_size)))
+
+    print(f"Images: {len(paths)}, model input: {args.img_size}x{args.img_size}")
+    print(f"{'mode':6s} {'decode ms':>10s} {'p95 ms':>8s} {'+resize ms':>11s} {'peak RSS MB':>12s} {'delta MB':>9s}")
+    for report in reports:
+        print(
+            f"{report['mode']:6s} {report['decode_ms_mean']:10.1f} {report['decode_ms_p95']:8.1f} "
+            f"{report['decode_resize_ms_mean']:11.1f} {report['peak_rss_mb']:12.1f} "
+            f"{report['peak_rss_mb'] - report['baseline_rss_mb']:9.1f}"
+        )
+    full, fast = reports
+    print(f"decode+resize speedup: {full['decode_resize_ms_mean'] / fast['decode_resize_ms_mean']:.2f}x")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,91 @@
+"""
+Экспорт чекпоинта ckpt* в TorchScript (frozen) и ONNX с проверкой совпадения выходов.
+
+Запуск из каталога app/:
+    python -m tools.export_model --checkpoint models/ckpt_best.pth --formats torchscript onnx
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import torch
+
+from models.engines import (
+    OnnxRuntimeModel,
+    build_torchscript,
+    export_onnx,
+    exported_path
+)
+from models.interior_classifier_EfficientNet_B3 import find_checkpoint, load_model
+
+
+def measure_latency_ms(model, batch_tensor: torch.Tensor, runs: int) -> float:
+    with torch.no_grad():
+        model(batch_tensor)  # прогрев
+        start = time.perf_counter()
+        for _ in range(runs):
+            model(batch_tensor)
+    return (time.perf_counter() - start) * 1000 / runs
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Export InteriorClassifier checkpoint to TorchScript/ONNX")
+    parser.add_argument("--checkpoint", type=Path, default=None, help="ckpt* file (default: first in models/)")
+    parser.add_argument(
+        "--formats", nargs="+", choices=['torchscript', 'onnx'], default=['torchscript', 'onnx']
+    )
+    parser.add_argument("--img-size", type=int, default=448)
+    parser.add_argument("--batch-size", type=int, default=4, help="batch size used for verification")
+    parser.add_argument("--atol", type=float, default=1e-3, help="max allowed abs difference of logits")
+    parser.add_argument("--benchmark-runs", type=int, default=5, help="0 to skip latency comparison")
+    return parser.parse_args()
+
+
+def main() -> int:
+    args = parse_args()
+    checkpoint_path = args.checkpoint or find_checkpoint()
+    print(f"Loading checkpoint {checkpoint_path}")
+    model = load_model(checkpoint_path)
+
+    # Батч отличается от размера при трассировке, чтобы проверить динамическую ось batch
+    torch.manual_seed(0)
+    batch_tensor = torch.randn(args.batch_size, 3, args.img_size, args.img_size)
+    with torch.no_grad():
+        reference = model(batch_tensor)
+
+    engines = {'eager': model}
+    for engine in args.formats:
+        output_path = exported_path(checkpoint_path, engine)
+        if engine == 'torchscript':
+            scripted = build_torchscript(model, img_size=args.img_size)
+            torch.jit.save(scripted, str(output_path))
+            engines[engine] = torch.jit.load(str(output_path), map_location=torch.device('cpu'))
+        else:
+            export_onnx(model, output_path, img_size=args.img_size)
+            engines[engine] = OnnxRuntimeModel(output_path)
+        print(f"Saved {engine} model to {output_path}")
+
+    failed = False
+    for engine, engine_model in engines.items():
+        if engine == 'eager':
+            continue
+        with torch.no_grad():
+            outputs = engine_model(batch_tensor)
+        max_diff = (outputs - reference).abs().max().item()
+        same_argmax = bool((outputs.argmax(dim=1) == reference.argmax(dim=1)).all())
+        status = "OK" if max_diff <= args.atol and same_argmax else "MISMATCH"
+        failed |= status != "OK"
+        print(f"[{status}] {engine}: max |logits diff| = {max_diff:.2e}, same argmax: {same_argmax}")
+
+    if args.benchmark_runs > 0:
+        print(f"Latency, batch {args.batch_size}x{args.img_size}x{args.img_size}:")
+        for engine, engine_model in engines.items():
+            latency_ms = measure_latency_ms(engine_model, batch_tensor, args.benchmark_runs)
+            print(f"  {engine:12s} {latency_ms:8.1f} ms/batch")
+
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,52 @@
+from pathlib import Path
+from typing import Iterator
+
+import torch
+from PIL import Image
+
+from models.interior_classifier_EfficientNet_B3 import get_inference_transforms
+from services.decoding import IMAGE_EXTENSIONS
+
+
+def list_images(folder: Path) -> list[Path]:
+    """Все изображения в папке и её подпапках в стабильном порядке"""
+    return sorted(path for path in folder.rglob("*") if path.suffix.lower() in IMAGE_EXTENSIONS)
+
+
+def list_labeled_images(folder: Path, class_names: list[str]) -> list[tuple[Path, int]]:
+    """
+    Размеченная папка: folder/<класс>/*.jpg, где <класс> — одно из class_names.
+    Возвращает пары (путь, индекс класса); подпапки с другими именами пропускаются.
+    """
+    samples = []
+    for label, class_name in enumerate(class_names):
+        class_dir = folder / class_name
+        if class_dir.is_dir():
+            samples.extend((path, label) for path in list_images(class_dir))
+    return samples
+
+
+def iter_batches(
+    paths: list[Path],
+    batch_size: int,
+    img_size: int = 448
+) -> Iterator[tuple[list[int], torch.Tensor]]:
+    """
+    Декодирует изображения и собирает их в батчи входных тензоров.
+    Возвращает индексы успешно прочитанных файлов в paths и батч; битые файлы пропускаются.
+    """
+    transforms = get_inference_transforms(img_size=img_size)
+    indices, tensors = [], []
+    for i, path in enumerate(paths):
+        try:
+            with Image.open(path) as image:
+                tensors.append(transforms(image.convert('RGB')))
+            indices.append(i)
+        except Exception as e:
+            print(f"Skipping {path}: {e}")
+            continue
+        if len(tensors) == batch_size:
+            yield indices, torch.stack(tensors)
+            indices, tensors = [], []
+    if tensors:
+        yield indices, torch.stack(tensors)
@@ -0,0 +1,112 @@
+"""
+Сравнение fp32 и INT8 моделей на размеченной папке: точность, согласие предсказаний по
+классам и задержка/пропускная способность.
+
+Папка с данными: <data-dir>/<класс>/*.jpg, классы — CLASS_NAMES (A0 ... D1).
+
+Запуск из каталога app/:
+    python -m tools.quantization_report --data-dir /data/labeled --batch-size 8
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import torch
+
+from models.engines import exported_path
+from models.interior_classifier_EfficientNet_B3 import (
+    CLASS_NAMES,
+    find_checkpoint,
+    load_model
+)
+from models.quantization import quantize_head_dynamic
+from tools.image_folder import iter_batches, list_labeled_images
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Accuracy and speed report: fp32 vs INT8")
+    parser.add_argument("--data-dir", type=Path, required=True, help="labeled folder: <data-dir>/<class>/*.jpg")
+    parser.add_argument("--checkpoint", type=Path, default=None, help="ckpt* file (default: first in models/)")
+    parser.add_argument(
+        "--int8-model", type=Path, default=None,
+        help="INT8 TorchScript file (default: <checkpoint>.int8.pt, else dynamic head quantization)"
+    )
+    parser.add_argument("--batch-size", type=int, default=8)
+    parser.add_argument("--img-size", type=int, default=448)
+    parser.add_argument("--limit", type=int, default=0, help="max number of images (0 = all)")
+    return parser.parse_args()
+
+
+def timed_predict(model, batch_tensor: torch.Tensor) -> tuple[torch.Tensor, float]:
+    start = time.perf_counter()
+    with torch.no_grad():
+        predictions = model(batch_tensor).argmax(dim=1)
+    return predictions, time.perf_counter() - start
+
+
+def main() -> int:
+    args = parse_args()
+    checkpoint_path = args.checkpoint or find_checkpoint()
+    fp32_model = load_model(checkpoint_path)
+
+    int8_path = args.int8_model or exported_path(checkpoint_path, 'int8')
+    if int8_path.exists():
+        print(f"INT8 model: {int8_path}")
+        int8_model = torch.jit.load(str(int8_path), map_location=torch.device('cpu'))
+    else:
+        print(f"INT8 model {int8_path} not found, using dynamic quantization of the head")
+        int8_model = quantize_head_dynamic(fp32_model)
+
+    samples = list_labeled_images(args.data_dir, CLASS_NAMES)
+    if args.limit:
+        samples = samples[:args.limit]
+    if not samples:
+        print(f"No labeled images found in {args.data_dir} (expected subfolders {', '.join(CLASS_NAMES)})")
+        return 1
+    paths = [path for path, _ in samples]
+
+    labels, fp32_preds, int8_preds = [], [], []
+    fp32_time = int8_time = 0.0
+    num_batches = 0
+    # Прогрев, чтобы первый батч не искажал задержку
+    warmup = torch.zeros(1, 3, args.img_size, args.img_size)
+    timed_predict(fp32_model, warmup)
+    timed_predict(int8_model, warmup)
+    for indices, batch_tensor in iter_batches(paths, args.batch_size, args.img_size):
+        preds, elapsed = timed_predict(fp32_model, batch_tensor)
+        fp32_preds.extend(preds.tolist())
+        fp32_time += elapsed
+        preds, elapsed = timed_predict(int8_model, batch_tensor)
+        int8_preds.extend(preds.tolist())
+        int8_time += elapsed
+        labels.extend(samples[i][1] for i in indices)
+        num_batches += 1
+
+    total = len(labels)
+    print(f"\nImages: {total}, batch size: {args.batch_size}, img size: {args.img_size}")
+    print(f"{'class':6s} {'n':>6s} {'fp32 acc':>9s} {'int8 acc':>9s} {'agreement':>10s}")
+    for class_idx, class_name in enumerate(CLASS_NAMES):
+        rows = [i for i, label in enumerate(labels) if label == class_idx]
+        if not rows:
+            print(f"{class_name:6s} {0:6d} {'-':>9s} {'-':>9s} {'-':>10s}")
+            continue
+        fp32_acc = sum(fp32_preds[i] == class_idx for i in rows) / len(rows)
+        int8_acc = sum(int8_preds[i] == class_idx for i in rows) / len(rows)
+        agreement = sum(fp32_preds[i] == int8_preds[i] for i in rows) / len(rows)
+        print(f"{class_name:6s} {len(rows):6d} {fp32_acc:9.3f} {int8_acc:9.3f} {agreement:10.3f}")
+
+    fp32_acc = sum(p == y for p, y in zip(fp32_preds, labels)) / total
+    int8_acc = sum(p == y for p, y in zip(int8_preds, labels)) / total
+    agreement = sum(a == b for a, b in zip(fp32_preds, int8_preds)) / total
+    print(f"{'all':6s} {total:6d} {fp32_acc:9.3f} {int8_acc:9.3f} {agreement:10.3f}")
+
+    print(f"\n{'model':6s} {'ms/batch':>10s} {'images/s':>10s}")
+    for name, elapsed in (("fp32", fp32_time), ("int8", int8_time)):
+        print(f"{name:6s} {elapsed * 1000 / num_batches:10.1f} {total / elapsed:10.1f}")
+    print(f"speedup: {fp32_time / int8_time:.2f}x")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
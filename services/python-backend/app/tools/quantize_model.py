@@ -0,0 +1,68 @@
+"""
+Пост-тренировочная INT8-квантизация чекпоинта с калибровкой на локальной папке изображений.
+
+Запуск из каталога app/:
+    python -m tools.quantize_model --calibration-dir /data/calibration --num-images 256
+
+Результат сохраняется рядом с чекпоинтом (ckpt*.int8.pt) и загружается при INFERENCE_ENGINE=int8.
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import torch
+
+from models.engines import build_torchscript, exported_path
+from models.interior_classifier_EfficientNet_B3 import find_checkpoint, load_model
+from models.quantization import quantize_head_dynamic, quantize_static
+from tools.image_folder import iter_batches, list_images
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Quantize InteriorClassifier checkpoint to INT8")
+    parser.add_argument("--checkpoint", type=Path, default=None, help="ckpt* file (default: first in models/)")
+    parser.add_argument("--calibration-dir", type=Path, default=None, help="folder with calibration images")
+    parser.add_argument("--num-images", type=int, default=256, help="max number of calibration images")
+    parser.add_argument("--batch-size", type=int, default=8)
+    parser.add_argument("--img-size", type=int, default=448)
+    parser.add_argument(
+        "--dynamic-only", action="store_true",
+        help="quantize only the head's nn.Linear layers (no calibration needed)"
+    )
+    parser.add_argument("--output", type=Path, default=None, help="default: <checkpoint>.int8.pt")
+    return parser.parse_args()
+
+
+def main() -> int:
+    args = parse_args()
+    checkpoint_path = args.checkpoint or find_checkpoint()
+    output_path = args.output or exported_path(checkpoint_path, 'int8')
+    print(f"Loading checkpoint {checkpoint_path}")
+    model = load_model(checkpoint_path)
+
+    start = time.perf_counter()
+    if args.dynamic_only:
+        quantized = quantize_head_dynamic(model)
+    else:
+        if args.calibration_dir is None:
+            print("--calibration-dir is required for static quantization (or pass --dynamic-only)")
+            return 1
+        paths = list_images(args.calibration_dir)[:args.num_images]
+        if not paths:
+            print(f"No images found in {args.calibration_dir}")
+            return 1
+        print(f"Calibrating on {len(paths)} images from {args.calibration_dir}")
+        batches = (batch for _, batch in iter_batches(paths, args.batch_size, args.img_size))
+        quantized = quantize_static(model, batches, img_size=args.img_size)
+    print(f"Quantization done in {time.perf_counter() - start:.1f} s")
+
+    scripted = build_torchscript(quantized, img_size=args.img_size)
+    torch.jit.save(scripted, str(output_path))
+    print(f"Saved INT8 model to {output_path}")
+    print("Compare it with fp32 before shipping: python -m tools.quantization_report --data-dir <labeled folder>")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,6 @@
+import sys
+from pathlib import Path
+
+
+# Модули сервиса импортируются так же, как при запуске из каталога app/
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "app"))
@@ -0,0 +1,19 @@
+import pytest
+
+pytest.importorskip("torch")
+
+from models.registry import scan_models, version_sort_key  # noqa: E402
+
+
+def test_version_sort_key_compares_numbers_numerically():
+    versions = ["1.9.2", "1.10.0", "1.2.0", "ckpt_epoch10", "ckpt_epoch9", "ckpt_epoch2"]
+    assert sorted(versions, key=version_sort_key) == [
+        "1.2.0", "1.9.2", "1.10.0", "ckpt_epoch2", "ckpt_epoch9", "ckpt_epoch10"
+    ]
+
+
+def test_scan_models_without_metadata_picks_latest_epoch(tmp_path):
+    for name in ("ckpt_epoch9.pth", "ckpt_epoch10.pth", "ckpt_epoch2.pth"):
+        (tmp_path / name).write_bytes(b"")
+    versions = scan_models(tmp_path)
+    assert [version.version for version in versions] == ["ckpt_epoch2", "ckpt_epoch9", "ckpt_epoch10"]